@@ -0,0 +1,273 @@
+# services/ann_index.py
+import json
+import os
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from quantization import STORAGE_DTYPES, RerankFile, quantize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported on first use, not at app start (see README "Cold Start")
+
+_BATCH_CELLS = 1 << 24  # rows x centroids per matrix product (~64 MB of float32 scores)
+
+# a stored block of vectors: quantized codes, per-vector scales, rerank-file rows, ids
+_Block = Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]
+_FIELDS = ("codes", "scales", "rows", "ids")
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indexes of the k largest scores, best first (argpartition, then sort only those k)."""
+    import numpy as np
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index over cosine similarity, pure numpy. Vectors are clustered into
+    `nlist` lists around k-means centroids; a query scans only the `nprobe` lists whose
+    centroids are closest, so raising nprobe trades latency for recall (nprobe == nlist is
+    exact search).
+
+    Inserts are incremental: vectors added before the index holds `train_size` vectors are
+    searched exhaustively, the first insert past it trains the centroids, and later inserts
+    are assigned to the existing lists. With an automatic nlist the index re-clusters itself
+    each time it has grown 4x since the last training; `train()` does so on demand.
+
+    Lists are stored quantized to `dtype` (RAG_EMBEDDING_DTYPE), as in EmbeddingMatrix: the
+    probed lists are scanned on their codes and the best `rerank_factor * top_k` candidates
+    are re-scored exactly from the float32 originals in a RerankFile under `rerank_dir`
+    (RAG_RERANK_DIR); without one the quantized scores are returned.
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+                 train_size: Optional[int] = None, seed: int = 0, dtype: Optional[str] = None,
+                 rerank_dir: Optional[str] = None, rerank_factor: Optional[int] = None):
+        # nlist 0/None: sqrt(n) lists, chosen when the index is trained
+        self.nlist = nlist or int(os.getenv("RAG_ANN_NLIST", "0")) or None
+        self.nprobe = nprobe or int(os.getenv("RAG_ANN_NPROBE", "8"))
+        self.train_size = train_size or int(os.getenv("RAG_ANN_TRAIN_SIZE", "2048"))
+        self.seed = seed
+        self.dtype = (dtype or os.getenv("RAG_EMBEDDING_DTYPE", "float16")).lower()
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown embedding dtype {self.dtype!r}; expected one of {STORAGE_DTYPES}")
+        if rerank_dir is None:
+            rerank_dir = os.getenv("RAG_RERANK_DIR", os.path.join(".cache", "vectors"))
+        self.rerank_factor = rerank_factor or int(os.getenv("RAG_RERANK_FACTOR", "4"))
+        # float32 lists need no re-rank: the scan is already exact
+        self._rerank: Optional[RerankFile] = (RerankFile(rerank_dir) if rerank_dir and self.dtype != "float32"
+                                              else None)
+        self.dim: Optional[int] = None
+        self.centroids: Optional["np.ndarray"] = None
+        self.trained_on = 0  # vectors in the index when it was last trained
+        # per list: blocks of (codes, scales, rows, ids), concatenated lazily on first search;
+        # rows number the vectors in insertion order, i.e. their row in the rerank file
+        self._lists: List[List[_Block]] = []
+        self._pending: List[_Block] = []
+
+    def __len__(self) -> int:
+        blocks = self._pending + [b for blocks in self._lists for b in blocks]
+        return int(sum(len(b[3]) for b in blocks))
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory (centroids and the codes, scales, rows and ids of every list)."""
+        blocks = self._pending + [b for blocks in self._lists for b in blocks]
+        centroids = self.centroids.nbytes if self.trained else 0
+        return int(centroids + sum(a.nbytes for b in blocks for a in b))
+
+    def _concat(self, blocks: List[_Block]) -> _Block:
+        import numpy as np
+        if not blocks:
+            return (np.empty((0, self.dim or 0), dtype=self.dtype), np.empty(0, dtype=np.float32),
+                    np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        if len(blocks) == 1:
+            return blocks[0]
+        return tuple(np.concatenate([b[field] for b in blocks]) for field in range(4))
+
+    # ---------------- building ----------------
+
+    @staticmethod
+    def _nearest(codes: "np.ndarray", centroids: "np.ndarray") -> "np.ndarray":
+        """
+        Closest centroid of every vector, in batches that bound the score matrix. The
+        per-vector scale does not change which centroid is closest, so codes are compared as is.
+        """
+        import numpy as np
+        labels = np.empty(len(codes), dtype=np.int64)
+        batch = max(1, _BATCH_CELLS // len(centroids))
+        for start in range(0, len(codes), batch):
+            vectors = codes[start:start + batch].astype(np.float32)
+            labels[start:start + batch] = np.argmax(vectors @ centroids.T, axis=1)
+        return labels
+
+    def _kmeans(self, codes: "np.ndarray", scales: "np.ndarray", nlist: int,
+                iterations: int = 10) -> "np.ndarray":
+        """Spherical k-means on a sample of at most 64 vectors per list."""
+        import numpy as np
+        rng = np.random.default_rng(self.seed)
+        picked = rng.choice(len(codes), min(len(codes), 64 * nlist), replace=False)
+        sample = codes[picked].astype(np.float32) * scales[picked, None]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._nearest(sample, centroids)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # per-list sums: sort rows by list, then one reduceat over the non-empty lists
+            order = np.argsort(labels, kind="stable")
+            starts = np.cumsum(counts) - counts
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # re-seed empty lists with random sample vectors
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+        return centroids
+
+    def _insert(self, block: _Block) -> None:
+        import numpy as np
+        labels = self._nearest(block[0], self.centroids)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        for list_no in range(len(self.centroids)):
+            rows = order[bounds[list_no]:bounds[list_no + 1]]
+            if len(rows):
+                self._lists[list_no].append(tuple(field[rows] for field in block))
+
+    def _all(self) -> _Block:
+        return self._concat(self._pending + [b for blocks in self._lists for b in blocks])
+
+    def train(self) -> None:
+        """(Re-)cluster every vector in the index and rebuild the lists."""
+        block = self._all()
+        if not len(block[3]):
+            return
+        nlist = min(len(block[3]), self.nlist or max(1, int(len(block[3]) ** 0.5)))
+        self.centroids = self._kmeans(block[0], block[1], nlist)
+        self._lists = [[] for _ in range(nlist)]
+        self._pending = []
+        self.trained_on = len(block[3])
+        self._insert(block)
+
+    def add(self, vectors: "np.ndarray", ids: "np.ndarray") -> None:
+        """Insert vectors (one row each) under integer ids; they need not be normalized."""
+        import numpy as np
+        vectors = _normalize(np.atleast_2d(vectors))
+        self.dim = self.dim or vectors.shape[1]
+        start = len(self)
+        codes, scales = quantize(vectors, self.dtype)
+        block = (codes, scales, np.arange(start, start + len(vectors), dtype=np.int64),
+                 np.asarray(ids, dtype=np.int64))
+        if self._rerank:
+            self._rerank.append(vectors)
+        if self.trained:
+            self._insert(block)
+            if self.nlist is None and len(self) >= 4 * self.trained_on:
+                self.train()
+            return
+        self._pending.append(block)
+        if len(self) >= self.train_size:
+            self.train()
+
+    # ---------------- search ----------------
+
+    def _list(self, list_no: int) -> _Block:
+        if len(self._lists[list_no]) > 1:
+            self._lists[list_no] = [self._concat(self._lists[list_no])]
+        return self._concat(self._lists[list_no])
+
+    def search(self, query: "np.ndarray", top_k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(id, cosine similarity) of the top_k nearest vectors, best first."""
+        import numpy as np
+        if not len(self):
+            return []
+        q = _normalize(query)
+        if not self.trained:
+            codes, scales, rows, ids = self._all()
+        else:
+            probe = _top_k(self.centroids @ q, min(nprobe or self.nprobe, len(self.centroids)))
+            codes, scales, rows, ids = self._concat([self._list(int(list_no)) for list_no in probe])
+        scores = (codes.astype(np.float32) @ q) * scales
+        top = _top_k(scores, min(len(scores), top_k * self.rerank_factor if self._rerank else top_k))
+        # candidates in file order, so the memory map is read front to back
+        candidates = top[np.argsort(rows[top])]
+        originals = self._rerank.read(rows[candidates]) if self._rerank else None
+        if originals is not None:
+            scores = originals @ q
+            best = _top_k(scores, min(top_k, len(candidates)))
+            return [(int(ids[candidates[i]]), float(scores[i])) for i in best]
+        return [(int(ids[i]), float(scores[i])) for i in top[:top_k]]
+
+    # ---------------- persistence ----------------
+
+    def save_originals(self, path: str) -> None:
+        """Write the float32 originals to `path` (next to a saved index) for `attach_originals`."""
+        if self._rerank:
+            self._rerank.save(path)
+
+    def attach_originals(self, path: str) -> None:
+        if self._rerank:
+            self._rerank.attach(path)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to one .npz file (lists stored contiguously with offsets) and the
+        float32 originals for the re-rank next to it (`path` + ".f32").
+        """
+        import numpy as np
+        arrays = {f"pending_{name}": field for name, field in zip(_FIELDS, self._concat(self._pending))}
+        if self.trained:
+            lists = [self._list(n) for n in range(len(self.centroids))]
+            arrays.update(
+                centroids=self.centroids,
+                trained_on=np.array(self.trained_on),
+                offsets=np.cumsum([0] + [len(b[3]) for b in lists]),
+                **dict(zip(_FIELDS, self._concat(lists))),
+            )
+        params = {"nlist": self.nlist, "nprobe": self.nprobe, "train_size": self.train_size,
+                  "seed": self.seed, "dim": self.dim, "dtype": self.dtype, "rerank_factor": self.rerank_factor}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, params=np.array(json.dumps(params)), **arrays)
+        self.save_originals(path + ".f32")
+
+    @classmethod
+    def load(cls, path: str) -> "IVFFlatIndex":
+        import numpy as np
+        with np.load(path) as data:
+            params = json.loads(str(data["params"]))
+            index = cls(nlist=params["nlist"], nprobe=params["nprobe"], train_size=params["train_size"],
+                        seed=params["seed"], dtype=params["dtype"], rerank_factor=params["rerank_factor"])
+            index.dim = params["dim"]
+            if len(data["pending_ids"]):
+                index._pending = [tuple(data[f"pending_{name}"] for name in _FIELDS)]
+            if "centroids" in data.files:
+                index.centroids = data["centroids"]
+                index.trained_on = int(data["trained_on"])
+                offsets = data["offsets"]
+                fields = [data[name] for name in _FIELDS]
+                index._lists = [[tuple(field[a:b] for field in fields)] for a, b in zip(offsets[:-1], offsets[1:])]
+        if index._rerank:
+            index._rerank.rows, index._rerank.dim = len(index), index.dim
+            index.attach_originals(path + ".f32")
+        return index
+
+
+def exact_search(vectors: "np.ndarray", query: "np.ndarray", top_k: int) -> List[Tuple[int, float]]:
+    """Brute-force cosine search over normalized `vectors` (row index as id) — the recall baseline."""
+    scores = vectors @ _normalize(query)
+    return [(int(i), float(scores[i])) for i in _top_k(scores, min(top_k, len(scores)))]
@@ -0,0 +1,191 @@
+# services/answer_cache.py
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Tuple
+
+from lexical_index import tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported on first use, not at app start (see README "Cold Start")
+
+
+def text_key(text: str) -> str:
+    """Hash of the document text the answers were grounded in; a changed document gets a new key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# question words that say nothing about what is asked (English and German)
+_STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from has have how in is it its me of on or
+our please show tell that the their there this to was what when where which who why will with
+you your
+am auf aus bei das dem den der des die ein eine einen es für gibt ist im in mit und von wann
+was welche welcher welches wer wie wo zu zum zur
+""".split())
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"[\W_]+", " ", question.lower()).strip()
+
+
+def _question_terms(question: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """
+    (content words, numbers and dates) of a question, tokenized like the BM25 index. Numbers
+    are reduced to their digits, so "1.234,56" and "1234.56" are the same amount.
+    """
+    words, numbers = set(), set()
+    for term in tokenize(question):
+        digits = re.sub(r"\D", "", term)
+        if digits:
+            numbers.add(digits)
+        elif len(term) > 1 and term not in _STOPWORDS:
+            words.add(term)
+    return frozenset(words), frozenset(numbers)
+
+
+def _same_subject(a: Tuple[FrozenSet[str], FrozenSet[str]], b: Tuple[FrozenSet[str], FrozenSet[str]],
+                  min_overlap: float) -> bool:
+    """The same numbers and dates, and content words overlapping by at least `min_overlap` (Jaccard)."""
+    (words_a, numbers_a), (words_b, numbers_b) = a, b
+    if numbers_a != numbers_b:
+        return False
+    union = words_a | words_b
+    return not union or len(words_a & words_b) / len(union) >= min_overlap
+
+
+class AnswerCache:
+    """
+    Process-wide cache of chat answers, per document and model. A new question is matched
+    against the document's earlier questions by embedding similarity (at least `threshold`,
+    CHAT_CACHE_THRESHOLD) or, without an embedding (lexical mode), by normalized text; a hit
+    returns the stored answer and the chunk ids it cited without retrieval or a completion.
+    Similar embeddings are not enough on their own: the questions must also ask about the
+    same numbers and dates and share content words (`min_overlap`, CHAT_CACHE_MIN_OVERLAP),
+    so "daily rate" never answers "hourly rate" and "invoice 2023" never answers "invoice 2024".
+
+    Answers are keyed by the hash of the document text, so they are shared across sessions
+    that view the same contract and never served for a changed document. At most
+    CHAT_CACHE_DOCUMENTS documents are kept, answers and counters alike (least recently used
+    are dropped).
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_documents: Optional[int] = None,
+                 max_answers: int = 256, min_overlap: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("CHAT_CACHE_THRESHOLD", "0.92"))
+        self.min_overlap = (min_overlap if min_overlap is not None
+                            else float(os.getenv("CHAT_CACHE_MIN_OVERLAP", "0.5")))
+        self.max_documents = max_documents or int(os.getenv("CHAT_CACHE_DOCUMENTS", "256"))
+        self.max_answers = max_answers
+        self._entries: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()  # doc/model -> answers
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "tokens_saved": 0}
+        self._documents: "OrderedDict[str, Dict[str, int]]" = OrderedDict()  # doc -> counters
+
+    @staticmethod
+    def _key(doc_key: str, model: Optional[str]) -> str:
+        return f"{doc_key}:{model or ''}"
+
+    def _count(self, doc_key: str, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+        doc = self._documents.setdefault(doc_key, {"hits": 0, "misses": 0, "tokens_saved": 0})
+        doc[name] += n
+        self._documents.move_to_end(doc_key)
+        while len(self._documents) > self.max_documents:
+            self._documents.popitem(last=False)
+
+    def lookup(self, doc_key: str, question: str, embedding: Optional["np.ndarray"] = None,
+               model: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        The cached answer closest to `question`, or None. A hit is returned as
+        {question, answer, chunk_ids, tokens, similarity}.
+        """
+        normalized = _normalize_question(question)
+        terms = _question_terms(question)
+        q = None
+        if embedding is not None:
+            import numpy as np
+            q = np.asarray(embedding, dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            key = self._key(doc_key, model)
+            best, best_similarity = None, 0.0
+            for entry in self._entries.get(key, []):
+                if entry["normalized"] == normalized:
+                    best, best_similarity = entry, 1.0
+                    break
+                if q is not None and entry["embedding"] is not None:
+                    similarity = float(entry["embedding"] @ q)
+                    if (similarity >= self.threshold and similarity > best_similarity
+                            and _same_subject(terms, entry["terms"], self.min_overlap)):
+                        best, best_similarity = entry, similarity
+            if best is None:
+                self._count(doc_key, "misses")
+                return None
+            self._entries.move_to_end(key)
+            best["hits"] += 1
+            self._count(doc_key, "hits")
+            self._count(doc_key, "tokens_saved", best["tokens"])
+            return {"question": best["question"], "answer": best["answer"], "chunk_ids": best["chunk_ids"],
+                    "tokens": best["tokens"], "similarity": round(best_similarity, 4)}
+
+    def store(self, doc_key: str, question: str, answer: str, chunk_ids: List[str], tokens: int,
+              embedding: Optional["np.ndarray"] = None, model: Optional[str] = None) -> None:
+        """Remember an answer; `tokens` is what it cost (prompt + completion), saved on each hit."""
+        vector = None
+        if embedding is not None:
+            import numpy as np
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        entry = {"question": question, "normalized": _normalize_question(question),
+                 "terms": _question_terms(question), "embedding": vector,
+                 "answer": answer, "chunk_ids": list(chunk_ids), "tokens": int(tokens),
+                 "created": time.time(), "hits": 0}
+        with self._lock:
+            key = self._key(doc_key, model)
+            answers = self._entries.setdefault(key, [])
+            answers[:] = [e for e in answers if e["normalized"] != entry["normalized"]]
+            answers.append(entry)
+            del answers[:-self.max_answers]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_documents:
+                evicted, _ = self._entries.popitem(last=False)
+                self._documents.pop(evicted.split(":", 1)[0], None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._documents.clear()
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def stats(self, doc_key: Optional[str] = None) -> Dict[str, Any]:
+        """Hits, misses, hit rate and tokens saved, for one document or the whole process."""
+        with self._lock:
+            counters = dict(self._documents.get(doc_key, {"hits": 0, "misses": 0, "tokens_saved": 0})
+                            if doc_key else self.counters)
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+            if not doc_key:
+                counters["answers"] = sum(len(a) for a in self._entries.values())
+                counters["documents"] = len(self._entries)
+            return counters
+
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide AnswerCache shared by every Streamlit session."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = AnswerCache()
+    return _CACHE
@@ -6,11 +6,38 @@ from typing import Optional, Dict, Any
 import streamlit as st
 
 from config import AppConfig
-from services.azure_clients import AzureClientManager
-from services.document_extractor import DocumentExtractor
-from services.contract_analyzer import ContractAnalyzer
-from ui.styles import Styles
-from ui.display_manager import DisplayManager
+from azure_clients import AzureClientManager
+from document_extractor import DocumentExtractor
+from contract_analyzer import ContractAnalyzer
+from rate_table import attach_rate_table
+from jobs import DONE, get_job_queue
+from styles import Styles
+from display_manager import DisplayManager
+from batch_view import attach_batch, current_batch_id, render_batch_progress, render_batch_results
+from memory_view import drop, hold, load, render_memory_panel
+from render_cache import result_hash
+from job_view import attach_job, current_job_id, render_job_error, render_job_list, render_job_progress
+
+
+def run_analysis_job(job, pdf_content: bytes, file_name: str, extractor, analyzer) -> Dict[str, Any]:
+    """Extraction + analysis on a job worker; returns what the results view needs."""
+    job.update(stage="extracting", progress=10)
+    full_text, page_count, extraction_time, rate_table = extractor.extract(pdf_content)
+
+    job.update(stage="analyzing", progress=50, pages=page_count)
+    result_json, analysis_time = analyzer.analyze(full_text)
+    # read from the layout, not transcribed by the model
+    attach_rate_table(result_json, rate_table)
+
+    return {
+        "result": result_json,
+        "file_name": file_name,
+        "extraction_time": extraction_time,
+        "analysis_time": analysis_time,
+        "page_count": page_count,
+        "processing_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
 
 def main():
     # Page setup + styles
@@ -29,101 +56,135 @@ def main():
     if not AppConfig.validate():
         st.stop()
 
-    # Initialize Azure clients
-    try:
-        azure = AzureClientManager()
-        doc_client = getattr(azure, "doc_client", None)
-        openai_client = getattr(azure, "openai_client", None)
-        if doc_client is None or openai_client is None:
-            raise RuntimeError("Azure clients not fully initialized. Check environment variables.")
-    except Exception as e:
+    # Azure clients are created on the first Analyze click, not on page load
+    azure = AzureClientManager()
+    if not azure.configured:
         st.error("Failed to initialize Azure clients.")
-        st.exception(e)
+        st.exception(RuntimeError("Azure clients not fully initialized. Check environment variables."))
         st.stop()
 
-    extractor = DocumentExtractor(doc_client)
-    analyzer = ContractAnalyzer(openai_client)
-
     # Sidebar info
     with st.sidebar:
         st.header("ℹ️ Application Info")
         st.info("**Document Validator v1.0**\n\nThis application uses Azure Document Intelligence to extract text from PDFs and Azure OpenAI to analyze contract content automatically.")
         st.divider()
+        render_job_list(get_job_queue())
+        render_memory_panel()
 
     # Session state defaults
     if "processing_complete" not in st.session_state:
         st.session_state.processing_complete = False
-        st.session_state.result = None
         st.session_state.file_name = None
         st.session_state.extraction_time = 0.0
         st.session_state.analysis_time = 0.0
         st.session_state.page_count = 0
         st.session_state.processing_time = ""
 
+    # Reattach to this page's background job (survives refreshes, shareable via ?job=)
+    queue = get_job_queue()
+    job_id = current_job_id()
+    job = queue.get(job_id)
+    job_loaded = False
+    if job_id and job is None:
+        attach_job(None)
+    elif job is not None and job.status == DONE and st.session_state.get("loaded_job_id") != job.id:
+        for key, value in job.output.items():
+            if key == "result":
+                # held by reference in the memory-bounded artifact store
+                hold("result", value, key=result_hash(value))
+            else:
+                setattr(st.session_state, key, value)
+        st.session_state.processing_complete = True
+        st.session_state.loaded_job_id = job.id
+        job_loaded = True
+
+    # Multi-file uploads run as a batch of jobs (?batch=)
+    batch_id = current_batch_id()
+    batch = queue.batch(batch_id)
+    if batch_id and batch is None:
+        attach_batch(None)
+
     # File upload
-    st.subheader("📤 Upload Document")
-    uploaded_file = st.file_uploader("Select a PDF document to analyze", type="pdf")
+    st.subheader("📤 Upload Documents")
+    uploaded_files = st.file_uploader("Select one or more PDF documents to analyze", type="pdf",
+                                      accept_multiple_files=True) or []
 
-    if uploaded_file is not None:
-        DisplayManager.show_file_info(uploaded_file)
+    if uploaded_files:
+        for uploaded_file in uploaded_files:
+            DisplayManager.show_file_info(uploaded_file)
 
         col1, col2 = st.columns(2)
         with col1:
-            process_button = st.button("🚀 Analyze Document", type="primary")
+            label = "🚀 Analyze Document" if len(uploaded_files) == 1 else f"🚀 Analyze {len(uploaded_files)} Documents"
+            process_button = st.button(label, type="primary")
         with col2:
             clear_button = st.button("🔄 Clear Results")
 
         if clear_button:
             st.session_state.processing_complete = False
-            st.session_state.result = None
+            drop()
             st.session_state.file_name = None
-            st.experimental_rerun()
+            st.session_state.loaded_job_id = None
+            attach_job(None)
+            attach_batch(None)
+            st.rerun()
 
         if process_button:
             try:
-                # Read PDF bytes
-                pdf_content = uploaded_file.read()
-
-                # Extract text
-                status = st.empty()
-                status.info("📖 Extracting text from PDF...")
-                with st.spinner("Extracting text..."):
-                    full_text, page_count, extraction_time = extractor.extract_text(pdf_content)
-
-                st.session_state.extraction_time = extraction_time
-                st.session_state.page_count = page_count
-
-                # Analyze contract
-                status.info("🔍 Analyzing contract with AI...")
-                with st.spinner("Analyzing contract..."):
-                    result_json, analysis_time = analyzer.analyze(full_text)
-
-                st.session_state.analysis_time = analysis_time
-                st.session_state.processing_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                st.session_state.result = result_json
-                st.session_state.file_name = uploaded_file.name
-                st.session_state.processing_complete = True
-
-                status.empty()
-                st.markdown('<div class="success-box">✅ <b>Document processed successfully!</b></div>', unsafe_allow_html=True)
-
+                extractor = DocumentExtractor(azure.doc_client)
+                analyzer = ContractAnalyzer(azure.openai_client)
             except Exception as e:
-                st.error("❌ Error Processing Document")
-                with st.expander("View Error Details"):
-                    st.code(str(e), language="text")
+                st.error("Failed to initialize Azure clients.")
+                st.exception(e)
+                st.stop()
+
+            # Read PDF bytes; extraction and analysis run on the job workers, one job per file
+            job_ids = [
+                queue.submit(
+                    run_analysis_job,
+                    name=uploaded_file.name,
+                    meta={"file_name": uploaded_file.name},
+                    pdf_content=uploaded_file.read(),
+                    file_name=uploaded_file.name,
+                    extractor=extractor,
+                    analyzer=analyzer,
+                )
+                for uploaded_file in uploaded_files
+            ]
+            if len(job_ids) == 1:
+                attach_batch(None)
+                attach_job(job_ids[0])
+            else:
+                attach_job(None)
+                attach_batch(queue.create_batch(job_ids))
+            st.rerun()
+
+    if batch is not None:
+        if not all(j.finished for j in batch):
+            render_batch_progress(queue, batch_id)
+        else:
+            render_batch_results(queue, batch_id)
+
+    if job is not None and not job.finished:
+        render_job_progress(queue, job.id)
+    elif job_loaded and batch is None:
+        st.markdown('<div class="success-box">✅ <b>Document processed successfully!</b></div>', unsafe_allow_html=True)
+    elif job is not None and job.status != DONE:
+        render_job_error(job)
 
     # Display results if processing complete
-    if st.session_state.processing_complete and st.session_state.result:
+    result = load("result") if st.session_state.processing_complete else None
+    if result:
         DisplayManager.show_processing_stats(
             extraction_time=st.session_state.extraction_time,
             analysis_time=st.session_state.analysis_time,
             page_count=st.session_state.page_count,
             processed_time=st.session_state.processing_time
         )
-        DisplayManager.show_results(st.session_state.result)
+        DisplayManager.show_results(result)
 
         # Download raw JSON
-        json_str = json.dumps(st.session_state.result, indent=2)
+        json_str = json.dumps(result, indent=2)
         col1, col2 = st.columns(2)
         with col1:
             st.download_button(
@@ -0,0 +1,241 @@
+# services/artifact_store.py
+import hashlib
+import itertools
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+_SAMPLE = 64  # container items measured (evenly spaced); the rest are extrapolated
+
+
+def estimate_size(obj: Any, _depth: int = 0) -> int:
+    """
+    Approximate in-memory bytes of `obj` without serializing it: `nbytes` of arrays and vector
+    stores, the length of text, and containers extrapolated from a spread of their items. Objects
+    are measured by their pickled state (`__getstate__`), so e.g. a RAG index's client is skipped.
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(obj, (str, bytes, bytearray)):
+        return len(obj)
+    if obj is None or isinstance(obj, (bool, int, float)):
+        return 8
+    if _depth > 8:
+        return 64
+    if isinstance(obj, dict):
+        sample = list(itertools.islice(obj.items(), 0, None, max(1, len(obj) // _SAMPLE)))
+        measured = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        sample = list(itertools.islice(obj, 0, None, max(1, len(obj) // _SAMPLE)))
+        measured = sum(estimate_size(v, _depth + 1) for v in sample)
+    else:
+        if type(obj).__getstate__ is not object.__getstate__:
+            state = obj.__getstate__()
+        elif hasattr(obj, "__dict__"):
+            state = vars(obj)
+        else:
+            slots = getattr(type(obj), "__slots__", ())
+            state = {name: getattr(obj, name, None) for name in slots}
+        return 64 + estimate_size(state, _depth + 1)
+    return 64 + 8 * len(obj) + (measured * len(obj) // len(sample) if sample else 0)
+
+
+class ArtifactStore:
+    """
+    Process-wide store for large per-session objects (analysis results, RAG indexes, invoice
+    reports). Sessions keep only the key; the object lives here under a global memory budget
+    (ARTIFACT_MEMORY_MB). When the budget is exceeded the least recently used objects are
+    pickled to ARTIFACT_SPILL_DIR and reloaded transparently on the next `get`.
+
+    Objects are shared by key, so two sessions viewing the same document hold one copy. An
+    object is deleted once no session references it; sessions idle for longer than
+    ARTIFACT_SESSION_TTL seconds (closed tabs) are released automatically.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None,
+                 session_ttl: Optional[float] = None):
+        self.budget_bytes = budget_bytes or int(float(os.getenv("ARTIFACT_MEMORY_MB", "512")) * 1024 * 1024)
+        self.spill_dir = spill_dir or os.getenv("ARTIFACT_SPILL_DIR", os.path.join(".cache", "artifacts"))
+        self.session_ttl = session_ttl if session_ttl is not None else float(os.getenv("ARTIFACT_SESSION_TTL", "7200"))
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()  # LRU order, most recent last
+        self._sizes: Dict[str, int] = {}
+        self._spilled: Dict[str, str] = {}  # key -> file path
+        self._owners: Dict[str, Dict[str, str]] = {}  # session -> {name: key}
+        self._seen: Dict[str, float] = {}  # session -> last access
+        self._lock = threading.RLock()
+        self.counters = {"hits": 0, "reloads": 0, "spills": 0, "evicted_bytes": 0}
+
+    # ---------------- internals ----------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key[:2], f"{key}.pkl")
+
+    def _memory_bytes(self) -> int:
+        return sum(self._sizes[k] for k in self._memory)
+
+    def _enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Spill least recently used objects until the in-memory total fits the budget."""
+        total = self._memory_bytes()
+        for key in list(self._memory):
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            obj = self._memory.pop(key)
+            if key not in self._spilled:
+                path = self._path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._spilled[key] = path
+            total -= self._sizes[key]
+            self.counters["spills"] += 1
+            self.counters["evicted_bytes"] += self._sizes[key]
+
+    def _referenced(self, key: str) -> bool:
+        return any(key in refs.values() for refs in self._owners.values())
+
+    def _drop(self, key: str) -> None:
+        self._memory.pop(key, None)
+        self._sizes.pop(key, None)
+        path = self._spilled.pop(key, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _touch(self, session_id: str) -> None:
+        self._seen[session_id] = time.time()
+        self._owners.setdefault(session_id, {})
+
+    # ---------------- public API ----------------
+
+    def put(self, session_id: str, name: str, obj: Any, key: Optional[str] = None) -> str:
+        """
+        Hold `obj` for `session_id` under `name` (e.g. "result"), replacing what that name held
+        before. `key` defaults to the content hash of the pickled object; pass one (a result hash,
+        a document key) to skip serializing it. Its size is estimated (`estimate_size`), and it
+        is only pickled when spilled. Returns the key.
+        """
+        if key is None:
+            key = content_key(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        size = estimate_size(obj)
+        self.prune()
+        with self._lock:
+            self._touch(session_id)
+            previous = self._owners[session_id].get(name)
+            self._owners[session_id][name] = key
+            if previous and previous != key and not self._referenced(previous):
+                self._drop(previous)
+            self._memory[key] = obj
+            self._memory.move_to_end(key)
+            self._sizes[key] = size
+            self._enforce_budget(keep=key)
+        return key
+
+    def get(self, session_id: str, name: str) -> Any:
+        """The object `session_id` holds under `name`, reloaded from disk if it was spilled."""
+        with self._lock:
+            self._touch(session_id)
+            key = self._owners[session_id].get(name)
+            if key is None:
+                return None
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters["hits"] += 1
+                return self._memory[key]
+            path = self._spilled.get(key)
+            if path is None or not os.path.exists(path):
+                del self._owners[session_id][name]
+                return None
+            with open(path, "rb") as f:
+                obj = pickle.load(f)
+            self._memory[key] = obj
+            self.counters["reloads"] += 1
+            self._enforce_budget(keep=key)
+            return obj
+
+    def key(self, session_id: str, name: str) -> Optional[str]:
+        with self._lock:
+            return self._owners.get(session_id, {}).get(name)
+
+    def release(self, session_id: str, name: Optional[str] = None) -> None:
+        """Forget one of the session's objects, or all of them when `name` is None."""
+        with self._lock:
+            refs = self._owners.get(session_id, {})
+            names = [name] if name else list(refs)
+            for n in names:
+                key = refs.pop(n, None)
+                if key and not self._referenced(key):
+                    self._drop(key)
+            if name is None:
+                self._owners.pop(session_id, None)
+                self._seen.pop(session_id, None)
+
+    def prune(self) -> int:
+        """Release sessions idle for longer than the TTL; returns how many were released."""
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            idle = [s for s, seen in self._seen.items() if seen < cutoff]
+            for session_id in idle:
+                self.release(session_id)
+        return len(idle)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._sizes.clear()
+            self._spilled.clear()
+            self._owners.clear()
+            self._seen.clear()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "memory_bytes": self._memory_bytes(),
+                "disk_bytes": sum(self._sizes[k] for k in self._spilled),
+                "objects": len(self._sizes),
+                "in_memory": len(self._memory),
+                "sessions": len(self._owners),
+                **self.counters,
+            }
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """Per-session footprint: bytes in memory and on disk, and what it holds."""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for session_id, refs in self._owners.items():
+                keys = set(refs.values())
+                rows.append({
+                    "session": session_id,
+                    "artifacts": ", ".join(sorted(refs)),
+                    "memory_bytes": sum(self._sizes.get(k, 0) for k in keys if k in self._memory),
+                    "disk_bytes": sum(self._sizes.get(k, 0) for k in keys if k not in self._memory and k in self._spilled),
+                    "idle_seconds": round(now - self._seen.get(session_id, now)),
+                })
+            return sorted(rows, key=lambda r: r["memory_bytes"], reverse=True)
+
+
+_STORE: Optional[ArtifactStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Process-wide ArtifactStore shared by every Streamlit session."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = ArtifactStore()
+    return _STORE
@@ -0,0 +1,174 @@
+# ui/batch_view.py
+import csv
+import io
+import json
+import time
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from jobs import DONE, Job, JobQueue
+from comparison import flatten_validation
+from job_view import POLL_SECONDS, STATUS_ICONS, attach_job
+from render_cache import HIDDEN_KEYS
+
+STATUSES = ("Correct", "Mismatch", "Missing")
+
+
+def current_batch_id() -> Optional[str]:
+    """Batch attached to this page: the ?batch= query parameter survives refreshes and can be shared."""
+    return st.query_params.get("batch") or st.session_state.get("batch_id")
+
+
+def attach_batch(batch_id: Optional[str]) -> None:
+    st.session_state.batch_id = batch_id
+    if batch_id:
+        st.query_params["batch"] = batch_id
+    elif "batch" in st.query_params:
+        del st.query_params["batch"]
+
+
+def progress_rows(jobs: List[Job]) -> List[Dict[str, Any]]:
+    """One row per file: status, current stage, progress and the time spent in each stage."""
+    rows = []
+    for job in jobs:
+        snap = job.snapshot()
+        times = snap["stage_times"]
+        rows.append({
+            "File": snap.get("file_name", snap["name"]),
+            "Status": f"{STATUS_ICONS.get(snap['status'], '')} {snap['status']}",
+            "Stage": snap["stage"],
+            "Progress": snap["progress"],
+            "Queued (s)": round(times.get("queued", 0.0), 1),
+            "Extracting (s)": round(times.get("extracting", 0.0), 1),
+            "Analyzing (s)": round(times.get("analyzing", 0.0), 1),
+            "Elapsed (s)": round(snap["elapsed"], 1),
+        })
+    return rows
+
+
+def summary_rows(jobs: List[Job]) -> List[Dict[str, Any]]:
+    """Combined view of a finished batch: one row per file with its validation counts."""
+    rows = []
+    for job in jobs:
+        row: Dict[str, Any] = {"file": job.meta.get("file_name", job.name), "status": job.status}
+        if job.status == DONE:
+            output = job.output
+            result = output["result"]
+            statuses = [r["status"] for r in flatten_validation(result)]
+            row.update({
+                "template": (result.get("template_classification") or {}).get("type"),
+                "supplier": (result.get("supplier_details") or {}).get("name"),
+                **{status: statuses.count(status) for status in STATUSES},
+                "pages": output.get("page_count"),
+                "extraction_s": round(output.get("extraction_time") or 0.0, 2),
+                "analysis_s": round(output.get("analysis_time") or 0.0, 2),
+            })
+        else:
+            row["error"] = (job.error or "").splitlines()[0] if job.error else job.status
+        rows.append(row)
+    return rows
+
+
+def _csv(rows: List[Dict[str, Any]]) -> str:
+    fields: List[str] = []
+    for row in rows:
+        fields += [k for k in row if k not in fields]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def batch_zip(batch_id: str, job_ids: Tuple[str, ...], _jobs: List[Job]) -> bytes:
+    """
+    Consolidated download: one JSON per file, summary.csv and every file's validation rows in
+    validation_rows.csv. Built once per batch (job_ids only change if jobs are pruned).
+    """
+    validation = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index, job in enumerate(_jobs, start=1):
+            if job.status != DONE:
+                continue
+            file_name = job.output["file_name"]
+            result = job.output["result"]
+            payload = {k: v for k, v in result.items() if k not in HIDDEN_KEYS}
+            stem = file_name.rsplit(".", 1)[0]
+            archive.writestr(f"{index:02d}_{stem}.json", json.dumps(payload, indent=2, ensure_ascii=False))
+            validation += [{"file": file_name, **row} for row in flatten_validation(result)]
+        archive.writestr("summary.csv", _csv(summary_rows(_jobs)))
+        if validation:
+            archive.writestr("validation_rows.csv", _csv(validation))
+    return buffer.getvalue()
+
+
+def _render_progress(jobs: List[Job]) -> None:
+    finished = sum(job.finished for job in jobs)
+    st.progress(int(100 * finished / len(jobs)) if jobs else 0,
+                text=f"⚙️ {finished}/{len(jobs)} documents finished")
+    st.dataframe(
+        progress_rows(jobs),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"Progress": st.column_config.ProgressColumn("Progress", min_value=0, max_value=100)},
+    )
+
+
+def render_batch_progress(queue: JobQueue, batch_id: str) -> None:
+    """
+    Per-file progress table of a running batch, polled inside a fragment like
+    `render_job_progress`; the page reruns once every file has finished.
+    """
+    if hasattr(st, "fragment"):
+        @st.fragment(run_every=POLL_SECONDS)
+        def poll():
+            jobs = queue.batch(batch_id)
+            if not jobs or all(job.finished for job in jobs):
+                st.rerun()
+            _render_progress(jobs)
+        poll()
+        return
+
+    jobs = queue.batch(batch_id) or []
+    if jobs:
+        _render_progress(jobs)
+        if not all(job.finished for job in jobs):
+            time.sleep(POLL_SECONDS)
+    st.rerun()
+
+
+def render_batch_results(queue: JobQueue, batch_id: str) -> None:
+    """Combined results of a finished batch, the consolidated ZIP and a picker to open one file."""
+    jobs = queue.batch(batch_id) or []
+    if not jobs:
+        return
+    done = [job for job in jobs if job.status == DONE]
+
+    st.subheader(f"📚 Batch Results ({len(done)}/{len(jobs)} documents)")
+    with st.expander("⏱️ Per-file timings", expanded=False):
+        st.dataframe(progress_rows(jobs), use_container_width=True, hide_index=True)
+    st.dataframe(summary_rows(jobs), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        if done:
+            labels = {job.id: job.output["file_name"] for job in done}
+            choice = st.selectbox("Open a document", list(labels), format_func=labels.get,
+                                  index=list(labels).index(st.session_state.get("loaded_job_id"))
+                                  if st.session_state.get("loaded_job_id") in labels else 0)
+            if st.button("📄 Show Details") and choice != st.session_state.get("loaded_job_id"):
+                attach_job(choice)
+                st.rerun()
+    with col2:
+        if done:
+            st.download_button(
+                label="⬇️ Download All (ZIP)",
+                data=batch_zip(batch_id, tuple(job.id for job in jobs), jobs),
+                file_name=f"contract_batch_{batch_id}.zip",
+                mime="application/zip",
+                use_container_width=True,
+            )
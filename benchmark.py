@@ -0,0 +1,524 @@
+# benchmark.py
+"""
+Offline pipeline benchmark with recorded Document Intelligence / Azure OpenAI fixtures.
+
+Record real payloads once (needs the Azure credentials from .env):
+    python benchmark.py record "Joemon Jesudas.pdf" KT06S2200087_06_2022.pdf
+
+Replay them with no network and time every local stage:
+    python benchmark.py run --synthetic-pages 500 --repeat 5 --out bench.json
+    python benchmark.py run --baseline bench_main.json --threshold 0.2
+    python benchmark.py run --import-profile strem app   # cold-start import cost only: add --no-documents
+
+Compare the IVF-flat chat index with exact search on synthetic embeddings (recall@k, latency):
+    python benchmark.py ann --sizes 10000 100000 1000000 --nprobe 1 4 8 16 32
+
+PDFs without recorded fixtures are replayed from a layout built locally with PyMuPDF and a
+synthetic all-Correct contract result, so every PDF in the repo can be benchmarked offline.
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from strem import analyze_contract, extract_text_from_pdf, get_azure_clients
+from rag import SimpleRAG
+from ann_index import IVFFlatIndex, exact_search
+from comparison import flatten_validation
+from excel_writer import convert_validation_to_excel
+from pdf_annotator import annotate_pdf_with_chunks, build_highlights_from_analyze_result
+from rate_table import attach_rate_table, extract_rate_table
+from fixtures import (
+    FixtureStore,
+    RecordingDocumentClient,
+    RecordingOpenAI,
+    ReplayDocumentClient,
+    ReplayOpenAI,
+    SimulatedLatency,
+)
+
+REPORT_VERSION = 1
+
+RAG_QUERIES = [
+    "What is the remuneration and how is it calculated?",
+    "Who are the contracting parties?",
+    "What is the invoice address?",
+    "How many signatures does the contract have?",
+]
+
+# Exact-token lookups answered by the BM25 index alone (no embedding call, so no fixtures)
+LEXICAL_QUERIES = ["CWID", "2.1", "EUR", "VAT ID", "31.12."]
+
+# Third-party packages the app should not load before the first page (see README "Cold Start")
+HEAVY_PACKAGES = ["pandas", "numpy", "openpyxl", "fitz", "openai", "azure", "httpx", "requests"]
+
+HIGHLIGHT_KEYWORDS = ["Allianz", "VAT", "Remuneration", "Invoice", "Signature"]
+
+CLAUSES = [
+    "The Supplier shall provide the services described in Annex {n} in accordance with this Agreement.",
+    "Remuneration is calculated on a time and material basis at a daily rate of EUR {rate}.00 plus VAT.",
+    "Invoices shall be addressed to Allianz Technology SE, Königinstrasse 28, 80802 München.",
+    "The Supplier may engage subcontractors only with the prior written consent of Allianz.",
+    "Personal data shall be processed solely in accordance with the Data Processing Agreement.",
+    "This Agreement commences on 01.{month:02d}.2022 and ends on 31.12.2023 unless terminated earlier.",
+    "Travel expenses are reimbursed in accordance with the Allianz travel policy in force.",
+    "The place of performance is Unterföhring, Germany, unless otherwise agreed in writing.",
+    "Either party may terminate this Agreement with {n} months' notice to the end of a calendar month.",
+    "The project manager of the Supplier is responsible for the coordination of all deliverables.",
+]
+
+
+# ---------------- documents ----------------
+
+def synthetic_contract_pdf(pages: int, seed: int = 42, lines_per_page: int = 45) -> bytes:
+    """A deterministic multi-page Non-IT style contract used to benchmark long documents."""
+    import fitz  # PyMuPDF, imported on first use
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    try:
+        for number in range(1, pages + 1):
+            page = doc.new_page()
+            y = 60
+            if number == 1:
+                page.insert_text((60, y), "CONSULTING AGREEMENT", fontsize=14)
+                y += 30
+            page.insert_text((60, y), f"Section {number}", fontsize=11)
+            y += 20
+            for _ in range(lines_per_page - 2):
+                clause = rnd.choice(CLAUSES).format(n=rnd.randint(1, 9), rate=rnd.randint(600, 1400),
+                                                    month=rnd.randint(1, 12))
+                page.insert_text((60, y), clause[:95], fontsize=8)
+                y += 15
+            page.insert_text((60, 800), "Signature Allianz ______   Signature Supplier ______", fontsize=8)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def load_documents(paths: List[str], synthetic_pages: List[int]) -> Dict[str, bytes]:
+    documents = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            documents[os.path.basename(path)] = f.read()
+    for pages in synthetic_pages:
+        documents[f"synthetic_{pages}p.pdf"] = synthetic_contract_pdf(pages)
+    return documents
+
+
+# ---------------- timing ----------------
+
+def _stats(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(samples),
+        "mean": round(statistics.fmean(samples), 6),
+        "median": round(statistics.median(samples), 6),
+        "p95": round(p95, 6),
+        "min": round(ordered[0], 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def time_stage(fn: Callable[[], Any], repeat: int) -> tuple:
+    """Run `fn` `repeat` times. Returns (last_result, stats)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, _stats(samples)
+
+
+def benchmark_document(pdf_content: bytes, doc_client: ReplayDocumentClient,
+                       openai_client: ReplayOpenAI, repeat: int) -> Dict[str, Any]:
+    """Time each local pipeline stage for one document against replayed service payloads."""
+    doc_client.stats.reset()
+    openai_client.stats.reset()
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    # warm-up: loads (or synthesizes) the layout fixture so it is not part of the first timed run
+    layout = doc_client.begin_analyze_document(model_id="prebuilt-layout", body=pdf_content).result()
+
+    (full_text, page_count, _), stages["extract_text_from_pdf"] = time_stage(
+        lambda: extract_text_from_pdf(pdf_content, doc_client), repeat)
+
+    (result, _), stages["analyze_contract"] = time_stage(
+        lambda: analyze_contract(full_text, openai_client), repeat)
+
+    # the rate table is read from the layout and checked against the result, as in run_contract_job
+    _, stages["rate_table"] = time_stage(
+        lambda: attach_rate_table(copy.deepcopy(result), extract_rate_table(layout.as_dict())), repeat)
+
+    rag = SimpleRAG(openai_client)
+    _, stages["rag_chunk"] = time_stage(lambda: rag.chunk_text(full_text), repeat)
+    _, stages["rag_build_index"] = time_stage(lambda: rag.build_index_from_text(full_text), repeat)
+    _, stages["rag_retrieve"] = time_stage(
+        lambda: [rag.retrieve(q, top_k=4) for q in RAG_QUERIES], repeat)
+    _, stages["rag_retrieve_lexical"] = time_stage(
+        lambda: [rag.retrieve(q, top_k=4, mode="lexical") for q in LEXICAL_QUERIES], repeat)
+
+    _, stages["flatten_validation"] = time_stage(lambda: flatten_validation(result), repeat)
+    _, stages["convert_validation_to_excel"] = time_stage(
+        lambda: convert_validation_to_excel(result), repeat)
+
+    highlights = build_highlights_from_analyze_result(layout.as_dict(), HIGHLIGHT_KEYWORDS)
+    _, stages["annotate_pdf_with_chunks"] = time_stage(
+        lambda: annotate_pdf_with_chunks(pdf_content, highlights), repeat)
+
+    di_stats, openai_stats = doc_client.stats.snapshot(), openai_client.stats.snapshot()
+    return {
+        "pages": page_count,
+        "characters": len(full_text),
+        "chunks": rag.index_size(),
+        "vector_bytes": getattr(rag.vectors, "nbytes", None),
+        "highlights": sum(len(v) for v in highlights.values()),
+        "fixtures": {
+            "document_intelligence": di_stats,
+            "openai": openai_stats,
+            "source": "recorded" if di_stats["misses"] == 0 and openai_stats["misses"] == 0 else "synthesized",
+        },
+        "stages": stages,
+    }
+
+
+# ---------------- report ----------------
+
+def _importtime(module: str) -> tuple:
+    """Import `module` in a fresh interpreter with -X importtime; returns (wall seconds, stderr)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=here)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    return wall, proc.stderr
+
+
+def import_profile(module: str, repeat: int = 3, top: int = 15) -> Dict[str, Any]:
+    """
+    Cold-start cost of importing `module`: wall time of fresh interpreters (minus bare interpreter
+    start-up) and the slowest imports (the module and what it imports directly) by cumulative
+    time from `-X importtime`.
+    """
+    interpreter = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interpreter.append(time.perf_counter() - start)
+
+    walls, cumulative, loaded = [], {}, set()
+    for _ in range(repeat):
+        wall, stderr = _importtime(module)
+        walls.append(wall)
+        # "import time: self [us] | cumulative | imported package"; nested imports are indented
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            _, cum_us, name = line[len("import time:"):].split("|", 2)
+            loaded.add(name.strip().split(".")[0])
+            if (len(name) - len(name.lstrip()) - 1) // 2 > 1:  # keep the module and its direct imports
+                continue
+            cumulative.setdefault(name.strip(), []).append(int(cum_us))
+
+    slowest = sorted(cumulative.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:top]
+    return {
+        "wall": _stats(walls),
+        "interpreter": _stats(interpreter),
+        "import_seconds": round(statistics.median(walls) - statistics.median(interpreter), 4),
+        "heavy_loaded": sorted(p for p in HEAVY_PACKAGES if p in loaded),
+        "top": [{"module": name, "cumulative_ms": round(statistics.median(us) / 1000, 2)} for name, us in slowest],
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2,
+                    min_seconds: float = 0.001) -> List[Dict[str, Any]]:
+    """
+    Stages whose median got slower than baseline × (1 + threshold), ignoring
+    differences below `min_seconds` (timer noise on very fast stages).
+    """
+    regressions = []
+    for name, doc in current.get("documents", {}).items():
+        base_doc = baseline.get("documents", {}).get(name)
+        if not base_doc:
+            continue
+        for stage, stats in doc["stages"].items():
+            base = base_doc["stages"].get(stage)
+            if not base:
+                continue
+            delta = stats["median"] - base["median"]
+            if delta > min_seconds and stats["median"] > base["median"] * (1 + threshold):
+                regressions.append({
+                    "document": name,
+                    "stage": stage,
+                    "baseline": base["median"],
+                    "current": stats["median"],
+                    "change": round(delta / base["median"], 3) if base["median"] else None,
+                })
+    for module, profile in current.get("import_profile", {}).items():
+        base = baseline.get("import_profile", {}).get(module)
+        if not base or "wall" not in base or "wall" not in profile:
+            continue
+        delta = profile["import_seconds"] - base["import_seconds"]
+        if delta > min_seconds and profile["import_seconds"] > base["import_seconds"] * (1 + threshold):
+            regressions.append({
+                "document": "(startup)",
+                "stage": f"import.{module}",
+                "baseline": base["import_seconds"],
+                "current": profile["import_seconds"],
+                "change": round(delta / base["import_seconds"], 3) if base["import_seconds"] else None,
+            })
+    return regressions
+
+
+def run(args) -> int:
+    store = FixtureStore(args.fixtures)
+    doc_client = ReplayDocumentClient(
+        store, SimulatedLatency(args.di_latency, args.jitter, seed=args.seed), synthesize=not args.strict)
+    openai_client = ReplayOpenAI(
+        store, SimulatedLatency(args.openai_latency, args.jitter, args.openai_latency_per_1k, seed=args.seed),
+        synthesize=not args.strict)
+
+    documents = {} if args.no_documents else load_documents(args.pdfs or sorted(glob.glob("*.pdf")), args.synthetic_pages)
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {
+            "repeat": args.repeat,
+            "di_latency": args.di_latency,
+            "openai_latency": args.openai_latency,
+            "openai_latency_per_1k": args.openai_latency_per_1k,
+            "jitter": args.jitter,
+            "fixtures": store.directory,
+        },
+        "import_profile": {},
+        "documents": {},
+    }
+
+    for module in args.import_profile:
+        print(f"▶ import {module}", file=sys.stderr)
+        try:
+            report["import_profile"][module] = import_profile(module, args.repeat)
+        except Exception as e:
+            report["import_profile"][module] = {"error": str(e)}
+            print(f"  ✖ {e}", file=sys.stderr)
+
+    for name, pdf_content in documents.items():
+        print(f"▶ {name}", file=sys.stderr)
+        try:
+            report["documents"][name] = benchmark_document(pdf_content, doc_client, openai_client, args.repeat)
+        except Exception as e:
+            report["documents"][name] = {"error": str(e), "stages": {}}
+            print(f"  ✖ {e}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.threshold)
+        for r in regressions:
+            print(f"⚠️ {r['document']} / {r['stage']}: {r['baseline'] * 1000:.1f} ms → "
+                  f"{r['current'] * 1000:.1f} ms", file=sys.stderr)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+def record(args) -> int:
+    store = FixtureStore(args.fixtures)
+    doc_client, openai_client = get_azure_clients()
+    doc_client = RecordingDocumentClient(doc_client, store)
+    openai_client = RecordingOpenAI(openai_client, store)
+
+    for path in args.pdfs:
+        print(f"● recording {path}", file=sys.stderr)
+        with open(path, "rb") as f:
+            pdf_content = f.read()
+        full_text, _, _ = extract_text_from_pdf(pdf_content, doc_client)
+        analyze_contract(full_text, openai_client)
+        rag = SimpleRAG(openai_client)
+        rag.build_index_from_text(full_text)
+        for query in RAG_QUERIES:
+            rag.retrieve(query, top_k=4)
+    print(f"Fixtures written to {store.directory}", file=sys.stderr)
+    return 0
+
+
+# ---------------- vector index ----------------
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 1000, seed: int = 0, batch: int = 100_000):
+    """n unit vectors drawn around `clusters` random topics, generated in batches (float32)."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        block = centers[rng.integers(0, clusters, size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+        vectors[start:start + size] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def benchmark_ann(n: int, dim: int, queries: int, k: int, nprobes: List[int], seed: int = 0,
+                  insert_batch: int = 10_000, dtype: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build an IVFFlatIndex over n synthetic embeddings with incremental inserts, then measure
+    recall@k against exact search and per-query latency for each nprobe, plus save/load time.
+    Lists are stored as `dtype` (RAG_EMBEDDING_DTYPE); the rerank file lives in a temp dir.
+    """
+    import tempfile
+    import numpy as np
+    vectors = synthetic_embeddings(n, dim, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(n, queries, replace=False)]
+    query_vectors = picked + 0.1 * rng.standard_normal(picked.shape).astype(np.float32)
+
+    exact_latency, truth = [], []
+    for q in query_vectors:
+        start = time.perf_counter()
+        hits = exact_search(vectors, q, k)
+        exact_latency.append(time.perf_counter() - start)
+        truth.append({i for i, _ in hits})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = IVFFlatIndex(seed=seed, dtype=dtype, rerank_dir=os.path.join(tmp, "vectors"))
+        start = time.perf_counter()
+        for offset in range(0, n, insert_batch):
+            index.add(vectors[offset:offset + insert_batch], np.arange(offset, min(n, offset + insert_batch)))
+        build_seconds = time.perf_counter() - start
+
+        results = {"exact": {"latency": _stats(exact_latency)}}
+        for nprobe in nprobes:
+            latency, recall = [], []
+            for q, expected in zip(query_vectors, truth):
+                start = time.perf_counter()
+                hits = index.search(q, k, nprobe=nprobe)
+                latency.append(time.perf_counter() - start)
+                recall.append(len(expected & {i for i, _ in hits}) / k)
+            results[f"nprobe_{nprobe}"] = {
+                "recall_at_k": round(statistics.fmean(recall), 4),
+                "latency": _stats(latency),
+                "speedup": round(statistics.median(exact_latency) / statistics.median(latency), 1),
+            }
+
+        path = os.path.join(tmp, "index.npz")
+        start = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        IVFFlatIndex.load(path)
+        load_seconds = time.perf_counter() - start
+        file_bytes = os.path.getsize(path)
+
+    return {
+        "vectors": n,
+        "dim": dim,
+        "k": k,
+        "dtype": index.dtype,
+        "nlist": len(index.centroids) if index.trained else 0,
+        "index_bytes": index.nbytes,
+        "build_seconds": round(build_seconds, 3),
+        "save_seconds": round(save_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "file_bytes": file_bytes,
+        "search": results,
+    }
+
+
+def ann(args) -> int:
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {"dim": args.dim, "queries": args.queries, "k": args.k, "nprobe": args.nprobe,
+                   "dtype": args.dtype},
+        "ann": {},
+    }
+    for n in args.sizes:
+        print(f"▶ {n} vectors", file=sys.stderr)
+        report["ann"][str(n)] = benchmark_ann(n, args.dim, args.queries, args.k, args.nprobe, args.seed,
+                                              dtype=args.dtype)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with record/replay fixtures.")
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (default: BENCHMARK_FIXTURE_DIR or ./fixtures)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Call the live services once and store their payloads")
+    rec.add_argument("pdfs", nargs="+")
+
+    bench = sub.add_parser("run", help="Replay fixtures and time every stage")
+    bench.add_argument("pdfs", nargs="*", help="PDFs to benchmark (default: *.pdf in the current directory)")
+    bench.add_argument("--synthetic-pages", type=int, nargs="*", default=[], metavar="N",
+                       help="Also benchmark generated contracts with N pages (e.g. 500)")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--di-latency", type=float, default=0.0, help="Simulated seconds per analyze call")
+    bench.add_argument("--openai-latency", type=float, default=0.0, help="Simulated seconds per OpenAI call")
+    bench.add_argument("--openai-latency-per-1k", type=float, default=0.0, help="Extra seconds per 1k tokens")
+    bench.add_argument("--jitter", type=float, default=0.0, help="Std-dev of simulated latency (seconds)")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--strict", action="store_true", help="Fail on missing fixtures instead of synthesizing")
+    bench.add_argument("--out", help="Write the JSON report here instead of stdout")
+    bench.add_argument("--baseline", help="Earlier report to compare against")
+    bench.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown (0.2 = 20%%)")
+    bench.add_argument("--fail-on-regression", action="store_true")
+    bench.add_argument("--import-profile", nargs="*", default=["strem"], metavar="MODULE",
+                       help="Profile the cold import of these modules (default: strem; none to skip)")
+    bench.add_argument("--no-documents", action="store_true", help="Only run the import profile")
+
+    vec = sub.add_parser("ann", help="Recall@k and latency of the IVF-flat index vs exact search")
+    vec.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    vec.add_argument("--dim", type=int, default=256, help="Embedding dimensions (1M x 256 float32 is 1 GB)")
+    vec.add_argument("--queries", type=int, default=200)
+    vec.add_argument("--k", type=int, default=10)
+    vec.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    vec.add_argument("--dtype", choices=["float32", "float16", "int8"], default=None,
+                     help="List storage (default: RAG_EMBEDDING_DTYPE, float16)")
+    vec.add_argument("--seed", type=int, default=0)
+    vec.add_argument("--out", help="Write the JSON report here instead of stdout")
+
+    args = parser.parse_args(argv)
+    commands = {"record": record, "run": run, "ann": ann}
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
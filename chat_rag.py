@@ -2,8 +2,15 @@
 import streamlit as st
 from typing import Dict, Any, List
 import os
+import re
 import textwrap
-from services.rag import SimpleRAG
+import time
+from answer_cache import get_answer_cache, text_key
+from context_packer import context_prompt, pack_context
+from rag import RETRIEVAL_MODES, SimpleRAG
+from rate_limiter import estimate_tokens, stream_chat_completion
+from render_cache import fragment
+from memory_view import held, hold, load
 
 SYSTEM_RAG_PROMPT = """You are a helpful contract assistant. Use ONLY the provided context (document excerpts) to answer. 
 If the answer isn't present in the context, say: "I cannot find that information in the contract." Keep answers concise and cite the chunk id."""
@@ -18,26 +25,34 @@ def initialize_rag_state():
 
 def build_rag_if_needed(openai_client, full_text: str):
     initialize_rag_state()
-    if st.session_state.rag_indexed:
+    # Rebuild when a different result is loaded (result_hash is set when a document is processed)
+    doc_key = st.session_state.get("result_hash")
+    if st.session_state.rag_indexed and st.session_state.get("rag_doc_key") == doc_key and held("rag_index"):
         return
+    st.session_state.chat_history = []
     rag = SimpleRAG(openai_client)
     rag.build_index_from_text(full_text, doc_meta={"source": st.session_state.get("file_name", "unknown")})
-    st.session_state.rag_index = rag
+    # numpy embeddings can be large: held by reference, spilled to disk under memory pressure
+    hold("rag_index", rag, key=f"rag-{doc_key}" if doc_key else None)
     st.session_state.rag_indexed = True
     st.session_state.rag_meta = {"chunks": rag.index_size()}
+    st.session_state.rag_doc_key = doc_key
 
+@fragment
 def render_chat(openai_client, model_name: str):
+    """Contract chat. Runs as a fragment, so asking a question reruns only the chat."""
     initialize_rag_state()
 
-    if "result" not in st.session_state or not st.session_state.result:
+    result = load("result")
+    if not result:
         st.info("Process a document first (upload & analyze) to enable contract chat.")
         return
 
     # Ensure we have raw extracted text in result under _raw_extracted_text
-    doc_text = st.session_state.result.get("_raw_extracted_text") or st.session_state.result.get("extracted_text", "")
+    doc_text = result.get("_raw_extracted_text") or result.get("extracted_text", "")
     if not doc_text:
         # try to build from pages if present
-        pages = st.session_state.result.get("pages", [])
+        pages = result.get("pages", [])
         lines = []
         for p in pages:
             for line in p.get("lines", []):
@@ -54,9 +69,17 @@ def render_chat(openai_client, model_name: str):
     col_left, col_right = st.columns([1, 3])
     with col_left:
         top_k = st.selectbox("Top K chunks", options=[1,2,3,4,5], index=2)
-        max_context_chars = st.slider("Context chars per chunk", 100, 2000, 1000, step=100)
+        budget = st.slider("Context token budget", 250, 4000, int(os.getenv("RAG_CONTEXT_TOKENS", "1500")), step=250,
+                           help="Overlapping chunks are merged and near-duplicates dropped before packing.")
+        mode = st.selectbox("Retrieval", options=RETRIEVAL_MODES,
+                            index=RETRIEVAL_MODES.index(os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()),
+                            help="hybrid: keyword (BM25) + embedding ranking; lexical: exact terms such as "
+                                 "CWIDs, amounts, dates or clause numbers, without an embedding call.")
     with col_right:
         submit = st.button("Ask", key="rag_ask")
+        use_cache = st.checkbox("Reuse answers to similar questions", value=True, key="rag_use_cache",
+                                help="Earlier answers about this document (from any session) are returned "
+                                     "without retrieval or a model call.")
 
     # show history
     if st.session_state.chat_history:
@@ -73,21 +96,45 @@ def render_chat(openai_client, model_name: str):
             return
 
         st.session_state.chat_history.append({"role":"user", "message": q})
-        rag: SimpleRAG = st.session_state.get("rag_index")
-        # Retrieve top_k chunks
-        retrieved = rag.retrieve(q, top_k=top_k)
-        ctx_parts = []
-        for r in retrieved:
-            # optionally trim to a number of chars
-            txt = r["text"][:max_context_chars]
-            ctx_parts.append(f"CHUNK_ID: {r['id']}\n{txt}")
+        rag: SimpleRAG = load("rag_index")
+        rag.client = openai_client
+
+        # The question embedding serves both the cache lookup and retrieval
+        cache = get_answer_cache()
+        doc_key = text_key(doc_text)
+        q_emb = None
+        if mode != "lexical" and len(rag.vectors):
+            try:
+                q_emb = rag.embed_texts([q])[0]
+            except RuntimeError:
+                q_emb = None
+        hit = cache.lookup(doc_key, q, q_emb, model=model_name) if use_cache else None
+        if hit:
+            st.session_state.chat_history.append({"role":"assistant", "message": hit["answer"]})
+            st.markdown(f"**Assistant:** {hit['answer']}")
+            st.caption(f"⚡ Cached answer to “{hit['question']}” (similarity {hit['similarity']:.2f}) · "
+                       f"~{hit['tokens']} tokens saved")
+            st.markdown("**Cited chunks:** " + ", ".join(hit["chunk_ids"]))
+            return
+
+        # Retrieve extra candidates so MMR has room to pick diverse ones
+        retrieved = rag.retrieve(q, top_k=top_k * 3, mode=mode, query_embedding=q_emb)
+        if rag.embedding_error and mode != "lexical":
+            st.caption("⚠️ Embeddings unavailable for this document; answered from keyword search.")
+        blocks = pack_context(retrieved, budget_tokens=budget, k=top_k)
 
         system_prompt = SYSTEM_RAG_PROMPT
-        user_prompt = f"QUESTION:\n{q}\n\nCONTEXT:\n{chr(10).join(ctx_parts)}"
+        user_prompt = f"QUESTION:\n{q}\n\nCONTEXT:\n{context_prompt(blocks)}"
 
-        # Call model
-        with st.spinner("Querying model..."):
-            response = openai_client.chat.completions.create(
+        # Stream the answer as it is generated
+        usage: Dict[str, int] = {}
+        start = time.perf_counter()
+        first_token: List[float] = []
+
+        def tokens():
+            for text in stream_chat_completion(
+                openai_client,
+                usage=usage,
                 messages=[
                     {"role":"system", "content": system_prompt},
                     {"role":"user", "content": user_prompt}
@@ -95,13 +142,32 @@ def render_chat(openai_client, model_name: str):
                 model=model_name,
                 max_tokens=512,
                 temperature=0.0
-            )
-        answer = response.choices[0].message.content
+            ):
+                if not first_token:
+                    first_token.append(time.perf_counter() - start)
+                yield text
+
+        st.markdown("**Assistant:**")
+        if hasattr(st, "write_stream"):
+            answer = st.write_stream(tokens())
+        else:
+            placeholder, answer = st.empty(), ""
+            for text in tokens():
+                answer += text
+                placeholder.markdown(answer)
         st.session_state.chat_history.append({"role":"assistant", "message": answer})
-        # show the answer immediately
-        st.markdown(f"**Assistant:** {answer}")
+        context_ids = [i for b in blocks for i in b["ids"]]
+        cited = [i for i in dict.fromkeys(re.findall(r"chunk_\d+", answer)) if i in context_ids] or context_ids
+        cache.store(doc_key, q, answer, cited,
+                    usage.get("total_tokens") or estimate_tokens(system_prompt + user_prompt + answer),
+                    q_emb, model=model_name)
+        st.caption(
+            f"First token after {first_token[0] if first_token else 0.0:.2f}s · "
+            f"context {sum(b['tokens'] for b in blocks)} tokens from {sum(len(b['ids']) for b in blocks)} chunks"
+            + (f" · {usage['prompt_tokens']} prompt tokens" if usage.get("prompt_tokens") else "")
+        )
 
         # Also show which chunks were used
-        st.markdown("**Retrieved chunks**")
-        for r in retrieved:
-            st.write(f"- {r['id']}: {r['text'][:200]}...")
+        st.markdown("**Context used**")
+        for b in blocks:
+            st.write(f"- {'+'.join(b['ids'])} ({b['tokens']} tokens): {b['text'][:200]}...")
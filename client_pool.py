@@ -0,0 +1,238 @@
+# services/client_pool.py
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# api-version sent to the mock services when AZURE_OPENAI_API_VERSION is not set
+MOCK_API_VERSION = "2024-06-01"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class PoolSettings:
+    """
+    HTTP pooling settings shared by every Azure client, read from the environment.
+    """
+
+    def __init__(self):
+        self.max_connections = _env_int("AZURE_HTTP_MAX_CONNECTIONS", 100)
+        self.max_keepalive_connections = _env_int("AZURE_HTTP_MAX_KEEPALIVE", 20)
+        self.keepalive_expiry = _env_float("AZURE_HTTP_KEEPALIVE_EXPIRY", 30.0)
+        self.timeout = _env_float("AZURE_HTTP_TIMEOUT", 120.0)
+        self.http2 = _env_flag("AZURE_HTTP2", True)
+        self.warm_up = _env_flag("AZURE_CLIENT_WARMUP", False)
+        # 429s, 5xx and connection errors are retried by rate_limiter (which honours retry-after),
+        # not inside the SDK
+        self.openai_max_retries = _env_int("AZURE_OPENAI_SDK_MAX_RETRIES", 0)
+        # Points every client at the local mock services (mock_services.py) for load tests
+        self.mock_endpoint = os.getenv("AZURE_MOCK_ENDPOINT") or None
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientPool:
+    """
+    Process-wide pool of Azure clients.
+
+    One HTTP transport is kept per endpoint and shared by every client built for it, so
+    Streamlit reruns, concurrent sessions, chat and batch jobs reuse warm keep-alive
+    connections instead of paying a TLS handshake per rerun.
+    """
+
+    def __init__(self, settings: Optional[PoolSettings] = None):
+        self.settings = settings or PoolSettings()
+        self._lock = threading.RLock()
+        self._transports: Dict[Tuple[str, str], Any] = {}
+        self._clients: Dict[Tuple[str, ...], Any] = {}
+
+    # ---------------- transports ----------------
+
+    def _httpx_limits(self):
+        import httpx
+        return httpx.Limits(
+            max_connections=self.settings.max_connections,
+            max_keepalive_connections=self.settings.max_keepalive_connections,
+            keepalive_expiry=self.settings.keepalive_expiry,
+        )
+
+    def _sync_http_client(self, endpoint: str):
+        key = ("httpx", endpoint)
+        with self._lock:
+            if key not in self._transports:
+                import httpx
+                self._transports[key] = httpx.Client(
+                    limits=self._httpx_limits(),
+                    timeout=self.settings.timeout,
+                    http2=self.settings.http2 and _http2_available(),
+                )
+            return self._transports[key]
+
+    def _requests_transport(self, endpoint: str):
+        key = ("requests", endpoint)
+        with self._lock:
+            if key not in self._transports:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from azure.core.pipeline.transport import RequestsTransport
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.settings.max_keepalive_connections,
+                    pool_maxsize=self.settings.max_connections,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._transports[key] = RequestsTransport(
+                    session=session,
+                    session_owner=False,
+                    connection_timeout=self.settings.timeout,
+                    read_timeout=self.settings.timeout,
+                )
+            return self._transports[key]
+
+    # ---------------- clients ----------------
+
+    def _target(self, endpoint: str, key: str) -> Tuple[str, str]:
+        """The endpoint and key to use: AZURE_MOCK_ENDPOINT overrides every configured service."""
+        if self.settings.mock_endpoint:
+            return self.settings.mock_endpoint, key or "mock-key"
+        return endpoint, key
+
+    def document_intelligence(self, endpoint: str, key: str):
+        """Shared sync DocumentIntelligenceClient for `endpoint`."""
+        endpoint, key = self._target(endpoint, key)
+        cache_key = ("di", endpoint, key)
+        with self._lock:
+            if cache_key not in self._clients:
+                from azure.core.credentials import AzureKeyCredential
+                from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+                self._clients[cache_key] = DocumentIntelligenceClient(
+                    endpoint=endpoint,
+                    credential=AzureKeyCredential(key),
+                    transport=self._requests_transport(endpoint),
+                )
+            return self._clients[cache_key]
+
+    def openai(self, endpoint: str, key: str, api_version: str):
+        """Shared sync AzureOpenAI client for `endpoint`."""
+        endpoint, key = self._target(endpoint, key)
+        if self.settings.mock_endpoint:
+            api_version = api_version or MOCK_API_VERSION
+        cache_key = ("openai", endpoint, key, api_version)
+        with self._lock:
+            if cache_key not in self._clients:
+                from openai import AzureOpenAI
+
+                self._clients[cache_key] = AzureOpenAI(
+                    api_version=api_version,
+                    azure_endpoint=endpoint,
+                    api_key=key,
+                    max_retries=self.settings.openai_max_retries,
+                    http_client=self._sync_http_client(endpoint),
+                )
+            return self._clients[cache_key]
+
+    # ---------------- defaults from .env ----------------
+
+    def default_clients(self) -> Tuple[Any, Any]:
+        """
+        Returns (doc_client, openai_client) for the endpoints configured in the environment.
+        """
+        doc_client = self.document_intelligence(
+            os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT"),
+            os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY"),
+        )
+        openai_client = self.openai(
+            os.getenv("AZURE_OPENAI_ENDPOINT"),
+            os.getenv("AZURE_OPENAI_API_KEY"),
+            os.getenv("AZURE_OPENAI_API_VERSION"),
+        )
+        return doc_client, openai_client
+
+    # ---------------- warm-up ----------------
+
+    def warm_up(self, background: bool = True) -> None:
+        """
+        Open a connection to every configured endpoint so the first user request does not
+        pay DNS + TCP + TLS setup. Failures are ignored — warm-up is best effort.
+        """
+        def _run():
+            try:
+                doc_client, openai_client = self.default_clients()
+            except Exception:
+                return
+            try:
+                from azure.core.rest import HttpRequest
+                doc_client.send_request(HttpRequest("GET", "/documentintelligence/info"))
+            except Exception:
+                pass
+            try:
+                openai_client.models.list()
+            except Exception:
+                pass
+
+        if background:
+            threading.Thread(target=_run, name="azure-warm-up", daemon=True).start()
+        else:
+            _run()
+
+    def close(self) -> None:
+        """Close all pooled transports."""
+        with self._lock:
+            for (kind, _), transport in self._transports.items():
+                if kind == "httpx":
+                    transport.close()
+                elif kind == "requests":
+                    transport.session.close()
+            self._transports.clear()
+            self._clients.clear()
+
+
+_POOL: Optional[ClientPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    """
+    Returns the process-wide ClientPool, creating it (and optionally warming it up) on first use.
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                pool = ClientPool()
+                if pool.settings.warm_up:
+                    pool.warm_up()
+                _POOL = pool
+    return _POOL
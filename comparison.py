@@ -1,10 +1,13 @@
 # ui/comparison.py
 import streamlit as st
-import pandas as pd
-from typing import Dict, Any, List
-from services.explainability import explain_field
+from typing import TYPE_CHECKING, Dict, Any, List
+from explain import explain_field
+from render_cache import fragment, result_hash
 import os
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def flatten_validation(result: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -71,11 +74,43 @@ def flatten_validation(result: Dict[str, Any]) -> List[Dict[str, Any]]:
     return rows
 
 
-def render_comparison(result: Dict[str, Any], openai_client) -> None:
+@st.cache_data(max_entries=64, show_spinner=False)
+def comparison_table(digest: str, _result: Dict[str, Any]) -> "pd.DataFrame":
+    """flatten_validation as a DataFrame, built once per result hash."""
+    import pandas as pd
+    return pd.DataFrame(flatten_validation(_result))
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def comparison_csv(digest: str, _result: Dict[str, Any]) -> bytes:
+    return comparison_table(digest, _result).to_csv(index=False).encode("utf-8")
+
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def cached_explanation(model_name: str, field_name: str, extracted_value: str,
+                       expected_value: str, status: str, _openai_client) -> str:
+    """explain_field memoized per (model, field, values, status): a repeated click costs no LLM call."""
+    return explain_field(
+        openai_client=_openai_client,
+        model_name=model_name,
+        field_name=field_name,
+        extracted_value=extracted_value,
+        expected_value=expected_value,
+        status=status
+    )
+
+
+@fragment
+def render_comparison(result: Dict[str, Any], openai_client, digest: str = None) -> None:
+    """
+    Comparison table with per-row Explain buttons. Runs as a fragment, so an Explain click
+    reruns only this table; explanations are kept in session state until the result changes.
+    """
     st.subheader("🔍 Extracted vs Expected — Comparison Table")
 
-    rows = flatten_validation(result)
-    df = pd.DataFrame(rows)
+    digest = digest or result_hash(result)
+    df = comparison_table(digest, result)
+    explanations = st.session_state.setdefault("explanations", {})
 
     # Render rows as detailed list so each row can have an Explain button
     for i, row in df.iterrows():
@@ -93,24 +128,27 @@ def render_comparison(result: Dict[str, Any], openai_client) -> None:
             # Button for explainability
             if row["status"] in ["Mismatch", "Missing"]:
                 btn_key = f"explain_{i}"
-                if st.button("Explain", key=btn_key):
-                    explanation = explain_field(
-                        openai_client=openai_client,
-                        model_name=os.getenv("AZURE_OPENAI_MODEL"),
-                        field_name=row["validation_item"],
-                        extracted_value=row["extracted_value"],
-                        expected_value=row["expected_value"],
-                        status=row["status"]
+                explanation_key = (digest, row["validation_item"])
+                with col5:
+                    clicked = st.button("Explain", key=btn_key)
+                if clicked:
+                    explanations[explanation_key] = cached_explanation(
+                        os.getenv("AZURE_OPENAI_MODEL"),
+                        str(row["validation_item"]),
+                        str(row["extracted_value"]),
+                        str(row["expected_value"]),
+                        str(row["status"]),
+                        openai_client
                     )
-                    st.info(explanation)
+                if explanation_key in explanations:
+                    st.info(explanations[explanation_key])
 
         st.markdown("---")
 
     # CSV export
-    csv = df.to_csv(index=False).encode("utf-8")
     st.download_button(
         "⬇️ Download Comparison CSV",
-        data=csv,
+        data=comparison_csv(digest, result),
         file_name="contract_comparison.csv",
         mime="text/csv"
     )
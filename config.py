@@ -13,7 +13,8 @@ class AppConfig:
 
     @staticmethod
     def validate() -> bool:
-        missing = [v for v in AppConfig.REQUIRED_ENV_VARS if not os.getenv(v)]
+        required = ["AZURE_OPENAI_MODEL"] if os.getenv("AZURE_MOCK_ENDPOINT") else AppConfig.REQUIRED_ENV_VARS
+        missing = [v for v in required if not os.getenv(v)]
         if missing:
             st.error("❌ Missing Environment Variables")
             st.write("Please add these to your `.env` file:")
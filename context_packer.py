@@ -0,0 +1,105 @@
+# services/context_packer.py
+import os
+from typing import Any, Dict, List, Optional
+
+from lexical_index import tokenize
+from rate_limiter import estimate_tokens
+
+
+def _similarity(a: set, b: set) -> float:
+    """Jaccard overlap of two term sets (no embedding needed, so it works in lexical mode too)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr(chunks: List[Any], k: int, diversity: Optional[float] = None, duplicate: float = 0.9) -> List[Any]:
+    """
+    Maximal marginal relevance over `chunks` (best first, as returned by `retrieve`): pick k
+    chunks trading rank-based relevance against overlap with the chunks already picked.
+    diversity (RAG_MMR_DIVERSITY) 0 keeps the retrieval order; near-duplicates
+    (similarity >= `duplicate`) are dropped outright.
+    """
+    if diversity is None:
+        diversity = float(os.getenv("RAG_MMR_DIVERSITY", "0.3"))
+    terms = [set(tokenize(c["text"])) for c in chunks]
+    relevance = [1.0 - i / len(chunks) for i in range(len(chunks))]
+    picked: List[int] = []
+    remaining = list(range(len(chunks)))
+    while remaining and len(picked) < k:
+        def score(i: int) -> float:
+            redundancy = max((_similarity(terms[i], terms[j]) for j in picked), default=0.0)
+            return (1 - diversity) * relevance[i] - diversity * redundancy
+        best = max(remaining, key=score)
+        remaining.remove(best)
+        if any(_similarity(terms[best], terms[j]) >= duplicate for j in picked):
+            continue
+        picked.append(best)
+    return [chunks[i] for i in picked]
+
+
+def _join(head: str, tail: str, expected_overlap: int) -> str:
+    """head + tail without the text they share (chunk overlap; strip() may shift it a little)."""
+    for k in range(min(len(head), len(tail), expected_overlap + 16), 0, -1):
+        if head.endswith(tail[:k]):
+            return head + tail[k:]
+    return f"{head}\n{tail}"
+
+
+def merge_spans(chunks: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Merge chunks of the same source whose character spans overlap or touch into one block.
+    Returns blocks {ids, text, start, end, rank} where rank is the best rank of their chunks.
+    """
+    ranked = [(rank, c) for rank, c in enumerate(chunks)]
+    ranked.sort(key=lambda rc: (str((rc[1]["meta"] or {}).get("source")), rc[1]["start"]))
+    blocks: List[Dict[str, Any]] = []
+    for rank, c in ranked:
+        source = (c["meta"] or {}).get("source")
+        last = blocks[-1] if blocks else None
+        if last and last["source"] == source and c["start"] <= last["end"]:
+            if c["end"] > last["end"]:
+                last["text"] = _join(last["text"], c["text"], last["end"] - c["start"])
+                last["end"] = c["end"]
+            last["ids"].append(c["id"])
+            last["rank"] = min(last["rank"], rank)
+            continue
+        blocks.append({"ids": [c["id"]], "text": c["text"], "start": c["start"], "end": c["end"],
+                       "source": source, "rank": rank})
+    return sorted(blocks, key=lambda b: b["rank"])
+
+
+def pack_context(chunks: List[Any], budget_tokens: Optional[int] = None, k: Optional[int] = None,
+                 diversity: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Token-budgeted chat context from retrieved chunks (best first): MMR picks up to k diverse
+    chunks, overlapping or adjacent ones are merged so shared text is sent once, and blocks
+    are added by relevance until `budget_tokens` (RAG_CONTEXT_TOKENS) is spent; the block that
+    crosses the budget is cut to fit. Returns blocks {ids, text, tokens}.
+    """
+    if budget_tokens is None:
+        budget_tokens = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+    selected = mmr(chunks, k or len(chunks), diversity)
+    packed: List[Dict[str, Any]] = []
+    remaining = budget_tokens
+    for block in merge_spans(selected):
+        tokens = estimate_tokens(block["text"])
+        text = block["text"]
+        if tokens > remaining:
+            if remaining < 50:
+                break
+            # cut at the last sentence or line end inside the remaining budget
+            text = text[:int(len(text) * remaining / tokens)]
+            cut = max(text.rfind(". "), text.rfind("\n"))
+            text = text[:cut + 1] if cut > len(text) // 2 else text
+            tokens = estimate_tokens(text)
+        packed.append({"ids": block["ids"], "text": text, "tokens": tokens})
+        remaining -= tokens
+        if remaining <= 0:
+            break
+    return packed
+
+
+def context_prompt(blocks: List[Dict[str, Any]]) -> str:
+    """Blocks as prompt text; a merged block cites all of its chunk ids."""
+    return "\n\n".join(f"CHUNK_ID: {'+'.join(b['ids'])}\n{b['text']}" for b in blocks)
@@ -1,67 +1,163 @@
 import json
 import os
+import threading
 import time
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Optional
+
+from rate_limiter import chat_completion, estimate_tokens
+from contract_prompt import (
+    ALL_SECTION_IDS,
+    SECTION_DEPENDENCIES,
+    build_system_prompt,
+    build_user_message,
+    result_keys,
+)
+from contract_schema import expand_compact, parse_partial_json, response_format, validate_result
+from telemetry import span
 
 class ContractAnalyzer:
     """
-    Uses Azure OpenAI to analyze contract text according to the provided prompt template
-    and return a JSON object matching the schema in the prompt.
+    Uses Azure OpenAI to analyze contract text section by section (see contract_prompt)
+    and return a JSON object matching the schema in contract_schema.
+
+    `analyze_sections` requests strict structured output (the JSON Schema in contract_schema;
+    AZURE_OPENAI_STRUCTURED_OUTPUT=json_object for deployments without json_schema support),
+    validates every section locally and re-requests only the sections that came back
+    truncated or invalid, up to AZURE_OPENAI_REPAIR_ATTEMPTS times.
+
+    With compact=True (AZURE_OPENAI_COMPACT_OUTPUT) the model answers in the compact wire
+    format, which is expanded locally; the estimated completion tokens this saved are added
+    to `usage["completion_tokens_saved"]`.
     """
 
-    def __init__(self, client):
+    def __init__(self, client, model: Optional[str] = None, repair_attempts: Optional[int] = None,
+                 compact: Optional[bool] = None):
         self.client = client
-        self.model = os.getenv("AZURE_OPENAI_MODEL")
+        self.model = model or os.getenv("AZURE_OPENAI_MODEL")
+        self.repair_attempts = (repair_attempts if repair_attempts is not None
+                                else int(os.getenv("AZURE_OPENAI_REPAIR_ATTEMPTS", "1")))
+        self.compact = (compact if compact is not None
+                        else os.getenv("AZURE_OPENAI_COMPACT_OUTPUT", "").lower() in ("1", "true", "yes"))
+        # token usage accumulated over every call made by this analyzer
+        self.usage: Dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        # section groups may run concurrently on one analyzer (see section_fanout)
+        self._usage_lock = threading.Lock()
 
-    def analyze(self, text: str) -> Tuple[Dict[str, Any], float]:
-        """
-        Send the system prompt (from prompt_template.txt) and the contract text to the model.
-        Returns (result_json, analysis_time_seconds).
-        """
-        # Load prompt template file (should be present in project root)
-        prompt_path = os.path.join(os.getcwd(), "prompt_template.txt")
-        if not os.path.exists(prompt_path):
-            raise FileNotFoundError("prompt_template.txt not found in working directory.")
+    def _record_usage(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        with self._usage_lock:
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                self.usage[key] += int(getattr(usage, key, 0) or 0)
 
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            system_prompt = f.read()
-
-        user_message = f"""Please analyze the following contract document and extract the required information:
+    @staticmethod
+    def _content(response) -> str:
+        # The wrapper returns choices[0].message.content similar to your earlier usage
+        content = response.choices[0].message.content
+        if isinstance(content, (bytes, bytearray)):
+            content = content.decode("utf-8")
+        return content or ""
 
-CONTRACT CONTENT:
----
-{text}
----
-Extract all required information according to the validation rules specified."""
+    def _response_format(self, keys: List[str]) -> Dict[str, Any]:
+        if os.getenv("AZURE_OPENAI_STRUCTURED_OUTPUT", "strict").lower() == "json_object":
+            return {"type": "json_object"}
+        return response_format(keys, compact=self.compact)
 
-        start_time = time.time()
+    def _record_compact_savings(self, response, content: str, expanded: Dict[str, Any]) -> None:
+        """Completion tokens the full format would have cost, scaled from the actual count."""
+        usage = getattr(response, "usage", None)
+        actual = int(getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        wire = estimate_tokens(content)
+        if not actual or not wire:
+            return
+        full = estimate_tokens(json.dumps(expanded, ensure_ascii=False))
+        saved = max(0, round(actual * full / wire) - actual)
+        with self._usage_lock:
+            self.usage["completion_tokens_saved"] = self.usage.get("completion_tokens_saved", 0) + saved
 
-        # Note: The exact call signature depends on the Azure OpenAI wrapper in use.
-        # This mirrors your original code's usage: openai_client.chat.completions.create(...)
-        response = self.client.chat.completions.create(
+    def _request_sections(self, text: str, section_ids: List[str], model: Optional[str],
+                          context: Optional[Dict[str, Any]], max_tokens: int,
+                          template: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+        """One completion for `section_ids`. Returns (parsed members, schema errors by result key)."""
+        keys = result_keys(section_ids)
+        response = chat_completion(
+            self.client,
             messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
+                {"role": "system", "content": build_system_prompt(section_ids, context, template, self.compact)},
+                {"role": "user", "content": build_user_message(text)}
             ],
-            max_tokens=4096,
+            max_tokens=max_tokens,
             temperature=0.3,
-            model=self.model,
-            response_format={"type": "json_object"}
+            model=model or self.model,
+            response_format=self._response_format(keys)
         )
+        self._record_usage(response)
 
-        analysis_time = time.time() - start_time
+        content = self._content(response)
+        with span("llm.parse", **{"llm.response_chars": len(content), "llm.compact": self.compact}) as s:
+            result, complete = parse_partial_json(content)
+            errors = validate_result(result, keys, compact=self.compact)
+            if self.compact:
+                result = expand_compact(result, keys)
+                self._record_compact_savings(response, content, result)
+            s.set_attribute("llm.truncated", not complete or
+                            getattr(response.choices[0], "finish_reason", None) == "length")
+            s.set_attribute("llm.invalid_keys", len(errors))
+        return result, errors
 
-        # Parse model output content
-        # The wrapper returns choices[0].message.content similar to your earlier usage
-        content = response.choices[0].message.content
-        if isinstance(content, (bytes, bytearray)):
-            content = content.decode("utf-8")
+    def analyze(self, text: str) -> Tuple[Dict[str, Any], float]:
+        """
+        Analyze every section with strict structured output (see `analyze_sections`).
+        Returns (result_json, analysis_time_seconds).
+        """
+        return self.analyze_sections(text)
+
+    def analyze_sections(self, text: str, section_ids: Optional[List[str]] = None,
+                         model: Optional[str] = None, context: Optional[Dict[str, Any]] = None,
+                         max_tokens: int = 4096, template: Optional[str] = None) -> Tuple[Dict[str, Any], float]:
+        """
+        Analyze only `section_ids` (see contract_prompt.SECTIONS; all sections when None)
+        with `model` (defaults to AZURE_OPENAI_MODEL).
+        context: already extracted result keys the sections may cross-validate against.
+        template: locally classified template used to specialise the rules.
+        Sections that are missing (truncated response) or fail schema validation are
+        re-requested on their own; what was repaired is reported under `_repair`.
+        Raises ValueError when the response contains no usable JSON at all.
+        Returns (result_json, analysis_time_seconds).
+        """
+        start_time = time.time()
+        ids = section_ids or ALL_SECTION_IDS
+        result, errors = self._request_sections(text, ids, model, context, max_tokens, template)
+        if not result:
+            raise ValueError(f"Model did not return valid JSON for sections: {', '.join(ids)}")
 
-        # Some model responses might already be JSON; attempt to parse
-        try:
-            result_json = json.loads(content)
-        except json.JSONDecodeError as e:
-            # Provide helpful error if JSON not parseable
-            raise ValueError(f"Model did not return valid JSON. Error: {str(e)}. Raw content: {content[:1000]}")
+        attempts = []
+        for _ in range(self.repair_attempts):
+            broken = [s for s in ids if any(key in errors for key in result_keys([s]))]
+            if not broken:
+                break
+            attempts.append({"sections": broken, "errors": {k: v[:3] for k, v in errors.items()}})
+            # the broken sections may cross-validate against sections that did come back valid
+            repair_context = dict(context or {})
+            repair_context.update({
+                key: result[key]
+                for dep in {d for s in broken for d in SECTION_DEPENDENCIES.get(s, [])}
+                for key in result_keys([dep]) if key in result and key not in errors
+            })
+            try:
+                repaired, repair_errors = self._request_sections(text, broken, model, repair_context,
+                                                                 max_tokens, template)
+            except Exception:
+                break
+            for key in result_keys(broken):
+                if key in repaired and (key not in repair_errors or key not in result):
+                    result[key] = repaired[key]
+                    if key in repair_errors:
+                        errors[key] = repair_errors[key]
+                    else:
+                        errors.pop(key, None)
 
-        return result_json, analysis_time
+        if attempts:
+            result["_repair"] = {"attempts": attempts, "unresolved": sorted(errors)}
+        return result, time.time() - start_time
@@ -0,0 +1,297 @@
+# services/contract_prompt.py
+import json
+from typing import Any, Dict, List, Optional
+
+from contract_schema import COMPACT_INSTRUCTIONS, RESULT_SCHEMAS, schema_example
+
+# Contract validation prompt, split into its numbered sections so callers can request
+# any subset (cascade re-runs, per-template prompts, concurrent section groups).
+
+PROMPT_HEADER = """You are a contract analysis expert. Extract and validate contract information 
+according to the following requirements:"""
+
+SECTIONS: List[Dict[str, Any]] = [
+    {
+        "id": "classification",
+        "number": 1,
+        "keys": ["template_classification"],
+        "rules": """1. TEMPLATE CLASSIFICATION: Determine if the contract is IT, Non-IT (Consulting), or Marketing based on:
+   - Non-IT: Look for "Consulting Agreement" header and keywords: Consulting, teaching, advising, coaching
+   - IT: Look for "Agreement for IT Projects and Services" header and IT-related keywords
+   - Marketing: Look for keywords: Marketing, Market Insight, Media
+   Return the template type and detected keywords.""",
+    },
+    {
+        "id": "parties",
+        "number": 2,
+        "keys": ["allianz_details", "supplier_details"],
+        "rules": """2. PARTY INFORMATION: Extract Name and address of Allianz and Supplier details:
+   - For Allianz: Validate against these exact addresses:
+     * "Allianz SE Königinstrasse 28, 80802 München Germany" or
+     * "Allianz Technology SE Königinstrasse 28, 80802 München Germany"
+     If one of the above is found return "Correct", If different format: "Mismatch", If not found: "Missing"
+   - For Supplier: Extract name and address as provided. If not found: "Missing\"""",
+    },
+    {
+        "id": "customer_contact",
+        "number": 3,
+        "keys": ["customer_contact"],
+        "rules": """3. CUSTOMER CONTACT:
+   - Extract customer contact details such as:
+       1. Surname, First name, Telephone number and e-mail address.
+       2. Validate that email contains "Allianz" domain otherwise, 'Mismatch' should be shown""",
+    },
+    {
+        "id": "project_manager",
+        "number": 4,
+        "keys": ["contractor_project_manager"],
+        "rules": """4. Contractor´s Project Manager:  
+   - Extract Contractor´s Project Manager details such as:
+     1. Surname, First name, Telephone number and e-mail address.
+     2. If a field is blank, the result should indicate 'Missing.' If the email address does not contain the supplier name(mentioned in PARTY INFORMATION), 
+        it should show 'Mismatch'.""",
+    },
+    {
+        "id": "place_of_performance",
+        "number": 5,
+        "keys": ["place_of_performance"],
+        "rules": """5. PLACE OF PERFORMANCE:
+   - If "Others" option is crossed (☒): Return the provided details, or "Missing" if blank
+   - If first option (e.g., "the seat of the customer") is crossed ☒: Return "Correct\"""",
+    },
+    {
+        "id": "subcontractors",
+        "number": 6,
+        "keys": ["subcontractor_details"],
+        "rules": """6. SUBCONTRACTORS DETAILS:
+   - Extract all provided details.""",
+    },
+    {
+        "id": "remuneration",
+        "number": 7,
+        "keys": ["remuneration_details"],
+        "rules": """7. REMUNERATION DETAILS:
+   - Identify which remuneration option is marked (checkboxes ☒):
+   - Extract: marked_option, amount, currency
+   - Validation Rules:
+     * If Option 1 (Fixed price) is marked: Validate amount and currency are provided, status = "Correct" if both present, else "Missing"
+     * If Option 2 is marked: Check if Attachment 3 (Rate Card) exists with rates defined in table. If table is not updated or Attachment 3 has no rates, status = "Missing", else status = "Correct"
+     * If Option 3 is marked: Check if upper limit amount and currency are provided AND table is updated. If table is not updated or upper limit is missing, status = "Missing", else status = "Correct"
+     * If multiple options marked, validate each marked option meets its requirements
+     * If remuneration details are completely absent, status = "Missing"
+   - Return marked options as array, provide table/rate details if present""",
+    },
+    {
+        "id": "invoicing",
+        "number": 8,
+        "keys": ["invoicing"],
+        "rules": """8. INVOICING:
+   - Identify which invoicing option is marked (checkboxes ☒):
+     * Option 1: Monthly in arrears
+     * Option 2: After overall acceptance
+     * Option 3: Following acceptance of milestones
+   - Extract: marked_option
+   - Validation Rules:
+     * If Remuneration part marked "Fixed price" (Option 1): Then one of the invoicing options ( 2, or 3) MUST be marked. If none marked, status = "Mismatch"
+     * If Remuneration part marked "Remuneration based on time expended" (Option 2 or 3): Then invoicing can be any of the three options (1, 2, or 3). If none marked, status = "Missing"
+   - Cross-validate with Remuneration selection
+   - If invoicing details are completely absent, status = "Missing\"""",
+    },
+    {
+        "id": "vat",
+        "number": 9,
+        "keys": ["vat"],
+        "rules": """9. VAT (Value Added Tax):
+   - Identify which VAT option is marked (checkboxes):
+     * Option 1: VAT does not apply due to the tax affinity
+     * Option 2: To the aforementioned costs the applicable rate of value-added tax shall be added – local Contractor
+     * Option 3: The recipient of these services is liable to the VAT due (reverse charge) – foreign Contractor
+   - Extract: marked_option
+   - Validation Rules (based on Supplier details from section 2):
+     * If Supplier is intercompany entity (Metafinanz, Kaiser X, Syncier): Option 1 MUST be marked, else status = "Mismatch"
+     * If Supplier is located in Germany: Option 2 (local contractor) MUST be marked, else status = "Mismatch"
+     * If Supplier is NOT located in Germany (foreign): Option 3 (reverse charge) MUST be marked, else status = "Mismatch"
+     * If VAT section is missing, status = "Missing"
+   - Cross-validate with supplier location and type
+   - Provide validation_reason explaining the logic""",
+    },
+    {
+        "id": "invoice_address",
+        "number": 10,
+        "keys": ["invoice_address"],
+        "rules": """10. INVOICE ADDRESS:
+   - Extract invoice address (street, city, country) if "Invoice address" or "Invoice send to address" header is present
+   - Validation Rules:
+     * If header is present: Validate address matches one of:
+       - Customer OE address from first page (Allianz SE or Allianz Technology SE with same address as in PARTY INFORMATION)
+       - Standard address: "Dieselstraße 8, 85774 Unterföhring, Germany"
+     * If header matches one of these addresses: status = "Correct"
+     * If header exists but address does not match: status = "Mismatch"
+     * If header is not present in contract: status = "Missing"
+   - Provide matched_address and validation_reason""",
+    },
+    {
+        "id": "data_protection",
+        "number": 11,
+        "keys": ["data_protection_security_outsourcing"],
+        "rules": """11. APPLICABILITY OF DATA PROTECTION, INFORMATION SECURITY, AND OUTSOURCING:
+   - For each checkbox area (Data protection, Information security, Outsourcing):
+     * Identify if checkbox is marked "Yes" or "No"
+     * If marked "Yes": Check if corresponding document/attachment is included in the contract
+       - If document is included: status = "Correct" or "Available"
+       - If document is NOT included: status = "Missing"
+     * If marked "No": status = "N/A" (not applicable)
+     * If checkbox is not marked or section missing: status = "Missing"
+   - Return individual status for each category (data_protection, information_security, outsourcing)
+   - Provide document_status and validation_reason for each""",
+    },
+    {
+        "id": "terms",
+        "number": 12,
+        "keys": ["terms_and_termination"],
+        "rules": """12. TERMS AND TERMINATION:
+   - This is a MANDATORY field
+   - Extract: start_date, end_date (format: YYYY-MM-DD or as provided)
+   - Validation Rules:
+     * Both start_date and end_date MUST be provided
+     * If either date is missing: status = "Missing"
+     * If both dates are present: status = "Correct"
+     * Calculate contract_duration (multiyear check: does contract span more than one calendar year?)
+   - Return: start_date, end_date, contract_duration, is_multiyear (true/false), validation_status""",
+    },
+    {
+        "id": "signatures",
+        "number": 13,
+        "keys": ["signature_verification"],
+        "rules": """13. VERIFICATION OF SIGNATURES:
+   - Count and identify all signatures in the contract
+   - Extract: total_signature_count, allianz_signature_count, supplier_signature_count, gsp_approval_present (true/false)
+   - Determine required_signature_count based on business rules:
+     * Rule 1: If Allianz SE is the buyer (first page): Requires 3 signatures (2 Allianz + 1 Supplier)
+     * Rule 2: If project term is multiyear (more than one calendar year from section 11): Requires 3 signatures (2 Allianz + 1 Supplier)
+     * Rule 3: If contract is Vendor Consolidation (check CWID number reference): Requires 4 signatures (GSP approval + 2 Allianz + 1 Supplier)
+     * Rule 4: If contract is Non-IT category (from section 1): Requires 3 signatures (2 Allianz + 1 Supplier)
+   - Validation Rules:
+     * If actual signatures match required signatures: status = "Correct"
+     * If actual signatures do NOT match required: status = "Mismatch"
+     * If signatures cannot be verified or counted: status = "Missing"
+   - Return: signature_counts, required_count, applied_rules, validation_status, validation_reason""",
+    },
+]
+
+# Prompt placeholders and required fields are rendered from the JSON Schema in
+# contract_schema, which is also sent as the strict response_format.
+SECTION_SCHEMAS: Dict[str, str] = {key: schema_example(key) for key in RESULT_SCHEMAS}
+
+# Fields each result key is expected to carry; used to score schema completeness.
+REQUIRED_FIELDS: Dict[str, List[str]] = {key: list(schema["required"]) for key, schema in RESULT_SCHEMAS.items()}
+
+# Sections whose rules cross-validate against the result of other sections.
+SECTION_DEPENDENCIES: Dict[str, List[str]] = {
+    "invoicing": ["remuneration"],
+    "vat": ["parties"],
+    "signatures": ["classification", "terms"],
+}
+
+ALL_SECTION_IDS: List[str] = [s["id"] for s in SECTIONS]
+
+# Per-template rewrites of rule lines once the template is known before the LLM call:
+# {section_id: {template: [(original_line, replacement_line_or_empty)]}}
+_RULE_4 = "     * Rule 4: If contract is Non-IT category (from section 1): Requires 3 signatures (2 Allianz + 1 Supplier)"
+TEMPLATE_RULE_OVERRIDES: Dict[str, Dict[str, List[tuple]]] = {
+    "signatures": {
+        "Non-IT": [(_RULE_4, "     * Rule 4: This contract is Non-IT: Requires 3 signatures (2 Allianz + 1 Supplier)")],
+        "IT": [(_RULE_4, "")],
+        "Marketing": [(_RULE_4, "")],
+    },
+}
+
+
+def section_rules(section: Dict[str, Any], template: Optional[str] = None) -> str:
+    """Rules text of `section`, specialised for `template` when it is already known."""
+    rules = section["rules"]
+    for original, replacement in TEMPLATE_RULE_OVERRIDES.get(section["id"], {}).get(template, []):
+        rules = rules.replace(original + "\n", replacement + "\n" if replacement else "")
+    return rules
+
+
+def get_section(section_id: str) -> Dict[str, Any]:
+    for section in SECTIONS:
+        if section["id"] == section_id:
+            return section
+    raise KeyError(f"Unknown contract section: {section_id}")
+
+
+def section_for_key(result_key: str) -> Optional[str]:
+    """Section id that produces `result_key` (e.g. 'supplier_details' -> 'parties')."""
+    for section in SECTIONS:
+        if result_key in section["keys"]:
+            return section["id"]
+    return None
+
+
+def result_keys(section_ids: Optional[List[str]] = None) -> List[str]:
+    ids = ALL_SECTION_IDS if section_ids is None else section_ids
+    return [key for section in SECTIONS if section["id"] in ids for key in section["keys"]]
+
+
+def dependents_of(section_ids: List[str]) -> List[str]:
+    """Sections that cross-validate against any of `section_ids` (transitively)."""
+    found: List[str] = []
+    frontier = list(section_ids)
+    while frontier:
+        current = frontier.pop()
+        for section_id, deps in SECTION_DEPENDENCIES.items():
+            if current in deps and section_id not in found and section_id not in section_ids:
+                found.append(section_id)
+                frontier.append(section_id)
+    return found
+
+
+def build_system_prompt(section_ids: Optional[List[str]] = None,
+                        context: Optional[Dict[str, Any]] = None,
+                        template: Optional[str] = None,
+                        compact: bool = False) -> str:
+    """
+    System prompt covering `section_ids` (all sections when None). Section numbers are kept
+    from the full prompt so cross-references between rules stay valid.
+
+    context: already extracted result keys the selected sections may cross-validate against.
+    template: IT / Non-IT / Marketing when classified before the call; template-specific rules
+    are then resolved in the prompt instead of asking the model to evaluate them.
+    compact: ask for the compact wire format (short keys, status codes, reasons only for
+    non-Correct fields; see contract_schema.expand_compact).
+    """
+    ids = section_ids or ALL_SECTION_IDS
+    selected = [s for s in SECTIONS if s["id"] in ids]
+    rules = "\n\n".join(section_rules(s, template) for s in selected)
+    if compact:
+        schema = ",\n".join(schema_example(key, compact=True) for s in selected for key in s["keys"])
+    else:
+        schema = ",\n".join(SECTION_SCHEMAS[key] for s in selected for key in s["keys"])
+
+    prompt = f"{PROMPT_HEADER}\n\n"
+    if template:
+        prompt += f"The contract template has already been determined as: {template}.\n\n"
+    prompt += f"{rules}\n\n"
+    if context:
+        prompt += (
+            "The following sections were already extracted from this contract. Use them for "
+            "cross-validation only and do not return them:\n"
+            f"{json.dumps(context, indent=2, ensure_ascii=False)}\n\n"
+        )
+    if compact:
+        prompt += f"{COMPACT_INSTRUCTIONS}\n"
+    prompt += f"Return response as JSON object matching the following schema:\n{{\n{schema}\n}}\n"
+    return prompt
+
+
+def build_user_message(full_text: str) -> str:
+    return f"""Please analyze the following contract document and extract the required information:
+
+CONTRACT CONTENT:
+---
+{full_text}
+---
+
+Extract all required information according to the validation rules specified."""
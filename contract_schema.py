@@ -0,0 +1,456 @@
+# services/contract_schema.py
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# JSON Schema of every result key, the single definition behind the prompt's schema text
+# (contract_prompt.SECTION_SCHEMAS), the strict structured-output response_format and the
+# local validator. Strict mode requires every property to be listed in `required` and
+# `additionalProperties: false` on every object; optional values are nullable instead.
+
+
+def _str(description: str) -> Dict[str, Any]:
+    return {"type": "string", "description": description}
+
+
+def _enum(*values: str) -> Dict[str, Any]:
+    return {"type": "string", "enum": list(values)}
+
+
+def _nullable(schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {**schema, "type": [schema["type"], "null"]}
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "array", "items": items}
+
+
+def _obj(properties: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+BOOL = {"type": "boolean"}
+COUNT = {"type": "integer"}
+STATUS = _enum("Correct", "Mismatch", "Missing")
+
+
+def _contact() -> Dict[str, Any]:
+    return _obj({
+        "Surname": _str("surname or Missing"),
+        "First name": _str("First name or Missing"),
+        "Telephone number": _str("Telephone Number or Missing"),
+        "e-mail address": _str("email or Missing"),
+        "validation_status": STATUS,
+    })
+
+
+def _applicability() -> Dict[str, Any]:
+    return _obj({
+        "marked": _enum("Yes", "No", "Missing"),
+        "document_included": BOOL,
+        "validation_status": _enum("Correct", "Available", "Missing", "N/A"),
+        "validation_reason": _str("Explanation"),
+    })
+
+
+RESULT_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "template_classification": _obj({
+        "type": _enum("IT", "Non-IT", "Marketing"),
+        "keywords_found": _array(_str("list of detected keywords")),
+        "confidence": _enum("High", "Medium", "Low"),
+    }),
+    "allianz_details": _obj({
+        "name": _str("extracted name"),
+        "address": _str("extracted address"),
+        "validation_status": STATUS,
+    }),
+    "supplier_details": _obj({
+        "name": _str("extracted name or Missing"),
+        "address": _str("extracted address or Missing"),
+        "validation_status": STATUS,
+    }),
+    "customer_contact": _contact(),
+    "contractor_project_manager": _contact(),
+    "place_of_performance": _obj({
+        "type": _str("Checked option (☒)"),
+        "details": _str("provided details or Missing"),
+        "validation_status": _enum("Correct", "Not found"),
+    }),
+    "subcontractor_details": _obj({
+        "present": BOOL,
+        "details": _nullable(_str("provide details or null")),
+        "validation_status": _enum("Found", "Not found"),
+    }),
+    "remuneration_details": _obj({
+        "marked_options": _array(_obj({
+            "option": _str("return marked_option"),
+            "amount": _str("amount or Missing"),
+            "currency": _str("currency or Missing"),
+            "upper_limit": _str("upper limit amount or N/A"),
+            "rate_card_status": _enum("Present", "Missing", "N/A"),
+            "table_status": _enum("Updated", "Not updated", "N/A"),
+        })),
+        "validation_status": STATUS,
+        "validation_reason": _str("Explanation of validation status"),
+    }),
+    "invoicing": _obj({
+        "marked_options": _array(_obj({
+            "option": _enum("Monthly in arrears", "After overall acceptance", "Following milestone acceptance"),
+        })),
+        "validation_status": STATUS,
+        "validation_reason": _str("Explanation including cross-validation with remuneration"),
+        "cross_validation_with_remuneration": _enum("Matches", "Does not match remuneration selection"),
+    }),
+    "vat": _obj({
+        "marked_option": _enum("Tax affinity", "Local contractor", "Foreign contractor (reverse charge)", "Missing"),
+        "validation_status": STATUS,
+        "validation_reason": _str("Explanation based on supplier location and type"),
+        "expected_option": _str("Expected VAT option based on supplier details"),
+    }),
+    "invoice_address": _obj({
+        "address_present": BOOL,
+        "extracted_address": _str("extracted address or N/A"),
+        "matched_address": _enum("Customer OE", "Standard Unterföhring", "None"),
+        "validation_status": STATUS,
+        "validation_reason": _str("Explanation of address validation"),
+    }),
+    "data_protection_security_outsourcing": _obj({
+        "data_protection": _applicability(),
+        "information_security": _applicability(),
+        "outsourcing": _applicability(),
+    }),
+    "terms_and_termination": _obj({
+        "start_date": _str("date or Missing"),
+        "end_date": _str("date or Missing"),
+        "contract_duration": _str("duration in months/years"),
+        "is_multiyear": BOOL,
+        "validation_status": _enum("Correct", "Missing"),
+        "validation_reason": _str("Mandatory field - explanation"),
+    }),
+    "signature_verification": _obj({
+        "total_signatures": COUNT,
+        "allianz_signatures": COUNT,
+        "supplier_signatures": COUNT,
+        "gsp_approval_present": BOOL,
+        "required_signatures": COUNT,
+        "applied_rules": _array(_str("list of rules that determine required signatures")),
+        "validation_status": STATUS,
+        "validation_reason": _str("Detailed explanation of signature requirement logic"),
+    }),
+}
+
+
+def response_schema(keys: List[str], compact: bool = False) -> Dict[str, Any]:
+    """Root object schema for a response carrying exactly `keys` (wire names when compact)."""
+    if compact:
+        return _obj({KEY_CODES[key]: COMPACT_SCHEMAS[key] for key in keys})
+    return _obj({key: RESULT_SCHEMAS[key] for key in keys})
+
+
+def response_format(keys: List[str], compact: bool = False) -> Dict[str, Any]:
+    """Strict structured-output `response_format` for chat.completions."""
+    name = "contract_analysis_compact" if compact else "contract_analysis"
+    return {"type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": response_schema(keys, compact)}}
+
+
+# ---------------- prompt rendering ----------------
+
+def _example(schema: Dict[str, Any], indent: int) -> str:
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    kind = types[0]
+    pad = " " * indent
+    if kind == "object":
+        fields = [f'{pad}    "{name}": {_example(sub, indent + 4)}' for name, sub in schema["properties"].items()]
+        return "{\n" + ",\n".join(fields) + f"\n{pad}}}"
+    if kind == "array":
+        item = _example(schema["items"], indent + 4)
+        return f"[\n{pad}    {item}\n{pad}]" if schema["items"]["type"] == "object" else f"[{item}]"
+    if kind == "boolean":
+        return "true|false"
+    if kind == "integer":
+        return "0"
+    return json.dumps("|".join(schema["enum"]) if "enum" in schema else schema.get("description", ""),
+                      ensure_ascii=False)
+
+
+def schema_example(key: str, compact: bool = False) -> str:
+    """`"key": {...}` placeholder text for the prompt, e.g. "validation_status": "Correct|Mismatch|Missing"."""
+    if compact:
+        return f'    "{KEY_CODES[key]}": {_example(COMPACT_SCHEMAS[key], 4)}'
+    return f'    "{key}": {_example(RESULT_SCHEMAS[key], 4)}'
+
+
+# ---------------- local validation ----------------
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+Validator = Callable[[Any, str], List[str]]
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """
+    Compile the JSON Schema subset used above (type, enum, properties, required,
+    additionalProperties, items) into a validator `fn(value, path) -> [errors]`.
+    """
+    types = schema.get("type")
+    checks = [_TYPE_CHECKS[t] for t in ([types] if isinstance(types, str) else types or [])]
+    enum = set(schema["enum"]) if "enum" in schema else None
+    properties = {name: compile_schema(sub) for name, sub in schema.get("properties", {}).items()}
+    required = schema.get("required", [])
+    closed = schema.get("additionalProperties") is False
+    items = compile_schema(schema["items"]) if "items" in schema else None
+
+    def validate(value: Any, path: str) -> List[str]:
+        if checks and not any(check(value) for check in checks):
+            return [f"{path}: expected {types}, got {type(value).__name__}"]
+        if enum is not None and value is not None and value not in enum:
+            return [f"{path}: {value!r} is not one of {sorted(enum)}"]
+        errors: List[str] = []
+        if isinstance(value, dict):
+            errors += [f"{path}.{name}: missing" for name in required if name not in value]
+            if closed:
+                errors += [f"{path}.{name}: unexpected" for name in value if name not in properties]
+            for name, check in properties.items():
+                if name in value:
+                    errors += check(value[name], f"{path}.{name}")
+        elif isinstance(value, list) and items is not None:
+            for i, item in enumerate(value):
+                errors += items(item, f"{path}[{i}]")
+        return errors
+
+    return validate
+
+
+# compiled once at import; validating a full result is a handful of dict lookups per field
+VALIDATORS: Dict[str, Validator] = {key: compile_schema(schema) for key, schema in RESULT_SCHEMAS.items()}
+
+
+def validate_result(result: Dict[str, Any], keys: List[str], compact: bool = False) -> Dict[str, List[str]]:
+    """
+    Schema errors per result key, only for the keys that are missing or invalid.
+    compact: `result` is in the wire format; errors are still keyed by the full result key.
+    """
+    errors: Dict[str, List[str]] = {}
+    for key in keys:
+        name = KEY_CODES[key] if compact else key
+        if name not in result:
+            errors[key] = [f"{name}: missing"]
+            continue
+        found = (COMPACT_VALIDATORS if compact else VALIDATORS)[key](result[name], name)
+        if found:
+            errors[key] = found
+    return errors
+
+
+def parse_partial_json(content: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse a JSON object, keeping every complete top-level member when the text is truncated
+    or broken further on (e.g. the model hit max_tokens mid-section).
+    Returns (members, complete); complete is False when members may have been lost.
+    """
+    try:
+        value = json.loads(content)
+        if isinstance(value, dict):
+            return value, True
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    members: Dict[str, Any] = {}
+    text = content or ""
+    pos = text.find("{")
+    if pos < 0:
+        return members, False
+    pos += 1
+    while True:
+        try:
+            while text[pos].isspace():
+                pos += 1
+            if text[pos] == "}":
+                return members, True  # trailing comma before the closing brace
+            key, pos = decoder.raw_decode(text, pos)
+            while text[pos].isspace():
+                pos += 1
+            if text[pos] != ":":
+                return members, False
+            pos += 1
+            while text[pos].isspace():
+                pos += 1
+            value, pos = decoder.raw_decode(text, pos)
+        except (IndexError, json.JSONDecodeError):
+            return members, False
+        members[key] = value
+        try:
+            while text[pos].isspace():
+                pos += 1
+            if text[pos] == "}":
+                return members, True  # object closed; only text after it was invalid
+            if text[pos] != ",":
+                return members, False
+            pos += 1
+        except IndexError:
+            return members, False
+
+
+# ---------------- compact wire format ----------------
+# Optional response format with short keys, status codes and reasons only for non-Correct
+# fields; `expand_compact` turns it back into the result dict every view consumes.
+
+KEY_CODES: Dict[str, str] = {
+    "template_classification": "tc",
+    "allianz_details": "al",
+    "supplier_details": "su",
+    "customer_contact": "cc",
+    "contractor_project_manager": "pm",
+    "place_of_performance": "pp",
+    "subcontractor_details": "sc",
+    "remuneration_details": "rm",
+    "invoicing": "iv",
+    "vat": "vt",
+    "invoice_address": "ia",
+    "data_protection_security_outsourcing": "dp",
+    "terms_and_termination": "tt",
+    "signature_verification": "sg",
+}
+
+FIELD_CODES: Dict[str, str] = {
+    "validation_status": "s",
+    "validation_reason": "r",
+    "type": "t",
+    "keywords_found": "k",
+    "confidence": "c",
+    "name": "n",
+    "address": "a",
+    "Surname": "sn",
+    "First name": "fn",
+    "Telephone number": "tel",
+    "e-mail address": "em",
+    "details": "d",
+    "present": "p",
+    "marked_options": "mo",
+    "option": "o",
+    "amount": "am",
+    "currency": "cu",
+    "upper_limit": "ul",
+    "rate_card_status": "rc",
+    "table_status": "ts",
+    "cross_validation_with_remuneration": "x",
+    "marked_option": "m",
+    "expected_option": "eo",
+    "address_present": "ap",
+    "extracted_address": "ea",
+    "matched_address": "ma",
+    "data_protection": "dp",
+    "information_security": "is",
+    "outsourcing": "ou",
+    "marked": "m",
+    "document_included": "di",
+    "start_date": "sd",
+    "end_date": "ed",
+    "contract_duration": "du",
+    "is_multiyear": "my",
+    "total_signatures": "tot",
+    "allianz_signatures": "als",
+    "supplier_signatures": "sus",
+    "gsp_approval_present": "gsp",
+    "required_signatures": "req",
+    "applied_rules": "ar",
+}
+
+STATUS_CODES: Dict[str, str] = {
+    "Correct": "C",
+    "Mismatch": "X",
+    "Missing": "M",
+    "N/A": "NA",
+    "Available": "A",
+    "Found": "F",
+    "Not found": "NF",
+}
+STATUS_NAMES: Dict[str, str] = {code: name for name, code in STATUS_CODES.items()}
+
+COMPACT_INSTRUCTIONS = (
+    "Respond in the compact format below: use exactly its short keys. Status codes: "
+    + ", ".join(f"{code}={name}" for name, code in STATUS_CODES.items())
+    + '. Give a reason ("r") only when the status is not C; otherwise set "r" to null.'
+)
+
+
+def _is_status_enum(schema: Dict[str, Any]) -> bool:
+    return "enum" in schema and set(schema["enum"]) <= set(STATUS_CODES)
+
+
+def _compact(schema: Dict[str, Any]) -> Dict[str, Any]:
+    if schema["type"] == "object":
+        properties = {}
+        for name, sub in schema["properties"].items():
+            if name == "validation_reason":
+                sub = _nullable(_str("reason, only when the status is not C; else null"))
+            else:
+                sub = _compact(sub)
+            properties[FIELD_CODES.get(name, name)] = sub
+        if len(properties) != len(schema["properties"]):
+            raise ValueError(f"Ambiguous FIELD_CODES for {list(schema['properties'])}")
+        return _obj(properties)
+    if schema["type"] == "array":
+        return _array(_compact(schema["items"]))
+    if _is_status_enum(schema):
+        return {"type": "string", "enum": [STATUS_CODES[v] for v in schema["enum"]]}
+    return schema
+
+
+COMPACT_SCHEMAS: Dict[str, Dict[str, Any]] = {key: _compact(schema) for key, schema in RESULT_SCHEMAS.items()}
+COMPACT_VALIDATORS: Dict[str, Validator] = {key: compile_schema(schema) for key, schema in COMPACT_SCHEMAS.items()}
+
+
+def _expand(value: Any, schema: Dict[str, Any]) -> Any:
+    if schema["type"] == "object" and isinstance(value, dict):
+        expanded = {}
+        for name, sub in schema["properties"].items():
+            code = FIELD_CODES.get(name, name)
+            if code in value:
+                expanded[name] = _expand(value[code], sub)
+        if "validation_reason" in schema["properties"] and not expanded.get("validation_reason"):
+            # reasons are not requested for Correct fields
+            expanded["validation_reason"] = f"{expanded.get('validation_status', 'N/A')} (no reason requested)"
+        return expanded
+    if schema["type"] == "array" and isinstance(value, list):
+        return [_expand(item, schema["items"]) for item in value]
+    if _is_status_enum(schema) and isinstance(value, str):
+        return STATUS_NAMES.get(value, value)
+    return value
+
+
+def expand_compact(data: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+    """Wire-format members back to result keys, field names and status names."""
+    return {key: _expand(data[KEY_CODES[key]], RESULT_SCHEMAS[key]) for key in keys if KEY_CODES[key] in data}
+
+
+# ---------------- example instances ----------------
+
+def example_value(schema: Dict[str, Any], status: Optional[str] = "Correct") -> Any:
+    """A schema-valid value, preferring `status` wherever an enum allows it (offline fixtures)."""
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    kind = types[0]
+    if kind == "object":
+        return {name: example_value(sub, status) for name, sub in schema["properties"].items()}
+    if kind == "array":
+        return [example_value(schema["items"], status)]
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return 0
+    if "enum" in schema:
+        return status if status in schema["enum"] else schema["enum"][0]
+    return "N/A"
+
+
+def example_result(keys: List[str], status: Optional[str] = "Correct") -> Dict[str, Any]:
+    return {key: example_value(RESULT_SCHEMAS[key], status) for key in keys}
@@ -1,6 +1,6 @@
 import streamlit as st
 from typing import Any, Dict
-from utils.validators import get_status_style
+from validators import get_status_style
 
 class DisplayManager:
     """All UI rendering logic for displaying extraction results."""
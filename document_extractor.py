@@ -1,65 +1,66 @@
-# ui/display_manager.py
-import streamlit as st
-from typing import Any, Dict
+# services/document_extractor.py
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 
-def get_safe_usage_value(usage: Dict[str, int], key: str) -> int:
+from rate_limiter import analyze_document
+from rate_table import extract_rate_table
+from telemetry import span
+
+if TYPE_CHECKING:
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+
+def extract_document(pdf_content: bytes, doc_client: "DocumentIntelligenceClient",
+                     rate_table: bool = False) -> Tuple[str, int, float, Optional[Dict[str, Any]]]:
+    """
+    Text and page count of a PDF read with Document Intelligence (prebuilt-layout), plus, with
+    rate_table=True, the remuneration rate table read from the layout's tables (None when there
+    is none): (text, pages, seconds, rate_table).
+    """
     try:
-        return int(usage.get(key, 0))
-    except Exception:
-        return 0
+        start_time = time.time()
+
+        result = analyze_document(
+            doc_client,
+            model_id="prebuilt-layout",
+            body=pdf_content
+        )
+
+        full_text = ""
+        page_count = 0
 
-class DisplayManager:
-    """All UI rendering logic for displaying extraction results."""
+        with span("di.text_assembly") as s:
+            if result.pages:
+                page_count = len(result.pages)
+                for page_num, page in enumerate(result.pages, 1):
+                    if page.lines:
+                        for line in page.lines:
+                            full_text += line.content + "\n"
+            s.set_attribute("document.pages", page_count)
 
-    @staticmethod
-    def show_file_info(uploaded_file) -> None:
-        size_mb = uploaded_file.size / (1024 * 1024)
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("File Name", uploaded_file.name)
-        with col2:
-            st.metric("File Size", f"{size_mb:.2f} MB")
-        if size_mb > 50:
-            st.warning("⚠️ File size exceeds 50 MB. Processing may take longer.")
+        table = None
+        if rate_table:
+            with span("di.rate_table") as s:
+                table = extract_rate_table(result.as_dict())
+                s.set_attribute("rate_table.rows", len(table["rows"]) if table else 0)
 
-    @staticmethod
-    def show_processing_stats(extraction_time: float, analysis_time: float, page_count: int, processed_time: str, usage_stats: Dict[str, int] | None = None) -> None:
-        """
-        Show processing stats in the sidebar.
-        usage_stats: dict with keys 'prompt_tokens', 'completion_tokens', 'total_tokens'
-        """
-        st.sidebar.subheader("📊 Processing Statistics")
+        extraction_time = time.time() - start_time
+        return full_text, page_count, extraction_time, table
 
-        col1, col2 = st.sidebar.columns(2)
-        with col1:
-            st.metric("Extraction Time", f"{extraction_time:.2f}s")
-        with col2:
-            st.metric("Analysis Time", f"{analysis_time:.2f}s")
+    except Exception as e:
+        raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
-        st.sidebar.metric("Pages Processed", page_count)
-        st.sidebar.caption(f"Processed: {processed_time}")
 
-        # Token usage: be defensive if usage_stats is None or malformed
-        st.sidebar.subheader("🧮 Token Usage")
-        if usage_stats is None:
-            st.sidebar.write("No token usage data available.")
-            st.sidebar.metric("Input Tokens", 0)
-            st.sidebar.metric("Output Tokens", 0)
-            st.sidebar.metric("Total Tokens", 0)
-            return
+class DocumentExtractor:
+    """Document Intelligence extraction for one client (see `extract_document`)."""
 
-        prompt_tokens = get_safe_usage_value(usage_stats, "prompt_tokens")
-        completion_tokens = get_safe_usage_value(usage_stats, "completion_tokens")
-        total_tokens = get_safe_usage_value(usage_stats, "total_tokens")
+    def __init__(self, doc_client: "DocumentIntelligenceClient"):
+        self.doc_client = doc_client
 
-        st.sidebar.metric("Input Tokens", prompt_tokens)
-        st.sidebar.metric("Output Tokens", completion_tokens)
-        st.sidebar.metric("Total Tokens", total_tokens)
+    def extract_text(self, pdf_content: bytes) -> Tuple[str, int, float]:
+        """(text, pages, seconds)."""
+        return extract_document(pdf_content, self.doc_client)[:3]
 
-    @staticmethod
-    def show_results(result_json: Dict[str, Any]) -> None:
-        st.divider()
-        st.subheader("📊 Extraction Results")
-        # ... (rest of your existing show_results implementation)
-        with st.expander("📋 View Raw JSON", expanded=False):
-            st.json(result_json)
+    def extract(self, pdf_content: bytes) -> Tuple[str, int, float, Optional[Dict[str, Any]]]:
+        """(text, pages, seconds, rate_table): the text plus the rate table read from the layout."""
+        return extract_document(pdf_content, self.doc_client, rate_table=True)
@@ -1,7 +1,8 @@
 
-import pandas as pd
 import io
 
+from telemetry import span
+
 def convert_validation_to_excel(result_json: dict):
     """
     Converts the JSON result into a standardized Excel sheet:
@@ -33,14 +34,19 @@ def convert_validation_to_excel(result_json: dict):
                 add_row(f"{section_name}.{key}", str(value), "N/A")
 
     for section, data in result_json.items():
+        # skip internal metadata such as _raw_extracted_text / _usage / _model_provenance
+        if section.startswith("_"):
+            continue
         process_section(section, data)
 
+    import pandas as pd  # pandas + openpyxl load only when an export is requested
     df = pd.DataFrame(rows)
 
     # Convert to Excel in-memory
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Validation")
+    with span("export.excel", **{"export.rows": len(rows)}):
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name="Validation")
 
     buffer.seek(0)
     return buffer
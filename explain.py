@@ -1,6 +1,9 @@
 # services/explainability.py
 import os
 
+from rate_limiter import chat_completion
+from telemetry import span
+
 EXPLAIN_PROMPT = """
 You are an expert contract validation analyst. Given:
 
@@ -29,14 +32,16 @@ Status: {status}
 Explain in 2–3 bullet points why this happened and how to fix it:
 """
 
-    response = openai_client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": EXPLAIN_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ],
-        max_tokens=250,
-        temperature=0.1,
-        model=model_name
-    )
+    with span("explain.request", **{"explain.field": field_name, "explain.status": status}):
+        response = chat_completion(
+            openai_client,
+            messages=[
+                {"role": "system", "content": EXPLAIN_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=250,
+            temperature=0.1,
+            model=model_name
+        )
 
     return response.choices[0].message.content
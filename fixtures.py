@@ -0,0 +1,385 @@
+# services/fixtures.py
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from contract_prompt import result_keys
+from contract_schema import example_result, example_value
+from rate_limiter import estimate_chat_tokens, estimate_tokens
+
+EMBEDDING_DIM = 1536
+
+# PyMuPDF, numpy and the SDK model types are imported on first use, so mock_services and the
+# benchmark start without them (see README "Cold Start")
+
+
+def _digest(value: Any) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        data = bytes(value)
+    else:
+        data = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _body_bytes(body: Any) -> bytes:
+    if hasattr(body, "read"):
+        data = body.read()
+        if hasattr(body, "seek"):
+            body.seek(0)
+        return data
+    return bytes(body)
+
+
+def analyze_key(kwargs: Dict[str, Any]) -> str:
+    return _digest({"model_id": kwargs.get("model_id"), "body": _digest(_body_bytes(kwargs.get("body", b"")))})
+
+
+def chat_key(kwargs: Dict[str, Any]) -> str:
+    return _digest(kwargs)
+
+
+def embeddings_key(model: Optional[str], text: str) -> str:
+    return _digest({"model": model, "input": text})
+
+
+class FixtureStore:
+    """
+    Recorded service payloads as JSON files: <directory>/<kind>/<key>.json, where kind is
+    "analyze", "chat" or "embeddings". `put` without a directory keeps payloads in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory if directory is not None else os.getenv("BENCHMARK_FIXTURE_DIR", "fixtures")
+        self._memory: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, f"{key}.json")
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if (kind, key) in self._memory:
+                return self._memory[(kind, key)]
+        path = self._path(kind, key) if self.directory else None
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            with self._lock:
+                self._memory[(kind, key)] = payload
+            return payload
+        return None
+
+    def put(self, kind: str, key: str, payload: Dict[str, Any], persist: bool = True) -> None:
+        with self._lock:
+            self._memory[(kind, key)] = payload
+        if persist and self.directory:
+            path = self._path(kind, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+
+
+class SimulatedLatency:
+    """
+    Service latency for replays: a base delay drawn from `distribution` around `mean`
+    (std-dev `jitter`) plus per_1k_tokens × tokens / 1000 seconds.
+    distribution: "normal", "lognormal" (long tail, like real LLM latency) or "exponential".
+    All zero (the default) replays instantly, so stage timings measure only local work.
+    """
+
+    DISTRIBUTIONS = ("normal", "lognormal", "exponential")
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, per_1k_tokens: float = 0.0,
+                 seed: Optional[int] = None, distribution: str = "normal"):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.mean = mean
+        self.jitter = jitter
+        self.per_1k_tokens = per_1k_tokens
+        self.distribution = distribution
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _base(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "exponential":
+            return self._random.expovariate(1.0 / self.mean)
+        if not self.jitter:
+            return self.mean
+        if self.distribution == "lognormal":
+            sigma2 = math.log(1.0 + (self.jitter / self.mean) ** 2)
+            return self._random.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2))
+        return self._random.gauss(self.mean, self.jitter)
+
+    def seconds(self, tokens: int = 0) -> float:
+        with self._lock:
+            base = self._base()
+        return max(0.0, base) + self.per_1k_tokens * tokens / 1000.0
+
+    def wait(self, tokens: int = 0) -> float:
+        delay = self.seconds(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+# ---------------- synthetic payloads for fixture misses ----------------
+
+def layout_from_pdf(pdf_content: bytes) -> Dict[str, Any]:
+    """
+    A prebuilt-layout shaped AnalyzeResult payload built locally with PyMuPDF
+    (pages → lines with polygons in inches), for documents that were never recorded.
+    """
+    import fitz  # PyMuPDF
+    doc = fitz.open(stream=pdf_content, filetype="pdf")
+    pages, content = [], []
+    try:
+        for number, page in enumerate(doc, 1):
+            lines = []
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if not text:
+                        continue
+                    x0, y0, x1, y1 = (v / 72.0 for v in line["bbox"])
+                    lines.append({"content": text, "polygon": [x0, y0, x1, y0, x1, y1, x0, y1]})
+                    content.append(text)
+            pages.append({
+                "pageNumber": number,
+                "width": page.rect.width / 72.0,
+                "height": page.rect.height / 72.0,
+                "unit": "inch",
+                "lines": lines,
+            })
+    finally:
+        doc.close()
+    return {"modelId": "prebuilt-layout", "content": "\n".join(content), "pages": pages}
+
+
+def synthetic_chat_completion(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A ChatCompletion payload whose content is a schema-valid, all-Correct contract result
+    for the request's strict response_format (every key for json_object requests).
+    """
+    schema = ((kwargs.get("response_format") or {}).get("json_schema") or {}).get("schema")
+    result = example_value(schema) if schema else example_result(result_keys())
+    content = json.dumps(result)
+    prompt_tokens = estimate_chat_tokens(kwargs.get("messages", []))
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": "chatcmpl-synthetic",
+        "object": "chat.completion",
+        "created": 0,
+        "model": kwargs.get("model") or "synthetic",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def synthetic_embedding(text: str, dim: int = EMBEDDING_DIM) -> list:
+    """Deterministic unit vector seeded by the text, so retrieval is repeatable."""
+    import numpy as np
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# ---------------- recording wrappers ----------------
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class _Poller:
+    def __init__(self, fn: Callable[[], Any]):
+        self._fn = fn
+
+    def result(self) -> Any:
+        return self._fn()
+
+
+class RecordingDocumentClient:
+    """Wraps a DocumentIntelligenceClient and stores every AnalyzeResult it returns."""
+
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+
+    def begin_analyze_document(self, **kwargs) -> _Poller:
+        def run():
+            result = self.inner.begin_analyze_document(**kwargs).result()
+            self.store.put("analyze", analyze_key(kwargs), result.as_dict())
+            return result
+        return _Poller(run)
+
+
+class _RecordingCompletions:
+    def __init__(self, owner: "RecordingOpenAI"):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        response = self._owner.inner.chat.completions.create(**kwargs)
+        self._owner.store.put("chat", chat_key(kwargs), response.model_dump())
+        return response
+
+
+class _RecordingEmbeddings:
+    def __init__(self, owner: "RecordingOpenAI"):
+        self._owner = owner
+
+    def create(self, model=None, input=None, **kwargs):
+        response = self._owner.inner.embeddings.create(model=model, input=input, **kwargs)
+        texts = [input] if isinstance(input, str) else list(input)
+        # one fixture per text, so replays hit regardless of how inputs are batched
+        for text, item in zip(texts, response.data):
+            self._owner.store.put("embeddings", embeddings_key(model, text), {"embedding": list(item.embedding)})
+        return response
+
+
+class RecordingOpenAI:
+    """Wraps an AzureOpenAI client (or RoutedOpenAI) and stores chat and embedding responses."""
+
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+        self.handles_rate_limits = getattr(inner, "handles_rate_limits", False)
+        self.chat = _Chat(_RecordingCompletions(self))
+        self.embeddings = _RecordingEmbeddings(self)
+
+
+# ---------------- replay clients ----------------
+
+class _ReplayStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.simulated_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, hit: bool, delay: float) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.simulated_seconds += delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "simulated_seconds": round(self.simulated_seconds, 4)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.misses = 0
+            self.simulated_seconds = 0.0
+
+
+class ReplayDocumentClient:
+    """
+    Stand-in DocumentIntelligenceClient serving recorded AnalyzeResults. Unrecorded documents
+    fall back to `layout_from_pdf` (when `synthesize` is set) instead of failing.
+    """
+
+    handles_rate_limits = True
+
+    def __init__(self, store: FixtureStore, latency: Optional[SimulatedLatency] = None,
+                 synthesize: bool = True):
+        self.store = store
+        self.latency = latency or SimulatedLatency()
+        self.synthesize = synthesize
+        self.stats = _ReplayStats()
+
+    def begin_analyze_document(self, **kwargs) -> _Poller:
+        def run():
+            from azure.ai.documentintelligence.models import AnalyzeResult
+            key = analyze_key(kwargs)
+            payload = self.store.get("analyze", key)
+            hit = payload is not None
+            if not hit:
+                if not self.synthesize:
+                    raise KeyError(f"No recorded AnalyzeResult for {key}")
+                payload = layout_from_pdf(_body_bytes(kwargs["body"]))
+                self.store.put("analyze", key, payload, persist=False)
+            pages = len(payload.get("pages") or [])
+            self.stats.count(hit, self.latency.wait(tokens=pages * 500))
+            return AnalyzeResult(payload)
+        return _Poller(run)
+
+
+class _ReplayCompletions:
+    def __init__(self, owner: "ReplayOpenAI"):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+        owner = self._owner
+        payload = owner.store.get("chat", chat_key(kwargs))
+        hit = payload is not None
+        if not hit:
+            if not owner.synthesize:
+                raise KeyError("No recorded chat completion for this request")
+            payload = synthetic_chat_completion(kwargs)
+        tokens = (payload.get("usage") or {}).get("total_tokens", 0)
+        owner.stats.count(hit, owner.latency.wait(tokens=tokens))
+        return ChatCompletion.model_validate(payload)
+
+
+class _ReplayEmbeddings:
+    def __init__(self, owner: "ReplayOpenAI"):
+        self._owner = owner
+
+    def create(self, model=None, input=None, **kwargs):
+        from openai.types import CreateEmbeddingResponse
+        owner = self._owner
+        texts = [input] if isinstance(input, str) else list(input)
+        data, all_hit = [], True
+        for i, text in enumerate(texts):
+            payload = owner.store.get("embeddings", embeddings_key(model, text))
+            if payload is None:
+                if not owner.synthesize:
+                    raise KeyError("No recorded embedding for this input")
+                all_hit = False
+                payload = {"embedding": synthetic_embedding(text)}
+            data.append({"object": "embedding", "index": i, "embedding": payload["embedding"]})
+        tokens = sum(estimate_tokens(t) for t in texts)
+        owner.stats.count(all_hit, owner.latency.wait(tokens=tokens))
+        return CreateEmbeddingResponse.model_validate({
+            "object": "list",
+            "model": model or "synthetic",
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+class ReplayOpenAI:
+    """
+    Stand-in AzureOpenAI client serving recorded chat completions and embeddings.
+    Misses fall back to `synthetic_chat_completion` / `synthetic_embedding` when `synthesize` is set.
+    """
+
+    handles_rate_limits = True
+
+    def __init__(self, store: FixtureStore, latency: Optional[SimulatedLatency] = None,
+                 synthesize: bool = True):
+        self.store = store
+        self.latency = latency or SimulatedLatency()
+        self.synthesize = synthesize
+        self.stats = _ReplayStats()
+        self.chat = _Chat(_ReplayCompletions(self))
+        self.embeddings = _ReplayEmbeddings(self)
@@ -0,0 +1,364 @@
+# services/invoice_processor.py
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from rate_limiter import analyze_document
+
+# Addresses an Allianz invoice may be sent to (see prompt section 10, INVOICE ADDRESS)
+ACCEPTED_INVOICE_ADDRESSES = {
+    "Standard Unterföhring": {"street": "dieselstrasse 8", "postal_code": "85774", "city": "unterfoehring"},
+    "Allianz SE / Allianz Technology SE": {"street": "koeniginstrasse 28", "postal_code": "80802", "city": "muenchen"},
+}
+
+# Wording of a reverse-charge invoice (no VAT charged; the recipient owes it)
+_REVERSE_CHARGE_RE = re.compile(
+    r"reverse[\s-]*charge|steuerschuldnerschaft des leistungsempf|§\s*13b\s*ustg|autoliquidation|inversione contabile",
+    re.IGNORECASE)
+
+DEFAULT_VAT_RATES = "0.19"
+
+# VAT identification numbers of the other EU member states (and XI, Northern Ireland): the
+# number after the country prefix, without spaces, dots or dashes. A supplier with one of
+# these invoices under reverse charge; tax or registry numbers ("HRB 1234") never match.
+EU_VAT_ID_FORMATS = {
+    "AT": r"U\d{8}", "BE": r"[01]\d{9}", "BG": r"\d{9,10}", "CY": r"\d{8}[A-Z]", "CZ": r"\d{8,10}",
+    "DK": r"\d{8}", "EE": r"\d{9}", "EL": r"\d{9}", "ES": r"[A-Z0-9]\d{7}[A-Z0-9]", "FI": r"\d{8}",
+    "FR": r"[A-HJ-NP-Z0-9]{2}\d{9}", "HR": r"\d{11}", "HU": r"\d{8}",
+    "IE": r"\d{7}[A-W][A-I]?|\d[A-Z+*]\d{5}[A-W]", "IT": r"\d{11}", "LT": r"\d{9}|\d{12}", "LU": r"\d{8}",
+    "LV": r"\d{11}", "MT": r"\d{8}", "NL": r"\d{9}B\d{2}", "PL": r"\d{10}", "PT": r"\d{9}", "RO": r"\d{2,10}",
+    "SE": r"\d{10}01", "SI": r"\d{8}", "SK": r"\d{10}", "XI": r"\d{9}|\d{12}|GD\d{3}|HA\d{3}",
+}
+_EU_VAT_ID_RE = re.compile("^(?:" + "|".join(f"{country}(?:{number})" for country, number
+                                             in EU_VAT_ID_FORMATS.items()) + ")$")
+
+
+# ---------------------------------------------------------------------------
+# Document Intelligence prebuilt-invoice
+# ---------------------------------------------------------------------------
+
+def _field_value(field) -> Any:
+    """Typed value of a DI DocumentField (currency -> {amount, currency}, address -> text)."""
+    if field is None:
+        return None
+    kind = getattr(field, "type", None)
+    if kind == "currency" and getattr(field, "value_currency", None) is not None:
+        cur = field.value_currency
+        return {"amount": cur.amount, "currency": getattr(cur, "currency_code", None) or getattr(cur, "currency_symbol", None)}
+    if kind == "number":
+        return field.value_number
+    if kind == "date":
+        value = field.value_date
+        return value.isoformat() if value is not None else field.content
+    if kind == "array":
+        return [_field_value(item) for item in (field.value_array or [])]
+    if kind == "object":
+        return {k: _field_value(v) for k, v in (field.value_object or {}).items()}
+    if kind == "string":
+        return field.value_string
+    # addresses and anything else: the text as printed on the invoice
+    return field.content
+
+
+def _amount(value: Any) -> Optional[float]:
+    if isinstance(value, dict):
+        return value.get("amount")
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def normalize_invoice(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Flat invoice record from prebuilt-invoice fields (already converted with `_field_value`)."""
+    items = []
+    for item in fields.get("Items") or []:
+        item = item or {}
+        items.append({
+            "description": item.get("Description"),
+            "quantity": item.get("Quantity"),
+            "unit_price": _amount(item.get("UnitPrice")),
+            "amount": _amount(item.get("Amount")),
+        })
+
+    currency = None
+    for key in ("InvoiceTotal", "SubTotal", "AmountDue"):
+        if isinstance(fields.get(key), dict) and fields[key].get("currency"):
+            currency = fields[key]["currency"]
+            break
+
+    return {
+        "invoice_id": fields.get("InvoiceId"),
+        "invoice_date": fields.get("InvoiceDate"),
+        "service_start": fields.get("ServiceStartDate"),
+        "service_end": fields.get("ServiceEndDate"),
+        "vendor_name": fields.get("VendorName"),
+        "vendor_tax_id": fields.get("VendorTaxId"),
+        "customer_name": fields.get("CustomerName"),
+        "customer_address": fields.get("CustomerAddress"),
+        "billing_address": fields.get("BillingAddress"),
+        "purchase_order": fields.get("PurchaseOrder"),
+        "subtotal": _amount(fields.get("SubTotal")),
+        "total_tax": _amount(fields.get("TotalTax")),
+        "invoice_total": _amount(fields.get("InvoiceTotal")),
+        "currency": currency,
+        "items": items,
+    }
+
+
+def extract_invoice(pdf_content: bytes, doc_client) -> Tuple[Dict[str, Any], float]:
+    """
+    Run DI `prebuilt-invoice` and return (normalized invoice, extraction_time_seconds).
+    """
+    start_time = time.time()
+    result = analyze_document(doc_client, model_id="prebuilt-invoice", body=pdf_content)
+    fields = {}
+    if result.documents:
+        fields = {name: _field_value(f) for name, f in (result.documents[0].fields or {}).items()}
+    invoice = normalize_invoice(fields)
+    invoice["reverse_charge"] = bool(_REVERSE_CHARGE_RE.search(getattr(result, "content", None) or ""))
+    return invoice, time.time() - start_time
+
+
+# ---------------------------------------------------------------------------
+# Deterministic checks
+# ---------------------------------------------------------------------------
+
+def _check(status: str, reason: str, expected: Any = None, actual: Any = None) -> Dict[str, Any]:
+    return {"validation_status": status, "expected": expected, "actual": actual, "validation_reason": reason}
+
+
+def _close(a: float, b: float, tolerance: float) -> bool:
+    return abs(a - b) <= tolerance
+
+
+def _normalize_address(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    text = text.lower()
+    for src, dst in (("ß", "ss"), ("ä", "ae"), ("ö", "oe"), ("ü", "ue")):
+        text = text.replace(src, dst)
+    text = re.sub(r"str\.", "strasse ", text)
+    text = re.sub(r"stra(ss)?e\b", "strasse", text)
+    return re.sub(r"[^a-z0-9 ]+", " ", re.sub(r"\s+", " ", text)).strip()
+
+
+def _address_patterns(parts: Dict[str, str]) -> List["re.Pattern"]:
+    """
+    Street, postal code and city of an accepted address as whole-token patterns on the normalized
+    text: the street name may be split by spaces ("diesel strasse"), the house number must end
+    there ("dieselstrasse 8" does not match "dieselstrasse 80" or "8a").
+    """
+    name, number = parts["street"].rsplit(" ", 1)
+    street = r"\s?".join(re.escape(c) for c in name.replace(" ", ""))
+    return [re.compile(rf"\b{street}\s?{re.escape(number)}\b"),
+            re.compile(rf"\b{re.escape(parts['postal_code'])}\b"),
+            re.compile(rf"\b{re.escape(parts['city'])}\b")]
+
+
+_ADDRESS_PATTERNS = {name: _address_patterns(parts) for name, parts in ACCEPTED_INVOICE_ADDRESSES.items()}
+
+
+def match_invoice_address(address: Optional[str]) -> Optional[str]:
+    """Name of the accepted address `address` matches, or None."""
+    normalized = _normalize_address(address)
+    for name, patterns in _ADDRESS_PATTERNS.items():
+        if all(p.search(normalized) for p in patterns):
+            return name
+    return None
+
+
+def is_reverse_charge(invoice: Dict[str, Any]) -> bool:
+    """Reverse-charge wording on the invoice, or a supplier VAT id of another EU member state."""
+    tax_id = re.sub(r"[\s.\-]+", "", str(invoice.get("vendor_tax_id") or "")).upper()
+    return bool(invoice.get("reverse_charge")) or bool(_EU_VAT_ID_RE.match(tax_id))
+
+
+def validate_invoice(invoice: Dict[str, Any], vat_rates: Optional[List[float]] = None,
+                     tolerance: float = 0.02, reverse_charge: Optional[bool] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Arithmetic and address checks for one invoice. Statuses follow the contract vocabulary
+    (Correct / Mismatch / Missing). A reverse-charge invoice (`is_reverse_charge` unless given)
+    must charge 0% VAT; a missing VAT amount then counts as 0.
+    """
+    if reverse_charge is None:
+        reverse_charge = is_reverse_charge(invoice)
+    if reverse_charge:
+        vat_rates = [0.0]
+    elif vat_rates is None:
+        vat_rates = [float(r) for r in os.getenv("INVOICE_VAT_RATES", DEFAULT_VAT_RATES).split(",") if r.strip()]
+    checks: Dict[str, Dict[str, Any]] = {}
+    subtotal, tax, total = invoice.get("subtotal"), invoice.get("total_tax"), invoice.get("invoice_total")
+    if reverse_charge and tax is None:
+        tax = 0.0
+
+    for key in ("invoice_id", "invoice_date", "vendor_name"):
+        checks[key] = (_check("Correct", "Present", actual=invoice.get(key)) if invoice.get(key)
+                       else _check("Missing", f"{key} not found on the invoice"))
+
+    if None in (subtotal, tax, total):
+        checks["totals"] = _check("Missing", "Net, VAT or gross total not found",
+                                  actual={"subtotal": subtotal, "total_tax": tax, "invoice_total": total})
+    else:
+        expected = round(subtotal + tax, 2)
+        checks["totals"] = (_check("Correct", "Net + VAT = gross", expected, total) if _close(expected, total, tolerance)
+                            else _check("Mismatch", "Net + VAT does not equal the invoice total", expected, total))
+
+    if subtotal is None or tax is None:
+        checks["vat"] = _check("Missing", "Net amount or VAT not found")
+    else:
+        expected_taxes = [round(subtotal * rate, 2) for rate in vat_rates]
+        matched = [rate for rate, exp in zip(vat_rates, expected_taxes) if _close(exp, tax, tolerance)]
+        rate = round(tax / subtotal, 4) if subtotal else None
+        label = " (reverse charge)" if reverse_charge else ""
+        checks["vat"] = (_check("Correct", f"VAT at {matched[0]:.0%}{label}", expected_taxes, tax) if matched
+                         else _check("Mismatch", f"VAT rate {rate} is not one of {vat_rates}{label}", expected_taxes, tax))
+
+    items = [i for i in invoice.get("items", []) if i.get("amount") is not None]
+    if not items or subtotal is None:
+        checks["line_items"] = _check("Missing", "No line item amounts to reconcile")
+    else:
+        item_sum = round(sum(i["amount"] for i in items), 2)
+        checks["line_items"] = (_check("Correct", "Line items add up to the net amount", subtotal, item_sum)
+                                if _close(item_sum, subtotal, tolerance)
+                                else _check("Mismatch", "Line items do not add up to the net amount", subtotal, item_sum))
+        bad_lines = [i["description"] for i in items
+                     if isinstance(i.get("quantity"), (int, float)) and i.get("unit_price") is not None
+                     and not _close(i["quantity"] * i["unit_price"], i["amount"], tolerance)]
+        if bad_lines:
+            checks["line_items"] = _check("Mismatch", "Quantity × unit price differs from line amount",
+                                          actual=bad_lines)
+
+    address = invoice.get("billing_address") or invoice.get("customer_address")
+    if not address:
+        checks["invoice_address"] = _check("Missing", "No billing/customer address found")
+    else:
+        matched = match_invoice_address(address)
+        checks["invoice_address"] = (
+            _check("Correct", f"Matches {matched}", actual=address) if matched
+            else _check("Mismatch", "Address is neither Unterföhring nor the Allianz SE / Allianz Technology SE address",
+                        expected=list(ACCEPTED_INVOICE_ADDRESSES), actual=address)
+        )
+    return checks
+
+
+def validate_series(invoices: List[Dict[str, Any]], amount_tolerance: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Consistency checks across a run of monthly invoices from the same supplier:
+    unique numbers, one invoice per month, stable vendor/tax id/currency/address,
+    and totals within `amount_tolerance` of the median month.
+    """
+    if amount_tolerance is None:
+        amount_tolerance = float(os.getenv("INVOICE_AMOUNT_TOLERANCE", "0.25"))
+    checks: Dict[str, Dict[str, Any]] = {}
+    if len(invoices) < 2:
+        return checks
+
+    ids = [i.get("invoice_id") for i in invoices if i.get("invoice_id")]
+    duplicates = sorted({x for x in ids if ids.count(x) > 1})
+    checks["unique_invoice_numbers"] = (_check("Correct", "All invoice numbers are unique") if not duplicates
+                                        else _check("Mismatch", "Duplicate invoice numbers", actual=duplicates))
+
+    months = [str(i.get("service_start") or i.get("invoice_date") or "")[:7] for i in invoices]
+    months = [m for m in months if m]
+    repeated = sorted({m for m in months if months.count(m) > 1})
+    checks["one_invoice_per_month"] = (_check("Correct", f"{len(set(months))} distinct months") if not repeated
+                                       else _check("Mismatch", "More than one invoice for a month", actual=repeated))
+
+    for key in ("vendor_name", "vendor_tax_id", "currency", "billing_address"):
+        values = {str(i.get(key)).strip() for i in invoices if i.get(key)}
+        if not values:
+            checks[f"consistent_{key}"] = _check("Missing", f"{key} not found on any invoice")
+        elif len(values) == 1:
+            checks[f"consistent_{key}"] = _check("Correct", "Same on every invoice", actual=values.pop())
+        else:
+            checks[f"consistent_{key}"] = _check("Mismatch", f"{key} differs between invoices", actual=sorted(values))
+
+    totals = [(i.get("invoice_id"), i.get("invoice_total")) for i in invoices if i.get("invoice_total") is not None]
+    if len(totals) >= 2:
+        median = statistics.median(t for _, t in totals)
+        outliers = [{"invoice_id": inv, "total": t} for inv, t in totals
+                    if median and abs(t - median) / median > amount_tolerance]
+        checks["amount_consistency"] = (
+            _check("Correct", f"All totals within {amount_tolerance:.0%} of the median {median:.2f}", actual=median)
+            if not outliers else
+            _check("Mismatch", f"Totals deviate more than {amount_tolerance:.0%} from the median {median:.2f}",
+                   expected=median, actual=outliers)
+        )
+    return checks
+
+
+# ---------------------------------------------------------------------------
+# Bulk ingestion
+# ---------------------------------------------------------------------------
+
+def process_invoice(name: str, pdf_content: bytes, doc_client,
+                    reverse_charge: Optional[bool] = None) -> Dict[str, Any]:
+    try:
+        invoice, extraction_time = extract_invoice(pdf_content, doc_client)
+    except Exception as e:
+        return {"file_name": name, "error": str(e)}
+    return {
+        "file_name": name,
+        "invoice": invoice,
+        "checks": validate_invoice(invoice, reverse_charge=reverse_charge),
+        "extraction_time": extraction_time,
+    }
+
+
+def process_invoices(files: List[Tuple[str, bytes]], doc_client, max_workers: Optional[int] = None,
+                     reverse_charge: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Extract and validate many invoices in parallel (DI calls share the process-wide rate limiter).
+    `reverse_charge` forces the VAT expectation for every invoice (e.g. from the contract's VAT
+    option); by default each invoice is judged on its own.
+    Returns {"invoices": [...per file...], "series_checks": {...}, "elapsed": seconds}.
+    """
+    start_time = time.time()
+    max_workers = max_workers or int(os.getenv("INVOICE_MAX_WORKERS", "8"))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda f: process_invoice(f[0], f[1], doc_client, reverse_charge), files))
+
+    results.sort(key=lambda r: str((r.get("invoice") or {}).get("invoice_date") or r["file_name"]))
+    parsed = [r["invoice"] for r in results if "invoice" in r]
+    return {
+        "invoices": results,
+        "series_checks": validate_series(parsed),
+        "elapsed": time.time() - start_time,
+    }
+
+
+def load_invoice_folder(folder: str, pattern: str = "KT*.pdf") -> List[Tuple[str, bytes]]:
+    files = []
+    for path in sorted(glob.glob(os.path.join(folder, pattern))):
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-validate monthly invoices with DI prebuilt-invoice.")
+    parser.add_argument("folder", help="Folder containing the invoice PDFs")
+    parser.add_argument("--pattern", default="KT*.pdf", help="Glob for invoice files (default: KT*.pdf)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel DI requests")
+    parser.add_argument("--out", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    from client_pool import get_client_pool
+    doc_client, _ = get_client_pool().default_clients()
+    report = process_invoices(load_invoice_folder(args.folder, args.pattern), doc_client, args.workers)
+    text = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# ui/invoice_view.py
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict
+
+import streamlit as st
+
+from invoice_processor import process_invoices
+from memory_view import hold, load
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _checks_frame(checks: Dict[str, Dict[str, Any]]) -> "pd.DataFrame":
+    import pandas as pd  # loaded with the first invoice report, not at app start
+    return pd.DataFrame([
+        {
+            "check": name,
+            "status": c.get("validation_status"),
+            "expected": "" if c.get("expected") is None else str(c.get("expected")),
+            "actual": "" if c.get("actual") is None else str(c.get("actual")),
+            "reason": c.get("validation_reason", ""),
+        }
+        for name, c in checks.items()
+    ])
+
+
+def render_invoice_mode(doc_client) -> None:
+    """Upload a batch of monthly invoices, validate them with prebuilt-invoice and show the report."""
+    st.subheader("🧾 Invoice Validation")
+    uploaded_files = st.file_uploader(
+        "Select the invoice PDFs to validate (e.g. a year of monthly invoices)",
+        type="pdf",
+        accept_multiple_files=True,
+        key="invoice_files"
+    )
+
+    if uploaded_files and st.button("🚀 Validate Invoices", type="primary", use_container_width=True):
+        files = [(f.name, f.read()) for f in uploaded_files]
+        with st.spinner(f"Extracting {len(files)} invoices..."):
+            hold("invoice_report", process_invoices(files, doc_client))
+
+    report = load("invoice_report")
+    if not report:
+        return
+
+    invoices = report.get("invoices", [])
+    st.caption(f"Processed {len(invoices)} invoices in {report.get('elapsed', 0):.2f}s")
+
+    summary = []
+    for entry in invoices:
+        inv = entry.get("invoice") or {}
+        statuses = [c["validation_status"] for c in (entry.get("checks") or {}).values()]
+        summary.append({
+            "file": entry["file_name"],
+            "invoice_id": inv.get("invoice_id"),
+            "date": inv.get("invoice_date"),
+            "net": inv.get("subtotal"),
+            "vat": inv.get("total_tax"),
+            "gross": inv.get("invoice_total"),
+            "currency": inv.get("currency"),
+            "issues": sum(1 for s in statuses if s != "Correct") if "error" not in entry else "error",
+        })
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    if report.get("series_checks"):
+        with st.expander("📆 Cross-month Consistency", expanded=True):
+            st.dataframe(_checks_frame(report["series_checks"]), use_container_width=True, hide_index=True)
+
+    for entry in invoices:
+        with st.expander(f"🧾 {entry['file_name']}", expanded=False):
+            if "error" in entry:
+                st.error(entry["error"])
+                continue
+            st.dataframe(_checks_frame(entry["checks"]), use_container_width=True, hide_index=True)
+
+    st.download_button(
+        label="⬇️ Download Invoice Report (JSON)",
+        data=json.dumps(report, indent=2, ensure_ascii=False, default=str),
+        file_name=f"invoice_validation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        mime="application/json",
+        use_container_width=True
+    )
@@ -0,0 +1,86 @@
+# ui/job_view.py
+import time
+from typing import Optional
+
+import streamlit as st
+
+from jobs import FAILED, CANCELLED, Job, JobQueue
+
+POLL_SECONDS = 1.0
+STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌", "cancelled": "🚫"}
+
+
+def current_job_id() -> Optional[str]:
+    """Job attached to this page: the ?job= query parameter survives refreshes and can be shared."""
+    return st.query_params.get("job") or st.session_state.get("job_id")
+
+
+def attach_job(job_id: Optional[str]) -> None:
+    st.session_state.job_id = job_id
+    if job_id:
+        st.query_params["job"] = job_id
+    elif "job" in st.query_params:
+        del st.query_params["job"]
+
+
+def _render_progress(job: Job) -> None:
+    snap = job.snapshot()
+    icon = STATUS_ICONS.get(snap["status"], "⚙️")
+    st.progress(snap["progress"], text=f"{icon} {snap['name']} — {snap['stage']} ({snap['elapsed']:.1f}s)")
+    if snap["stage_times"]:
+        st.caption(" · ".join(f"{stage}: {seconds:.1f}s" for stage, seconds in snap["stage_times"].items()))
+
+
+def render_job_progress(queue: JobQueue, job_id: str) -> None:
+    """
+    Live progress of a running job. Polls every POLL_SECONDS inside a fragment, so only the
+    progress block reruns; once the job finishes the whole page reruns to show its result.
+    """
+    if hasattr(st, "fragment"):
+        @st.fragment(run_every=POLL_SECONDS)
+        def poll():
+            job = queue.get(job_id)
+            if job is None or job.finished:
+                st.rerun()
+            _render_progress(job)
+        poll()
+        return
+
+    # Streamlit without fragments: render once, then rerun the page after a short wait
+    job = queue.get(job_id)
+    if job is not None:
+        _render_progress(job)
+        if not job.finished:
+            time.sleep(POLL_SECONDS)
+    st.rerun()
+
+
+def render_job_error(job: Job) -> None:
+    if job.status == CANCELLED:
+        st.warning(f"🚫 Job {job.id} was cancelled.")
+    elif job.status == FAILED:
+        st.error("❌ Error Processing Document")
+        with st.expander("View Error Details"):
+            st.code(job.error or "", language="text")
+
+
+def render_job_list(queue: JobQueue, limit: int = 10) -> None:
+    """Sidebar list of recent jobs from every session, each one reattachable."""
+    jobs = queue.jobs(limit=limit)
+    if not jobs:
+        return
+    stats = queue.stats()
+    with st.expander(f"🗂️ Jobs ({stats['running']} running, {stats['queued']} queued)", expanded=False):
+        st.caption(f"{stats['workers']} workers")
+        for job in jobs:
+            snap = job.snapshot()
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.caption(
+                    f"{STATUS_ICONS.get(snap['status'], '')} **{snap.get('file_name', snap['name'])}** — "
+                    f"{snap['stage']} · {snap['elapsed']:.0f}s"
+                )
+            with col2:
+                if st.button("Open", key=f"open_job_{job.id}"):
+                    attach_job(job.id)
+                    st.rerun()
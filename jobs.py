@@ -0,0 +1,202 @@
+# services/jobs.py
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """
+    One pipeline run. The worker reports progress with `update(stage=..., progress=...)`;
+    every stage change closes the previous stage's timing.
+    """
+
+    def __init__(self, name: str, meta: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.meta: Dict[str, Any] = dict(meta or {})
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = 0
+        self.stage_times: Dict[str, float] = {}
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output: Any = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+        self._stage_started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _close_stage(self) -> None:
+        now = time.monotonic()
+        if self.stage not in FINISHED:
+            self.stage_times[self.stage] = round(
+                self.stage_times.get(self.stage, 0.0) + now - self._stage_started, 3)
+        self._stage_started = now
+
+    def update(self, stage: Optional[str] = None, progress: Optional[int] = None, **meta: Any) -> None:
+        with self._lock:
+            if stage is not None and stage != self.stage:
+                self._close_stage()
+                self.stage = stage
+            if progress is not None:
+                self.progress = max(0, min(100, int(progress)))
+            self.meta.update(meta)
+
+    def _start(self) -> None:
+        with self._lock:
+            self.status = RUNNING
+            self.started_at = time.time()
+            self._close_stage()
+            self.stage = RUNNING
+
+    def _finish(self, status: str, output: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._close_stage()
+            self.status = status
+            self.stage = status
+            self.output = output
+            self.error = error
+            self.finished_at = time.time()
+            if status == DONE:
+                self.progress = 100
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def elapsed(self) -> float:
+        end = self.finished_at or time.time()
+        return end - (self.started_at or self.submitted_at)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Status without the output, safe to render or serialize."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "stage_times": dict(self.stage_times),
+                "submitted_at": datetime.fromtimestamp(self.submitted_at).isoformat(timespec="seconds"),
+                "elapsed": round(self.elapsed(), 2),
+                "error": self.error,
+                **self.meta,
+            }
+
+
+class JobQueue:
+    """
+    Process-wide job queue: `submit` returns a job id immediately and a worker pool runs the
+    pipeline. Jobs live in this process, so any Streamlit session (a refreshed page, a second
+    tab) can look one up by id and reattach. Capacity scales with JOB_WORKERS rather than
+    with the number of open sessions.
+
+    Workers are threads: the pipeline waits on DI and the LLM, so it is I/O-bound.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("JOB_TTL_SECONDS", "3600"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._batches: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job: Job, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+        job._start()
+        try:
+            output = fn(job, **kwargs)
+        except Exception as e:
+            job._finish(FAILED, error=f"{e}\n{traceback.format_exc(limit=3)}")
+        else:
+            job._finish(DONE, output=output)
+
+    def submit(self, fn: Callable[..., Any], name: str = "job", meta: Optional[Dict[str, Any]] = None,
+               **kwargs: Any) -> str:
+        """
+        Queue `fn(job, **kwargs)`. Its return value becomes `job.output`; raising marks the job failed.
+        Returns the job id.
+        """
+        self._prune()
+        job = Job(name, meta)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, kwargs)
+        return job.id
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, limit: Optional[int] = None) -> List[Job]:
+        """Newest first."""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.submitted_at, reverse=True)
+        return jobs[:limit] if limit else jobs
+
+    def create_batch(self, job_ids: List[str]) -> str:
+        """Group jobs (e.g. one per uploaded file) under one id a page can reattach to."""
+        batch_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._batches[batch_id] = list(job_ids)
+        return batch_id
+
+    def batch(self, batch_id: Optional[str]) -> Optional[List[Job]]:
+        """The batch's jobs in submission order (pruned jobs are skipped), or None if unknown."""
+        with self._lock:
+            job_ids = self._batches.get(batch_id) if batch_id else None
+            if job_ids is None:
+                return None
+            return [self._jobs[j] for j in job_ids if j in self._jobs]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        job = self.get(job_id)
+        if job is None or job.future is None or not job.future.cancel():
+            return False
+        job._finish(CANCELLED)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        for job in self.jobs():
+            counts[job.status] += 1
+        return {"workers": self.max_workers, **counts}
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the TTL."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and (j.finished_at or 0) < cutoff]:
+                del self._jobs[job_id]
+            for batch_id in [b for b, ids in self._batches.items() if not any(j in self._jobs for j in ids)]:
+                del self._batches[batch_id]
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_QUEUE: Optional[JobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide JobQueue shared by every Streamlit session."""
+    global _QUEUE
+    if _QUEUE is None:
+        with _QUEUE_LOCK:
+            if _QUEUE is None:
+                _QUEUE = JobQueue()
+    return _QUEUE
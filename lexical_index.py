@@ -0,0 +1,91 @@
+# services/lexical_index.py
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# A token keeps its inner separators, so "2.1", "1.234,56", "01.03.2024", "a.b@x.de" and
+# "DE-12345" stay whole; leading/trailing punctuation is stripped.
+_TOKEN_RE = re.compile(r"[\w@]+(?:[.,:/@+\-][\w@]+)*", re.UNICODE)
+_PART_RE = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms of `text`. Besides each whole token this emits the words inside compound
+    tokens (e-mail user and domain parts) and the bare digits of long numbers, so "1234.56"
+    finds "1.234,56" and "doe" finds "john.doe@example.com".
+    """
+    terms: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        if token.isalnum():
+            continue
+        terms += [part for part in _PART_RE.findall(token) if part != token]
+        digits = re.sub(r"\D", "", token)
+        if len(digits) >= 4 and digits != token:
+            terms.append(digits)
+    return terms
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring. Only the postings of the query terms are
+    read, so exact lookups (CWIDs, amounts, dates, clause numbers) cost no embedding call.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {doc index: term frequency}
+        self.lengths: List[int] = []
+        self.avg_length = 0.0
+
+    def build(self, texts: List[str]) -> None:
+        self.postings = {}
+        self.lengths = []
+        self.add(texts)
+
+    def add(self, texts: List[str]) -> None:
+        """Append documents; they are numbered after the ones already indexed."""
+        for doc, text in enumerate(texts, start=len(self.lengths)):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc] = tf
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def _idf(self, term: str) -> float:
+        n = len(self.lengths)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score of every document containing at least one query term."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf(term)
+            for doc, tf in docs.items():
+                norm = 1 - self.b + self.b * self.lengths[doc] / (self.avg_length or 1)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """(doc index, score) of the top_k matches, best first."""
+        return sorted(self.scores(query).items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked lists of doc indexes by summing 1 / (k + rank). Works on ranks only, so BM25
+    and cosine scores need no calibration against each other.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
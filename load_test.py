@@ -0,0 +1,146 @@
+# load_test.py
+"""
+N-user throughput test of the real pipeline (pooled clients, rate limiter, router) against the
+local mock services, with no network:
+
+    python load_test.py --users 8 --duration 120 --openai-latency 3 --throttle-rate 0.02 --tpm 120000
+    python load_test.py --users 16 --endpoint http://127.0.0.1:8765/   # an already running mock_services.py
+
+Each simulated user repeatedly extracts a PDF and analyzes it, like one Streamlit session.
+"""
+import glob
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from mock_services import MockServer, build_arg_parser, settings_from_args
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+
+def run_users(documents: Dict[str, bytes], users: int, duration: float,
+              iterations: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run `users` threads, each processing documents round-robin until `duration` seconds
+    (or `iterations` documents per user) have passed. Returns latency and throughput figures.
+    """
+    # Imported here so AZURE_MOCK_ENDPOINT is set before the client pool is created
+    from strem import analyze_contract, extract_text_from_pdf
+    from client_pool import get_client_pool
+    from openai_router import get_openai_client
+    from rate_limiter import limiter_snapshots
+
+    doc_client, _ = get_client_pool().default_clients()
+    openai_client = get_openai_client()
+
+    names = list(documents)
+    latencies: List[float] = []
+    extraction: List[float] = []
+    analysis: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user(index: int) -> None:
+        done = 0
+        while time.monotonic() < deadline and (iterations is None or done < iterations):
+            name = names[(index + done) % len(names)]
+            start = time.monotonic()
+            try:
+                full_text, _, extraction_time = extract_text_from_pdf(documents[name], doc_client)
+                _, analysis_time = analyze_contract(full_text, openai_client)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{name}: {e}")
+            else:
+                with lock:
+                    latencies.append(time.monotonic() - start)
+                    extraction.append(extraction_time)
+                    analysis.append(analysis_time)
+            done += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "users": users,
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "documents_per_minute": round(len(latencies) * 60 / elapsed, 2) if elapsed else 0.0,
+        "latency": {
+            "mean": round(statistics.fmean(latencies), 3) if latencies else None,
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+        },
+        "extraction_p50": _percentile(extraction, 0.50),
+        "analysis_p50": _percentile(analysis, 0.50),
+        "limiters": limiter_snapshots(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    parser.description = "N-user load test against the local mock Azure services."
+    parser.set_defaults(port=0)
+    parser.add_argument("pdfs", nargs="*", help="PDFs to process (default: *.pdf in the current directory)")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    parser.add_argument("--iterations", type=int, default=None, help="Documents per user (overrides duration)")
+    parser.add_argument("--endpoint", default=None, help="Use an already running mock server instead")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = args.pdfs or sorted(glob.glob("*.pdf"))
+    documents = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            documents[os.path.basename(path)] = f.read()
+    if not documents:
+        print("No PDFs to process.", file=sys.stderr)
+        return 1
+
+    os.environ.setdefault("AZURE_OPENAI_MODEL", "mock-gpt")
+    duration = args.duration if args.iterations is None else float("inf")
+
+    server = None
+    if args.endpoint:
+        os.environ["AZURE_MOCK_ENDPOINT"] = args.endpoint
+    else:
+        server = MockServer(args.host, args.port, settings_from_args(args)).start()
+        os.environ["AZURE_MOCK_ENDPOINT"] = server.url
+    try:
+        report = run_users(documents, args.users, duration, args.iterations)
+        if server is not None:
+            report["server"] = server.state.snapshot()
+    finally:
+        if server is not None:
+            server.stop()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# ui/memory_view.py
+import uuid
+from typing import Any, Optional
+
+import streamlit as st
+
+from artifact_store import get_artifact_store
+
+
+def session_id() -> str:
+    """Stable id of this browser session, the owner of its artifacts."""
+    if "artifact_session" not in st.session_state:
+        st.session_state.artifact_session = uuid.uuid4().hex[:12]
+    return st.session_state.artifact_session
+
+
+def hold(name: str, obj: Any, key: Optional[str] = None) -> str:
+    """Keep a large object for this session by reference (see ArtifactStore)."""
+    return get_artifact_store().put(session_id(), name, obj, key)
+
+
+def load(name: str) -> Any:
+    return get_artifact_store().get(session_id(), name)
+
+
+def held(name: str) -> bool:
+    """Whether this session holds `name`, without reloading it from disk."""
+    return get_artifact_store().key(session_id(), name) is not None
+
+
+def drop(name: Optional[str] = None) -> None:
+    get_artifact_store().release(session_id(), name)
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def render_memory_panel() -> None:
+    """Sidebar admin view: global budget usage, spill counters and per-session footprint."""
+    store = get_artifact_store()
+    stats = store.stats()
+    with st.expander(f"🧠 Session Memory ({_mb(stats['memory_bytes'])} / {_mb(stats['budget_bytes'])})", expanded=False):
+        st.progress(min(100, int(100 * stats["memory_bytes"] / stats["budget_bytes"])) if stats["budget_bytes"] else 0)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("In Memory", f"{stats['in_memory']}/{stats['objects']}")
+            st.metric("Reloads", stats["reloads"])
+        with col2:
+            st.metric("On Disk", _mb(stats["disk_bytes"]))
+            st.metric("Spills", stats["spills"])
+        rows = [
+            {**row,
+             "session": row["session"] if row["session"] != session_id() else f"{row['session']} (you)",
+             "memory_bytes": _mb(row["memory_bytes"]),
+             "disk_bytes": _mb(row["disk_bytes"])}
+            for row in store.sessions()
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
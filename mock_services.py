@@ -0,0 +1,493 @@
+# services/mock_services.py
+"""
+Local stand-ins for Azure Document Intelligence and Azure OpenAI, for load tests without network.
+
+    python mock_services.py --port 8765 --openai-latency 3 --openai-jitter 1.5 \\
+        --distribution lognormal --throttle-rate 0.02 --tpm 120000 --rpm 600
+
+Point the app at it with AZURE_MOCK_ENDPOINT=http://127.0.0.1:8765/ — every pooled client
+(Document Intelligence, OpenAI and all router deployments) then talks to this server.
+
+Implements:
+  POST /documentintelligence/documentModels/{model}:analyze   → 202 + Operation-Location
+  GET  /documentintelligence/documentModels/{model}/analyzeResults/{id}   (polling)
+  POST /openai/deployments/{deployment}/chat/completions   (JSON, or server-sent events with "stream": true)
+  POST /openai/deployments/{deployment}/embeddings
+  GET  /stats   POST /stats/reset   GET /healthz
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from fixtures import (
+    FixtureStore,
+    SimulatedLatency,
+    analyze_key,
+    chat_key,
+    embeddings_key,
+    layout_from_pdf,
+    synthetic_chat_completion,
+    synthetic_embedding,
+)
+from rate_limiter import TokenBucket, estimate_chat_tokens, estimate_tokens
+
+ANALYZE_PATH = re.compile(r"^/(?:documentintelligence|formrecognizer)/documentModels/([^/:]+):analyze$")
+RESULT_PATH = re.compile(r"^/(?:documentintelligence|formrecognizer)/documentModels/([^/]+)/analyzeResults/([^/]+)$")
+OPENAI_PATH = re.compile(r"^/openai/deployments/([^/]+)/(chat/completions|embeddings)$")
+STREAM_PIECE_CHARS = 24  # content characters per streamed chunk
+
+
+class MockSettings:
+    """
+    Behaviour of the mock services.
+
+    di_latency / openai_latency: response latency of each request.
+    di_seconds_per_page: how long an analyze operation stays "running" per page.
+    operation_ttl: seconds a finished analyze operation is kept if it is never polled.
+    throttle_rate: fraction of requests answered with a random 429.
+    rpm / tpm: per-deployment (and per-DI-resource for rpm) quotas; exceeding them returns 429
+    with retry-after-ms, like the real services. None disables the quota.
+    """
+
+    def __init__(self, di_latency: Optional[SimulatedLatency] = None,
+                 openai_latency: Optional[SimulatedLatency] = None,
+                 di_seconds_per_page: float = 0.05, poll_interval: float = 0.25,
+                 operation_ttl: float = 300.0,
+                 throttle_rate: float = 0.0, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 di_rpm: Optional[float] = None, fixtures: Optional[FixtureStore] = None,
+                 api_key: Optional[str] = None, seed: Optional[int] = None):
+        self.di_latency = di_latency or SimulatedLatency()
+        self.openai_latency = openai_latency or SimulatedLatency()
+        self.di_seconds_per_page = di_seconds_per_page
+        self.poll_interval = poll_interval
+        self.operation_ttl = operation_ttl
+        self.throttle_rate = throttle_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.di_rpm = di_rpm
+        self.fixtures = fixtures or FixtureStore(directory="")
+        self.api_key = api_key
+        self.random = random.Random(seed)
+
+
+class MockState:
+    """Pending analyze operations, per-deployment quotas and token accounting."""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.operations: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, scope: str, **values: float) -> None:
+        with self._lock:
+            for name, value in values.items():
+                self.stats[scope][name] += value
+
+    def _bucket(self, scope: str, kind: str, per_minute: Optional[float]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        with self._lock:
+            if (scope, kind) not in self.buckets:
+                self.buckets[(scope, kind)] = TokenBucket(per_minute)
+            return self.buckets[(scope, kind)]
+
+    def admit(self, scope: str, tokens: int, rpm: Optional[float], tpm: Optional[float]) -> float:
+        """0 when the request is admitted, otherwise seconds until the quota allows it."""
+        with self._lock:
+            injected = self.settings.random.random() < self.settings.throttle_rate
+        if injected:
+            return 1.0
+        requests = self._bucket(scope, "rpm", rpm)
+        wait = requests.try_acquire(1) if requests else 0.0
+        if wait:
+            return wait
+        token_bucket = self._bucket(scope, "tpm", tpm)
+        wait = token_bucket.try_acquire(tokens) if token_bucket and tokens else 0.0
+        if wait and requests:
+            requests.refund(1)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        for operation_id in [k for k, op in self.operations.items() if op["expires_at"] <= now]:
+            del self.operations[operation_id]
+
+    def add_operation(self, result: Dict[str, Any], processing_seconds: float) -> str:
+        operation_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            self.operations[operation_id] = {
+                "ready_at": now + processing_seconds,
+                "expires_at": now + processing_seconds + self.settings.operation_ttl,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "result": result,
+            }
+        return operation_id
+
+    def get_operation(self, operation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict(time.monotonic())
+            return self.operations.get(operation_id)
+
+    def finish_operation(self, operation_id: str, grace: float = 30.0) -> None:
+        """The result was delivered: keep it only briefly for a client that polls once more."""
+        with self._lock:
+            operation = self.operations.get(operation_id)
+            if operation is not None:
+                operation["expires_at"] = min(operation["expires_at"], time.monotonic() + grace)
+
+    def remaining(self, scope: str) -> Dict[str, str]:
+        headers = {}
+        for kind, header in (("rpm", "x-ratelimit-remaining-requests"), ("tpm", "x-ratelimit-remaining-tokens")):
+            bucket = self.buckets.get((scope, kind))
+            if bucket:
+                headers[header] = str(int(bucket.available()))
+        return headers
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {scope: dict(values) for scope, values in self.stats.items()}
+            pending = sum(1 for op in self.operations.values() if op["ready_at"] > time.monotonic())
+        elapsed = max(time.time() - self.started, 1e-6)
+        for values in stats.values():
+            values["requests_per_minute"] = round(values.get("requests", 0) * 60 / elapsed, 1)
+            values["tokens_per_minute"] = round(values.get("total_tokens", 0) * 60 / elapsed, 1)
+        return {"uptime_seconds": round(elapsed, 1), "pending_operations": pending, "scopes": stats}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats.clear()
+            self.buckets.clear()
+            self.operations.clear()
+            self.started = time.time()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, format, *args):  # keep load tests quiet
+        pass
+
+    # ---------------- plumbing ----------------
+
+    def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("apim-request-id", uuid.uuid4().hex)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_chat_stream(self, payload: Dict[str, Any], include_usage: bool,
+                          latency: SimulatedLatency, headers: Optional[Dict[str, str]] = None) -> float:
+        """
+        `payload` as server-sent events, the way the service answers "stream": true: a role
+        chunk, the content in pieces, the finish_reason, the usage chunk (empty choices) when
+        stream_options.include_usage is set, then [DONE]. The base latency and the prompt
+        tokens go before the first chunk; completion tokens are paced across the pieces.
+        Returns the seconds slept.
+        """
+        choice = payload["choices"][0]
+        content = choice["message"].get("content") or ""
+        usage = payload.get("usage") or {}
+        header = {"id": payload.get("id"), "object": "chat.completion.chunk",
+                  "created": payload.get("created", 0), "model": payload.get("model")}
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {**header, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("apim-request-id", uuid.uuid4().hex)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        slept = latency.wait(tokens=usage.get("prompt_tokens", 0))
+        events = [event({"role": "assistant", "content": ""})]
+        events += [event({"content": content[i:i + STREAM_PIECE_CHARS]})
+                   for i in range(0, len(content), STREAM_PIECE_CHARS)]
+        events.append(event({}, choice.get("finish_reason") or "stop"))
+        if include_usage:
+            events.append({**header, "choices": [], "usage": usage})
+        for chunk in events:
+            delta = chunk["choices"][0]["delta"] if chunk["choices"] else {}
+            pause = latency.per_1k_tokens * estimate_tokens(delta.get("content") or "") / 1000.0
+            if pause > 0:
+                time.sleep(pause)
+                slept += pause
+            self._write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+        return slept
+
+    def _throttled(self, scope: str, wait: float) -> None:
+        self.server.state.count(scope, throttled=1)
+        ms = max(1, int(wait * 1000))
+        self._send(429, {"error": {"code": "429", "message": "Rate limit is exceeded (mock)."}},
+                   {"retry-after-ms": str(ms), "retry-after": str(max(1, round(wait)))})
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _authorized(self) -> bool:
+        expected = self.server.state.settings.api_key
+        if not expected:
+            return True
+        supplied = self.headers.get("api-key") or self.headers.get("Ocp-Apim-Subscription-Key")
+        if supplied == expected:
+            return True
+        self._send(401, {"error": {"code": "401", "message": "Access denied due to invalid key (mock)."}})
+        return False
+
+    # ---------------- routes ----------------
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/healthz":
+            return self._send(200, {"status": "ok"})
+        if path == "/stats":
+            return self._send(200, self.server.state.snapshot())
+        match = RESULT_PATH.match(path)
+        if match and self._authorized():
+            return self._analyze_result(match.group(2))
+        if not match:
+            self._send(404, {"error": {"code": "404", "message": f"No mock route for GET {path}"}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path == "/stats/reset":
+            self.server.state.reset()
+            return self._send(204)
+        if not self._authorized():
+            return
+        match = ANALYZE_PATH.match(path)
+        if match:
+            return self._analyze(match.group(1), body)
+        match = OPENAI_PATH.match(path)
+        if match:
+            deployment, operation = match.groups()
+            if operation == "embeddings":
+                return self._embeddings(deployment, body)
+            return self._chat(deployment, body)
+        self._send(404, {"error": {"code": "404", "message": f"No mock route for POST {path}"}})
+
+    # ---------------- Document Intelligence ----------------
+
+    def _analyze(self, model_id: str, body: bytes) -> None:
+        state, settings = self.server.state, self.server.state.settings
+        wait = state.admit("document_intelligence", 0, settings.di_rpm, None)
+        if wait:
+            return self._throttled("document_intelligence", wait)
+
+        pdf_content = body
+        if self.headers.get("Content-Type", "").startswith("application/json") and body:
+            request = json.loads(body)
+            pdf_content = base64.b64decode(request.get("base64Source", ""))
+
+        payload = settings.fixtures.get("analyze", analyze_key({"model_id": model_id, "body": pdf_content}))
+        if payload is None:
+            try:
+                payload = layout_from_pdf(pdf_content)
+            except Exception:
+                payload = {"content": "", "pages": []}
+            payload["modelId"] = model_id
+            payload.setdefault("documents", [])
+
+        pages = len(payload.get("pages") or [])
+        delay = settings.di_latency.wait(tokens=pages * 500)
+        operation_id = state.add_operation(payload, pages * settings.di_seconds_per_page)
+        state.count("document_intelligence", requests=1, pages=pages, latency_seconds=delay)
+
+        base = f"http://{self.headers.get('Host')}"
+        query = urlparse(self.path).query
+        location = f"{base}{self.path.split(':analyze')[0]}/analyzeResults/{operation_id}?{query}"
+        self._send(202, None, {"Operation-Location": location,
+                               "retry-after-ms": str(int(settings.poll_interval * 1000))})
+
+    def _analyze_result(self, operation_id: str) -> None:
+        state = self.server.state
+        operation = state.get_operation(operation_id)
+        if operation is None:
+            return self._send(404, {"error": {"code": "NotFound", "message": "Unknown operation (mock)."}})
+        state.count("document_intelligence", polls=1)
+        body = {"status": "running", "createdDateTime": operation["created"],
+                "lastUpdatedDateTime": operation["created"]}
+        if operation["ready_at"] <= time.monotonic():
+            body["status"] = "succeeded"
+            body["analyzeResult"] = operation["result"]
+            state.finish_operation(operation_id)
+        self._send(200, body, {"retry-after-ms": str(int(state.settings.poll_interval * 1000))})
+
+    # ---------------- Azure OpenAI ----------------
+
+    def _chat(self, deployment: str, body: bytes) -> None:
+        state, settings = self.server.state, self.server.state.settings
+        request = json.loads(body or b"{}")
+        request.setdefault("model", deployment)
+        scope = f"deployment:{deployment}"
+        estimated = estimate_chat_tokens(request.get("messages", []), request.get("max_tokens") or 0)
+        wait = state.admit(scope, estimated, settings.rpm, settings.tpm)
+        if wait:
+            return self._throttled(scope, wait)
+
+        payload = settings.fixtures.get("chat", chat_key(request)) or synthetic_chat_completion(request)
+        usage = payload.get("usage") or {}
+        count = dict(requests=1, prompt_tokens=usage.get("prompt_tokens", 0),
+                     completion_tokens=usage.get("completion_tokens", 0),
+                     total_tokens=usage.get("total_tokens", 0))
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            delay = self._send_chat_stream(payload, include_usage, settings.openai_latency, state.remaining(scope))
+            return state.count(scope, latency_seconds=delay, **count)
+        delay = settings.openai_latency.wait(tokens=usage.get("total_tokens", 0))
+        state.count(scope, latency_seconds=delay, **count)
+        self._send(200, payload, state.remaining(scope))
+
+    def _embeddings(self, deployment: str, body: bytes) -> None:
+        state, settings = self.server.state, self.server.state.settings
+        request = json.loads(body or b"{}")
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        model = request.get("model", deployment)
+        scope = f"deployment:{deployment}"
+        tokens = sum(estimate_tokens(t) for t in texts)
+        wait = state.admit(scope, tokens, settings.rpm, settings.tpm)
+        if wait:
+            return self._throttled(scope, wait)
+
+        data = []
+        for i, text in enumerate(texts):
+            recorded = settings.fixtures.get("embeddings", embeddings_key(model, text))
+            embedding = recorded["embedding"] if recorded else synthetic_embedding(text)
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        delay = settings.openai_latency.wait(tokens=tokens)
+        state.count(scope, requests=1, latency_seconds=delay, embedding_tokens=tokens, total_tokens=tokens)
+        self._send(200, {"object": "list", "model": model, "data": data,
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}, state.remaining(scope))
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Threaded mock server. Use as a context manager to run it in a background thread:
+
+        with MockServer(settings=MockSettings(throttle_rate=0.05)) as server:
+            os.environ["AZURE_MOCK_ENDPOINT"] = server.url
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: Optional[MockSettings] = None):
+        super().__init__((host, port), MockHandler)
+        self.state = MockState(settings or MockSettings())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def handle_error(self, request, client_address) -> None:
+        # clients closing keep-alive connections (e.g. at the end of a load test) are not errors
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local mock Document Intelligence / Azure OpenAI services.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--distribution", default="lognormal", choices=SimulatedLatency.DISTRIBUTIONS)
+    parser.add_argument("--di-latency", type=float, default=0.3, help="Mean seconds to accept an analyze request")
+    parser.add_argument("--di-jitter", type=float, default=0.1)
+    parser.add_argument("--di-seconds-per-page", type=float, default=0.05, help="Processing time per page")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="retry-after for LRO polling")
+    parser.add_argument("--operation-ttl", type=float, default=300.0,
+                        help="seconds an unpolled finished analyze operation is kept")
+    parser.add_argument("--openai-latency", type=float, default=2.0, help="Mean seconds per OpenAI request")
+    parser.add_argument("--openai-jitter", type=float, default=1.0)
+    parser.add_argument("--openai-latency-per-1k", type=float, default=0.02, help="Extra seconds per 1k tokens")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of random 429 responses")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests/minute per OpenAI deployment")
+    parser.add_argument("--tpm", type=float, default=None, help="Tokens/minute per OpenAI deployment")
+    parser.add_argument("--di-rpm", type=float, default=None, help="Analyze requests/minute")
+    parser.add_argument("--fixtures", default="", help="Serve recorded payloads from this fixture directory")
+    parser.add_argument("--api-key", default=None, help="Require this api-key header")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(
+        di_latency=SimulatedLatency(args.di_latency, args.di_jitter, seed=args.seed, distribution=args.distribution),
+        openai_latency=SimulatedLatency(args.openai_latency, args.openai_jitter, args.openai_latency_per_1k,
+                                        seed=args.seed, distribution=args.distribution),
+        di_seconds_per_page=args.di_seconds_per_page,
+        poll_interval=args.poll_interval,
+        operation_ttl=args.operation_ttl,
+        throttle_rate=args.throttle_rate,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        di_rpm=args.di_rpm,
+        fixtures=FixtureStore(directory=args.fixtures),
+        api_key=args.api_key,
+        seed=args.seed,
+    )
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    server = MockServer(args.host, args.port, settings_from_args(args))
+    print(f"Mock Azure services on {server.url}  (set AZURE_MOCK_ENDPOINT={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
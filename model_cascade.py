@@ -0,0 +1,163 @@
+# services/model_cascade.py
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from contract_prompt import (
+    REQUIRED_FIELDS,
+    SECTION_DEPENDENCIES,
+    SECTIONS,
+    dependents_of,
+    result_keys,
+)
+
+# template_classification.confidence values that are not trusted from the fast model
+LOW_CONFIDENCE = {"Low", "Medium"}
+EMPTY_VALUES = (None, "", [], {})
+
+
+def cascade_models() -> Tuple[Optional[str], Optional[str]]:
+    """(fast_model, strong_model) from AZURE_OPENAI_CASCADE_MODEL / AZURE_OPENAI_MODEL."""
+    return os.getenv("AZURE_OPENAI_CASCADE_MODEL"), os.getenv("AZURE_OPENAI_MODEL")
+
+
+def _statuses(value: Any) -> List[str]:
+    """All validation_status values found anywhere inside `value`."""
+    found = []
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == "validation_status" and isinstance(v, str):
+                found.append(v)
+            else:
+                found.extend(_statuses(v))
+    elif isinstance(value, list):
+        for item in value:
+            found.extend(_statuses(item))
+    return found
+
+
+def score_section(result: Dict[str, Any], section: Dict[str, Any],
+                  min_completeness: float = 0.8) -> Dict[str, Any]:
+    """
+    Score one prompt section of a fast-model result.
+    Returns {completeness, statuses, escalate, reasons}.
+    """
+    expected = present = 0
+    statuses: List[str] = []
+    reasons: List[str] = []
+    for key in section["keys"]:
+        data = result.get(key)
+        fields = REQUIRED_FIELDS.get(key, [])
+        expected += len(fields)
+        if isinstance(data, dict):
+            present += sum(1 for f in fields if data.get(f) not in EMPTY_VALUES)
+            statuses.extend(_statuses(data))
+        if key == "template_classification" and isinstance(data, dict):
+            if data.get("confidence") in LOW_CONFIDENCE or data.get("confidence") is None:
+                reasons.append(f"confidence {data.get('confidence')}")
+
+    completeness = present / expected if expected else 1.0
+    if completeness < min_completeness:
+        reasons.append(f"schema completeness {completeness:.0%}")
+    if "Mismatch" in statuses:
+        reasons.append("Mismatch status")
+
+    return {
+        "completeness": round(completeness, 3),
+        "statuses": statuses,
+        "escalate": bool(reasons),
+        "reasons": reasons,
+    }
+
+
+def sections_to_escalate(result: Dict[str, Any], min_completeness: float = 0.8,
+                         section_ids: Optional[List[str]] = None) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Sections the strong model must re-run: low confidence, incomplete or Mismatch,
+    plus every section that cross-validates against one of those.
+    section_ids: sections the fast model was asked for (all when None).
+    Returns (section_ids, reasons_by_section).
+    """
+    reasons: Dict[str, List[str]] = {}
+    for section in SECTIONS:
+        if section_ids is not None and section["id"] not in section_ids:
+            continue
+        score = score_section(result, section, min_completeness)
+        if score["escalate"]:
+            reasons[section["id"]] = score["reasons"]
+
+    escalate = list(reasons)
+    for dependent in dependents_of(escalate):
+        if section_ids is not None and dependent not in section_ids:
+            continue
+        reasons.setdefault(dependent, []).append("depends on an escalated section")
+        escalate.append(dependent)
+
+    ordered = [s["id"] for s in SECTIONS if s["id"] in escalate]
+    return ordered, reasons
+
+
+def analyze_with_cascade(analyzer, text: str, fast_model: Optional[str] = None,
+                         strong_model: Optional[str] = None,
+                         min_completeness: Optional[float] = None,
+                         section_ids: Optional[List[str]] = None,
+                         context: Optional[Dict[str, Any]] = None,
+                         template: Optional[str] = None) -> Tuple[Dict[str, Any], float]:
+    """
+    Run the sections on the fast model, then re-run only the weak sections on the strong model.
+
+    analyzer: a ContractAnalyzer. section_ids / context / template are passed through to
+    `analyze_sections`. The merged result carries `_model_provenance` ({result_key: model})
+    and `_cascade` (escalated sections and why).
+    Returns (result_json, analysis_time_seconds).
+    """
+    default_fast, default_strong = cascade_models()
+    fast_model = fast_model or default_fast
+    strong_model = strong_model or default_strong or analyzer.model
+    if min_completeness is None:
+        min_completeness = float(os.getenv("AZURE_OPENAI_CASCADE_MIN_COMPLETENESS", "0.8"))
+
+    start_time = time.time()
+
+    if not fast_model or fast_model == strong_model:
+        result, _ = analyzer.analyze_sections(text, section_ids, model=strong_model,
+                                               context=context, template=template)
+        result["_model_provenance"] = {key: strong_model for key in result_keys(section_ids) if key in result}
+        return result, time.time() - start_time
+
+    try:
+        result, _ = analyzer.analyze_sections(text, section_ids, model=fast_model,
+                                               context=context, template=template)
+    except ValueError:
+        # fast model returned unusable JSON — do the whole contract on the strong model
+        result, _ = analyzer.analyze_sections(text, section_ids, model=strong_model,
+                                               context=context, template=template)
+        result["_model_provenance"] = {key: strong_model for key in result_keys(section_ids) if key in result}
+        result["_cascade"] = {"fast_model": fast_model, "strong_model": strong_model,
+                              "escalated_sections": "all", "reasons": {"*": ["invalid JSON from fast model"]}}
+        return result, time.time() - start_time
+
+    provenance = {key: fast_model for key in result_keys(section_ids) if key in result}
+    escalate, reasons = sections_to_escalate(result, min_completeness, section_ids)
+
+    if escalate:
+        escalated_keys = result_keys(escalate)
+        # only the fast-model sections the escalated ones cross-validate against
+        inputs = [d for s in escalate for d in SECTION_DEPENDENCIES.get(s, []) if d not in escalate]
+        strong_context = dict(context or {})
+        strong_context.update({k: result[k] for k in result_keys(inputs) if k in result})
+        strong, _ = analyzer.analyze_sections(text, escalate, model=strong_model,
+                                              context=strong_context, template=template)
+        for key in escalated_keys:
+            if key in strong:
+                result[key] = strong[key]
+                provenance[key] = strong_model
+
+    result["_model_provenance"] = provenance
+    result["_cascade"] = {
+        "fast_model": fast_model,
+        "strong_model": strong_model,
+        "escalated_sections": escalate,
+        "reasons": reasons,
+    }
+    return result, time.time() - start_time
@@ -0,0 +1,297 @@
+# services/openai_router.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from client_pool import get_client_pool
+from rate_limiter import (
+    RateLimitExceeded,
+    chat_completion,
+    embeddings,
+    estimate_chat_tokens,
+    estimate_tokens,
+    get_limiter,
+    is_throttled,
+    status_code_of,
+    total_tokens_of,
+)
+
+
+class Deployment:
+    """
+    One Azure OpenAI deployment the router can send requests to, with its rolling health.
+
+    `model` is the logical name callers ask for (e.g. AZURE_OPENAI_MODEL), `deployment` is
+    the Azure deployment name sent to the endpoint. Lower `priority` is preferred
+    (e.g. PTU = 0, pay-as-you-go = 1), so pay-as-you-go only takes spill-over.
+    """
+
+    def __init__(self, name: str, endpoint: str, api_key: str, api_version: str, model: str,
+                 deployment: Optional[str] = None, rpm: Optional[float] = None,
+                 tpm: Optional[float] = None, priority: int = 0, window: int = 50):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.model = model
+        self.deployment = deployment or model
+        self.priority = priority
+        self.limiter = get_limiter(f"deployment:{name}", rpm=rpm, tpm=tpm)
+        self.latency: Dict[str, float] = {}  # EWMA seconds per operation ("chat", "embeddings")
+        self.outcomes: deque = deque(maxlen=window)  # True = success
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return get_client_pool().openai(self.endpoint, self.api_key, self.api_version)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def expected_latency(self, operation: str) -> float:
+        with self._lock:
+            return self.latency.get(operation, 0.0)
+
+    def record(self, operation: str, success: bool, seconds: Optional[float] = None,
+               alpha: float = 0.2) -> None:
+        with self._lock:
+            self.outcomes.append(success)
+            if seconds is not None:
+                previous = self.latency.get(operation)
+                self.latency[operation] = seconds if previous is None else (1 - alpha) * previous + alpha * seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "priority": self.priority,
+            "latency": {k: round(v, 3) for k, v in self.latency.items()},
+            "error_rate": round(self.error_rate(), 3),
+            "cooling_down": self.cooldown_until > time.monotonic(),
+            **{k: v for k, v in self.limiter.snapshot().items() if k != "name"},
+        }
+
+
+class OpenAIRouter:
+    """
+    Sends each request to the best healthy deployment serving the requested model.
+
+    Deployments are ranked by (saturated, priority, expected latency × load). A deployment
+    that is throttled (429) or failing is put on cooldown and the request spills over to
+    the next candidate, so aggregate throughput can exceed a single deployment's quota.
+    A request only goes to deployments serving its model; for any other model it raises
+    ValueError (RoutedOpenAI sends those to the single-endpoint client instead).
+    """
+
+    def __init__(self, deployments: List[Deployment], max_error_rate: float = 0.5,
+                 error_cooldown: float = 10.0, max_attempts: int = 6):
+        if not deployments:
+            raise ValueError("OpenAIRouter needs at least one deployment.")
+        self.deployments = deployments
+        self.max_error_rate = max_error_rate
+        self.error_cooldown = error_cooldown
+        self.max_attempts = max_attempts
+
+    def serves(self, model: Optional[str]) -> bool:
+        """True when `model` is None or some deployment serves it (by model, deployment or name)."""
+        return model is None or any(model in (d.model, d.deployment, d.name) for d in self.deployments)
+
+    def _candidates(self, model: Optional[str]) -> List[Deployment]:
+        if model is None:
+            return self.deployments
+        matching = [d for d in self.deployments if model in (d.model, d.deployment, d.name)]
+        if not matching:
+            raise ValueError(f"No deployment in AZURE_OPENAI_DEPLOYMENTS serves model '{model}'.")
+        return matching
+
+    def _rank(self, candidates: List[Deployment], operation: str, estimated_tokens: int) -> List[Deployment]:
+        now = time.monotonic()
+
+        def score(d: Deployment):
+            unhealthy = d.cooldown_until > now or d.error_rate() > self.max_error_rate
+            saturated = d.limiter.saturated(estimated_tokens)
+            load = d.limiter.concurrency.in_flight / max(1.0, d.limiter.concurrency.limit)
+            # Deployments without latency history get a neutral score so they are explored
+            latency = d.expected_latency(operation) or 1.0
+            return (unhealthy, saturated, d.priority, latency * (1.0 + load))
+
+        return sorted(candidates, key=score)
+
+    def _dispatch(self, operation: str, kwargs: Dict[str, Any], estimated_tokens: int) -> Any:
+        model = kwargs.get("model")
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            ranked = self._rank(self._candidates(model), operation, estimated_tokens)
+            for d in ranked:
+                if d.cooldown_until > time.monotonic():
+                    continue
+                call_kwargs = dict(kwargs, model=d.deployment)
+                create = (d.client.chat.completions.create if operation == "chat"
+                          else d.client.embeddings.create)
+                start = time.monotonic()
+                try:
+                    response = d.limiter.call(
+                        lambda: create(**call_kwargs),
+                        estimated_tokens=estimated_tokens,
+                        usage_of=total_tokens_of,
+                        max_retries=0,
+                        transient_retries=0,  # failover to the next deployment is the retry here
+                    )
+                except RateLimitExceeded as e:
+                    # limiter already set its retry-after window; spill over to the next deployment
+                    d.record(operation, success=False)
+                    d.cooldown_until = max(d.cooldown_until, d.limiter.blocked_until)
+                    last_error = e
+                    continue
+                except Exception as e:
+                    code = status_code_of(e)
+                    if code is not None and code < 500 and not is_throttled(e):
+                        raise  # bad request / auth: another deployment won't help
+                    d.record(operation, success=False)
+                    d.cooldown_until = time.monotonic() + self.error_cooldown
+                    last_error = e
+                    continue
+                d.record(operation, success=True, seconds=time.monotonic() - start)
+                return response
+
+            # Every candidate is cooling down: wait for the earliest one to come back
+            wake = min(d.cooldown_until for d in self._candidates(model))
+            time.sleep(max(0.05, min(30.0, wake - time.monotonic())))
+
+        raise RateLimitExceeded(f"No deployment for model '{model}' accepted the request: {last_error}")
+
+    def chat_completion(self, **kwargs) -> Any:
+        estimated = estimate_chat_tokens(kwargs.get("messages", []), kwargs.get("max_tokens") or 0)
+        return self._dispatch("chat", kwargs, estimated)
+
+    def embeddings(self, **kwargs) -> Any:
+        inputs = kwargs.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        return self._dispatch("embeddings", kwargs, sum(estimate_tokens(t) for t in inputs))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [d.snapshot() for d in self.deployments]
+
+
+def _single_endpoint_client(model: Optional[str]):
+    """The pooled AZURE_OPENAI_* client, for models no configured deployment serves."""
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    if not endpoint and not get_client_pool().settings.mock_endpoint:
+        raise ValueError(f"No deployment in AZURE_OPENAI_DEPLOYMENTS serves model '{model}' "
+                         "and AZURE_OPENAI_ENDPOINT is not set.")
+    return get_client_pool().openai(endpoint, os.getenv("AZURE_OPENAI_API_KEY"),
+                                    os.getenv("AZURE_OPENAI_API_VERSION"))
+
+
+class _Completions:
+    def __init__(self, router: OpenAIRouter):
+        self._router = router
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        if not self._router.serves(model):
+            return chat_completion(_single_endpoint_client(model), **kwargs)
+        return self._router.chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, router: OpenAIRouter):
+        self.completions = _Completions(router)
+
+
+class _Embeddings:
+    def __init__(self, router: OpenAIRouter):
+        self._router = router
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        if not self._router.serves(model):
+            return embeddings(_single_endpoint_client(model), model=model, input=kwargs.get("input", []))
+        return self._router.embeddings(**kwargs)
+
+
+class RoutedOpenAI:
+    """
+    Drop-in replacement for an AzureOpenAI client (`.chat.completions.create`,
+    `.embeddings.create`) backed by an OpenAIRouter. Requests for a model none of the
+    deployments serves (typically AZURE_OPENAI_EMBEDDING_MODEL when only chat deployments are
+    configured) go to the pooled AZURE_OPENAI_* client with its own rate limiter, so they
+    never reach, or count against the health of, the chat deployments.
+    """
+
+    # rate_limiter helpers pass calls straight through: limits are applied per deployment
+    handles_rate_limits = True
+
+    def __init__(self, router: OpenAIRouter):
+        self.router = router
+        self.chat = _Chat(router)
+        self.embeddings = _Embeddings(router)
+
+
+def load_deployments() -> List[Deployment]:
+    """
+    Reads deployments from AZURE_OPENAI_DEPLOYMENTS (JSON list). Each entry supports
+    name, endpoint, api_key (or api_key_env), api_version, model, deployment, rpm, tpm, priority.
+    Missing endpoint/key/version fall back to the single-deployment AZURE_OPENAI_* variables.
+    """
+    raw = os.getenv("AZURE_OPENAI_DEPLOYMENTS")
+    if not raw:
+        return []
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"AZURE_OPENAI_DEPLOYMENTS is not valid JSON: {e}")
+
+    deployments = []
+    for i, entry in enumerate(entries):
+        api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", "AZURE_OPENAI_API_KEY"))
+        deployments.append(Deployment(
+            name=entry.get("name", f"deployment_{i}"),
+            endpoint=entry.get("endpoint") or os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=api_key,
+            api_version=entry.get("api_version") or os.getenv("AZURE_OPENAI_API_VERSION"),
+            model=entry.get("model") or os.getenv("AZURE_OPENAI_MODEL"),
+            deployment=entry.get("deployment"),
+            rpm=entry.get("rpm"),
+            tpm=entry.get("tpm"),
+            priority=int(entry.get("priority", 0)),
+        ))
+    return deployments
+
+
+_ROUTER: Optional[OpenAIRouter] = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router() -> Optional[OpenAIRouter]:
+    """Process-wide router, or None when AZURE_OPENAI_DEPLOYMENTS is not configured."""
+    global _ROUTER
+    if _ROUTER is None:
+        with _ROUTER_LOCK:
+            if _ROUTER is None:
+                deployments = load_deployments()
+                if deployments:
+                    _ROUTER = OpenAIRouter(deployments)
+    return _ROUTER
+
+
+def get_openai_client():
+    """
+    The OpenAI client the app should use: a RoutedOpenAI over all configured deployments,
+    or the pooled single-endpoint client when only AZURE_OPENAI_* is set.
+    """
+    router = get_router()
+    if router is not None:
+        return RoutedOpenAI(router)
+    return get_client_pool().openai(
+        os.getenv("AZURE_OPENAI_ENDPOINT"),
+        os.getenv("AZURE_OPENAI_API_KEY"),
+        os.getenv("AZURE_OPENAI_API_VERSION"),
+    )
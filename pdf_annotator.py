@@ -1,9 +1,12 @@
 # services/pdf_annotator.py
-import fitz  # PyMuPDF
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List
 import io
 
-def _norm_polygon_to_rect(polygon: List[float]) -> fitz.Rect:
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+
+def _norm_polygon_to_rect(polygon: List[float]) -> "fitz.Rect":
+    import fitz  # PyMuPDF, imported on first use
     # polygon may be [x1,y1,x2,y2,...] or list of points; take min/max
     xs = polygon[0::2]
     ys = polygon[1::2]
@@ -15,6 +18,7 @@ def annotate_pdf_with_chunks(input_pdf_bytes: bytes, highlights: Dict[int, List[
     """
     highlights: {page_idx: [ {bbox: [x1,y1,...], label: str}, ... ] }
     """
+    import fitz  # PyMuPDF, imported on first use
     doc = fitz.open(stream=input_pdf_bytes, filetype="pdf")
     for page_idx, items in highlights.items():
         if page_idx < 0 or page_idx >= doc.page_count:
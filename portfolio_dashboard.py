@@ -0,0 +1,67 @@
+# ui/portfolio_dashboard.py
+import time
+
+import streamlit as st
+
+from results_store import ResultsStore
+
+STATUSES = ["Correct", "Mismatch", "Missing", "N/A"]
+
+
+def render_portfolio_dashboard(store: ResultsStore) -> None:
+    """Portfolio view over every stored validation: filters, counts by supplier/item and raw rows."""
+    import pandas as pd  # loaded when the dashboard is first opened, not at app start
+    st.subheader("📈 Portfolio Dashboard")
+
+    totals = store.totals()
+    if not totals.get("runs"):
+        st.info("No validations stored yet. Analyze a document to populate the portfolio.")
+        return
+
+    statuses = totals.get("statuses", {})
+    rows_total = sum(statuses.values()) or 1
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Documents", totals["documents"])
+    with col2:
+        st.metric("Validation Runs", totals["runs"])
+    with col3:
+        st.metric("Mismatch Rate", f"{statuses.get('Mismatch', 0) / rows_total:.1%}")
+    with col4:
+        st.metric("Missing Rate", f"{statuses.get('Missing', 0) / rows_total:.1%}")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        status = st.multiselect("Status", options=STATUSES, default=["Mismatch"], key="pf_status")
+    with col2:
+        section = st.multiselect("Section", options=store.distinct("section"), key="pf_section")
+    with col3:
+        supplier = st.multiselect("Supplier", options=store.distinct("supplier"), key="pf_supplier")
+    filters = {"status": status, "section": section, "supplier": supplier}
+
+    start = time.perf_counter()
+    by_supplier = store.summary(["supplier", "section"], **filters)
+    by_item = store.summary(["validation_item", "status"], **filters)
+    rows = store.query(limit=500, **filters)
+    st.caption(f"Queried in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    tab1, tab2, tab3 = st.tabs(["By Supplier", "By Item", "Rows"])
+    with tab1:
+        if by_supplier:
+            pivot = (pd.DataFrame(by_supplier)
+                     .pivot_table(index="supplier", columns="section", values="rows", fill_value=0, aggfunc="sum"))
+            st.dataframe(pivot, use_container_width=True)
+        else:
+            st.write("No matching rows.")
+    with tab2:
+        st.dataframe(pd.DataFrame(by_item), use_container_width=True, hide_index=True)
+    with tab3:
+        df = pd.DataFrame(rows)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        if not df.empty:
+            st.download_button(
+                "⬇️ Download Rows (CSV)",
+                data=df.to_csv(index=False).encode("utf-8"),
+                file_name="portfolio_rows.csv",
+                mime="text/csv"
+            )
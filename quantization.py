@@ -0,0 +1,135 @@
+# services/quantization.py
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported on first use, not at app start (see README "Cold Start")
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# rerank files this process created: the only ones appended to in place or pruned
+_CREATED: Set[str] = set()
+_FILES_LOCK = threading.Lock()
+_COPY_BYTES = 1 << 24
+
+
+def quantize(vectors: "np.ndarray", dtype: str) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Unit vectors -> (codes, per-row scales). int8 uses symmetric per-vector scaling
+    (code = round(x / scale), scale = max|x| / 127); float types store the values directly.
+    """
+    import numpy as np
+    if dtype != "int8":
+        return vectors.astype(dtype), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _prune_rerank_files() -> None:
+    cutoff = time.time() - float(os.getenv("ARTIFACT_SESSION_TTL", "7200"))
+    for path in list(_CREATED):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                _CREATED.discard(path)
+        except OSError:
+            _CREATED.discard(path)
+
+
+def _copy_prefix(source: Optional[str], target: str, nbytes: int) -> None:
+    with open(target, "wb") as out:
+        if not nbytes:
+            return
+        with open(source, "rb") as f:
+            while nbytes:
+                chunk = f.read(min(nbytes, _COPY_BYTES))
+                if not chunk:
+                    break
+                out.write(chunk)
+                nbytes -= len(chunk)
+
+
+class RerankFile:
+    """
+    The float32 originals of a quantized vector store, one row per stored vector in insertion
+    order, kept in a file under `directory` and read back by row through a memory map.
+
+    A file is appended to in place only by the process that created it, and only while it ends
+    at this copy's last row. An unpickled or loaded copy, or a second copy whose file has since
+    grown, first copies its own rows to a new file. Files this process created are removed once
+    untouched for longer than ARTIFACT_SESSION_TTL; files of other processes and saved indexes
+    are never pruned. If the file is gone, `read` returns None (quantized scores only).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self.rows = 0
+        self.dim: Optional[int] = None
+        self._map: Optional["np.ndarray"] = None  # reopened as the file grows
+
+    def _nbytes(self, rows: int) -> int:
+        return rows * (self.dim or 0) * 4
+
+    def _has_rows(self, path: Optional[str]) -> bool:
+        return bool(path) and os.path.exists(path) and os.path.getsize(path) >= self._nbytes(self.rows)
+
+    def _writable_path(self) -> Optional[str]:
+        """A file ending at row `rows` that may be appended to; None once earlier rows are lost."""
+        if self.path in _CREATED and self._has_rows(self.path) \
+                and os.path.getsize(self.path) == self._nbytes(self.rows):
+            return self.path
+        if self.rows and not self._has_rows(self.path):
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        _prune_rerank_files()
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.f32")
+        _copy_prefix(self.path, path, self._nbytes(self.rows))
+        _CREATED.add(path)
+        return path
+
+    def append(self, vectors: "np.ndarray") -> None:
+        self.dim = self.dim or vectors.shape[1]
+        with _FILES_LOCK:
+            self.path = self._writable_path() if (self.path or not self.rows) else None
+            if self.path:
+                with open(self.path, "ab") as f:
+                    f.write(vectors.astype("<f4").tobytes())
+        self.rows += len(vectors)
+        self._map = None
+
+    def read(self, rows: "np.ndarray") -> Optional["np.ndarray"]:
+        """The originals of `rows` (sorted row numbers read best), or None without a file."""
+        import numpy as np
+        if not self._has_rows(self.path) or not self.rows:
+            return None
+        os.utime(self.path)  # in use: keep it from being pruned
+        if self._map is None:
+            self._map = np.memmap(self.path, dtype="<f4", mode="r", shape=(self.rows, self.dim))
+        return np.asarray(self._map[rows])
+
+    def save(self, path: str) -> bool:
+        """Copy the originals to `path` (next to a saved index). False without a file."""
+        with _FILES_LOCK:
+            if not self.rows or not self._has_rows(self.path):
+                return False
+            _copy_prefix(self.path, path, self._nbytes(self.rows))
+        return True
+
+    def attach(self, path: str) -> None:
+        """Read the originals from `path`, written by `save`; later appends go to a new file."""
+        if self._has_rows(path):
+            self.path = path
+            self._map = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_map"] = None
+        return state
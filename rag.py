@@ -1,26 +1,85 @@
 # services/rag.py
 import os
+import pickle
 import time
-import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
+
+from ann_index import IVFFlatIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from rate_limiter import embeddings
+from telemetry import span
+from vector_store import EmbeddingMatrix
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported on first use, not at app start (see README "Cold Start")
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+VECTOR_INDEXES = ("exact", "ivf")
+
+
+class Chunk:
+    """
+    One indexed chunk. A __slots__ record instead of a dict (no per-chunk __dict__); the
+    embedding lives in the shared vector store. Supports chunk["text"] like the old dicts.
+    """
+    __slots__ = ("id", "text", "start", "end", "meta")
+
+    def __init__(self, id: str, text: str, start: int, end: int, meta: Dict[str, Any]):
+        self.id = id
+        self.text = text
+        self.start = start
+        self.end = end
+        self.meta = meta
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
 
-# Utility: cosine similarity
-def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
-    if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
-        return 0.0
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
 class SimpleRAG:
     """
     Lightweight RAG: chunk text, create embeddings via AzureOpenAI client, store in-memory,
-    and retrieve top_k relevant chunks by cosine similarity.
+    and retrieve top_k relevant chunks.
+
+    A BM25 inverted index over the same chunks is built alongside the embeddings. `mode`
+    (RAG_RETRIEVAL_MODE) selects how chunks are ranked: "hybrid" fuses the BM25 and cosine
+    rankings, "vector" uses embeddings only, "lexical" uses BM25 only and makes no embedding
+    call at build or query time. If the embedding deployment fails (e.g. throttled), hybrid
+    retrieval falls back to BM25 and the error is kept in `embedding_error`.
+
+    Embeddings are kept in one vector store, not per chunk: by default an EmbeddingMatrix
+    (contiguous, quantized to RAG_EMBEDDING_DTYPE, exact re-rank of the candidates, see
+    vector_store). `vector_index` (RAG_VECTOR_INDEX) "ivf" ranks them with an IVF-flat
+    approximate index (see ann_index, quantized the same way) instead of scanning every
+    chunk; use it for archive-scale indexes grown with `add_text` and persisted with `save` /
+    `load`.
     """
 
-    def __init__(self, openai_client, embedding_model: str | None = None):
+    def __init__(self, openai_client, embedding_model: str | None = None, mode: Optional[str] = None,
+                 vector_index: Optional[str] = None):
         self.client = openai_client
         self.model = embedding_model or os.getenv("AZURE_OPENAI_EMBEDDING_MODEL") or os.getenv("AZURE_OPENAI_MODEL")
-        # index: list of dicts {embedding: np.array, text: str, meta: {...}}
-        self.index: List[Dict[str, Any]] = []
+        self.mode = mode or os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {self.mode!r}; expected one of {RETRIEVAL_MODES}")
+        # index: Chunk records; position i is id i in the vector store
+        self.index: List[Chunk] = []
+        self.lexical = BM25Index()
+        self.vector_index = vector_index or os.getenv("RAG_VECTOR_INDEX", "exact").lower()
+        if self.vector_index not in VECTOR_INDEXES:
+            raise ValueError(f"Unknown vector index {self.vector_index!r}; expected one of {VECTOR_INDEXES}")
+        self.vectors = self._new_vector_store()
+        self.embedding_error: Optional[str] = None
+
+    def _new_vector_store(self):
+        return IVFFlatIndex() if self.vector_index == "ivf" else EmbeddingMatrix()
 
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
         """
@@ -42,17 +101,17 @@ class SimpleRAG:
             start = end - overlap
         return chunks
 
-    def embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+    def embed_texts(self, texts: List[str]) -> List["np.ndarray"]:
         """
         Use AzureOpenAI embedding endpoint to create embeddings for a list of texts.
         This function assumes the client has `embeddings.create` method similar to OpenAI SDK.
         """
         # Some Azure wrappers require a different call signature; adapt if needed.
         # Attempt to call client.embeddings.create with model and input
+        import numpy as np
         try:
-            resp = self.client.embeddings.create(model=self.model, input=texts)
-            embeddings = [np.array(item.embedding, dtype=np.float32) for item in resp.data]
-            return embeddings
+            resp = embeddings(self.client, model=self.model, input=texts)
+            return [np.array(item.embedding, dtype=np.float32) for item in resp.data]
         except Exception as e:
             # try alternative path (older SDKs)
             # fallback: call as attribute
@@ -64,38 +123,99 @@ class SimpleRAG:
         doc_meta: optional metadata (filename, pages, etc.)
         """
         self.index = []
-        chunks = self.chunk_text(doc_text, chunk_size=chunk_size, overlap=overlap)
+        self.lexical = BM25Index()
+        self.vectors = self._new_vector_store()
+        self.embedding_error = None
+        self.add_text(doc_text, doc_meta, chunk_size=chunk_size, overlap=overlap)
+
+    def add_text(self, doc_text: str, doc_meta: Dict[str, Any] = None, chunk_size: int = 1000, overlap: int = 200):
+        """
+        Chunk `doc_text` and append it to the index (e.g. one more contract of the archive).
+        Chunk ids continue the numbering of the chunks already indexed.
+        """
+        offset = len(self.index)
+        with span("rag.chunk"):
+            chunks = self.chunk_text(doc_text, chunk_size=chunk_size, overlap=overlap)
         texts = [c["text"] for c in chunks]
+        with span("rag.lexical_index", **{"rag.chunks": len(texts)}):
+            self.lexical.add(texts)
         if not texts:
             return
-        embeddings = self.embed_texts(texts)
-        for c, emb in zip(chunks, embeddings):
-            entry = {
-                "id": c["id"],
-                "text": c["text"],
-                "start": c["start"],
-                "end": c["end"],
-                "embedding": emb,
-                "meta": doc_meta or {}
-            }
-            self.index.append(entry)
-
-    def retrieve(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        embeddings: List[Any] = [None] * len(texts)
+        if self.mode != "lexical":
+            try:
+                embeddings = self.embed_texts(texts)
+            except RuntimeError as e:
+                if self.mode == "vector":
+                    raise
+                self.embedding_error = str(e)
+        meta = doc_meta or {}
+        for i, c in enumerate(chunks):
+            self.index.append(Chunk(f"chunk_{offset + i}", c["text"], c["start"], c["end"], meta))
+        if embeddings[0] is not None:
+            import numpy as np
+            with span("rag.vector_insert", **{"rag.chunks": len(embeddings), "rag.vector_index": self.vector_index}):
+                self.vectors.add(np.stack(embeddings), np.arange(offset, offset + len(embeddings)))
+
+    def _vector_ranking(self, query: str, limit: int, query_embedding: Optional["np.ndarray"] = None) -> List[int]:
+        q_emb = query_embedding if query_embedding is not None else self.embed_texts([query])[0]
+        return [i for i, _ in self.vectors.search(q_emb, limit)]
+
+    def retrieve(self, query: str, top_k: int = 3, mode: Optional[str] = None,
+                 query_embedding: Optional["np.ndarray"] = None) -> List[Chunk]:
         """
-        Returns top_k index entries most similar to query.
+        Returns top_k index entries most relevant to query, ranked by `mode` (defaults to the
+        index's mode). `query_embedding` reuses an embedding the caller already has.
         """
         if not self.index:
             return []
-        # create embedding for query
-        q_emb = self.embed_texts([query])[0]
-        # compute similarities
-        sims = []
-        for entry in self.index:
-            sim = _cosine_sim(q_emb, entry["embedding"])
-            sims.append((sim, entry))
-        sims.sort(key=lambda x: x[0], reverse=True)
-        top = [entry for _, entry in sims[:top_k]]
-        return top
+        mode = mode or self.mode
+        if mode != "lexical" and not len(self.vectors):
+            # no chunk embeddings (lexical-only index, or the deployment failed at build time)
+            mode = "lexical"
+        # rank fusion only needs the head of each ranking
+        limit = max(top_k * 10, 100)
+        with span("rag.retrieve", **{"rag.index_size": len(self.index), "rag.top_k": top_k, "rag.mode": mode,
+                                     "rag.vector_index": self.vector_index}):
+            lexical = [i for i, _ in self.lexical.search(query, limit)] if mode != "vector" else []
+            if mode == "lexical":
+                return [self.index[i] for i in lexical[:top_k]]
+            try:
+                vector = self._vector_ranking(query, limit, query_embedding)
+            except RuntimeError:
+                if mode == "vector" or not lexical:
+                    raise
+                return [self.index[i] for i in lexical[:top_k]]
+            if mode == "vector":
+                return [self.index[i] for i in vector[:top_k]]
+            fused = reciprocal_rank_fusion([lexical, vector])
+            return [self.index[i] for i, _ in fused[:top_k]]
 
     def index_size(self) -> int:
         return len(self.index)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The client holds open connections; a spilled index is re-bound with `rag.client = ...`
+        return {k: v for k, v in self.__dict__.items() if k != "client"}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.client = None
+
+    def save(self, path: str) -> None:
+        """
+        Persist the index (chunks, embeddings, BM25 and ANN state) without the client. The
+        float32 re-rank originals are copied next to it (`path` + ".f32").
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.vectors.save_originals(path + ".f32")
+
+    @classmethod
+    def load(cls, path: str, openai_client) -> "SimpleRAG":
+        with open(path, "rb") as f:
+            rag = pickle.load(f)
+        rag.client = openai_client
+        rag.vectors.attach_originals(path + ".f32")
+        return rag
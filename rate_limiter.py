@@ -0,0 +1,447 @@
+# services/rate_limiter.py
+import functools
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from telemetry import METRICS, span
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call is still throttled (429) after all retries."""
+
+
+# ---------------------------------------------------------------------------
+# Token estimation
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def _encoder():
+    """The o200k_base tiktoken encoding, or None without tiktoken (or offline); resolved once."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for `text`. Uses tiktoken when installed, otherwise ~4 chars/token.
+    """
+    if not text:
+        return 0
+    encoder = _encoder()
+    if encoder is not None:
+        try:
+            return len(encoder.encode(text))
+        except Exception:
+            pass
+    return max(1, len(text) // 4)
+
+
+def estimate_chat_tokens(messages: List[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """
+    Tokens a chat call will be charged against the TPM quota before it runs:
+    prompt tokens plus the requested completion budget (Azure reserves max_tokens).
+    """
+    prompt = sum(estimate_tokens(str(m.get("content", ""))) + 4 for m in messages)
+    return prompt + (max_tokens or 0)
+
+
+# ---------------------------------------------------------------------------
+# Building blocks
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute` units per minute.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take `amount` units if available and return 0, otherwise return seconds to wait.
+        Requests larger than the bucket are clamped so they can eventually pass.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def refund(self, amount: float) -> None:
+        """Return units that were reserved but not used (estimate > actual usage)."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit: +1 slot per window of successful calls,
+    halved on every throttling response.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32,
+                 decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, throttled: bool = False, succeeded: bool = True) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+# ---------------------------------------------------------------------------
+# 429 handling
+# ---------------------------------------------------------------------------
+
+def status_code_of(exc: Exception) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def is_throttled(exc: Exception) -> bool:
+    """True for 429 responses from either the OpenAI SDK or azure-core."""
+    return status_code_of(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+_TRANSIENT_ERRORS = ("APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceRequestError",
+                     "ServiceResponseError", "ConnectError", "ReadTimeout", "RemoteProtocolError")
+
+
+def is_transient(exc: Exception) -> bool:
+    """True for 5xx responses, timeouts and dropped connections: worth retrying as-is."""
+    code = status_code_of(exc)
+    if code is not None:
+        return code >= 500 or code == 408
+    return isinstance(exc, (ConnectionError, TimeoutError)) or type(exc).__name__ in _TRANSIENT_ERRORS
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """
+    Read `retry-after-ms` / `retry-after` from a throttling error's response headers.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Per-deployment limiter
+# ---------------------------------------------------------------------------
+
+class DeploymentLimiter:
+    """
+    Quota-aware limiter for one deployment (or DI resource): RPM and TPM token buckets,
+    AIMD concurrency, and a shared back-off window set from `retry-after`.
+    """
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_concurrency: int = 32, initial_concurrency: int = 4, max_retries: int = 5,
+                 transient_retries: int = 3):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveConcurrency(initial=min(initial_concurrency, max_concurrency),
+                                               maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self.blocked_until = 0.0
+        self.stats = {"calls": 0, "throttled": 0, "retried": 0, "waited_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def _wait_for_quota(self, estimated_tokens: int) -> None:
+        while True:
+            delay = self.blocked_until - time.monotonic()
+            if delay <= 0 and self.requests is not None:
+                delay = self.requests.try_acquire(1)
+            if delay <= 0 and self.tokens is not None and estimated_tokens:
+                delay = self.tokens.try_acquire(estimated_tokens)
+                if delay > 0 and self.requests is not None:
+                    self.requests.refund(1)
+            if delay <= 0:
+                return
+            with self._lock:
+                self.stats["waited_seconds"] += delay
+            time.sleep(delay)
+
+    def saturated(self, estimated_tokens: int = 0) -> bool:
+        """
+        True if a call right now would have to wait: inside a retry-after window,
+        out of request/token budget, or at the concurrency limit.
+        """
+        if self.blocked_until > time.monotonic():
+            return True
+        if self.requests is not None and self.requests.available() < 1:
+            return True
+        if self.tokens is not None and self.tokens.available() < min(estimated_tokens, self.tokens.capacity):
+            return True
+        return self.concurrency.in_flight >= int(self.concurrency.limit)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Give back reserved TPM that the call did not actually consume."""
+        if self.tokens is not None and actual_tokens is not None and actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0,
+             usage_of: Optional[Callable[[Any], Optional[int]]] = None,
+             max_retries: Optional[int] = None, transient_retries: Optional[int] = None) -> Any:
+        """
+        Run `fn()` within quota. Retries 429s after `retry-after` (or exponential back-off)
+        and shrinks the concurrency window so the deployment stays just under its limit.
+        5xx responses, timeouts and connection errors are retried up to `transient_retries`
+        times with jittered exponential back-off (the SDKs' own retries are off).
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        transient_retries = self.transient_retries if transient_retries is None else transient_retries
+        attempt = 0
+        failures = 0
+        delay = 0.0
+        while True:
+            if delay:
+                time.sleep(delay)
+                delay = 0.0
+            self._wait_for_quota(estimated_tokens)
+            self.concurrency.acquire()
+            throttled = False
+            succeeded = False
+            try:
+                result = fn()
+                succeeded = True
+            except Exception as e:
+                if is_transient(e) and failures < transient_retries:
+                    with self._lock:
+                        self.stats["retried"] += 1
+                    delay = min(8.0, 0.5 * 2 ** failures) * (0.5 + random.random())
+                    failures += 1
+                    continue
+                if not is_throttled(e):
+                    raise
+                throttled = True
+                with self._lock:
+                    self.stats["throttled"] += 1
+                wait = retry_after_seconds(e)
+                if wait is None:
+                    wait = min(60.0, (2 ** attempt) + random.random())
+                with self._lock:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+                if attempt >= max_retries:
+                    raise RateLimitExceeded(f"{self.name}: still throttled after {attempt + 1} attempts") from e
+                attempt += 1
+                continue
+            finally:
+                self.concurrency.release(throttled=throttled, succeeded=succeeded)
+
+            with self._lock:
+                self.stats["calls"] += 1
+            if usage_of is not None:
+                try:
+                    self.record_usage(estimated_tokens, usage_of(result))
+                except Exception:
+                    pass
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            **self.stats,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Process-wide registry
+# ---------------------------------------------------------------------------
+
+def _float_env(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+_LIMITERS: Dict[str, DeploymentLimiter] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_limiter(name: str, rpm: Optional[float] = None, tpm: Optional[float] = None) -> DeploymentLimiter:
+    """
+    Returns the shared limiter for `name`, creating it on first use.
+
+    Quotas are looked up in AZURE_RATE_LIMITS (JSON: {"<name>": {"rpm": .., "tpm": ..}}),
+    then in the explicit arguments.
+    """
+    with _REGISTRY_LOCK:
+        if name not in _LIMITERS:
+            overrides = {}
+            try:
+                overrides = json.loads(os.getenv("AZURE_RATE_LIMITS", "{}")).get(name, {})
+            except ValueError:
+                pass
+            _LIMITERS[name] = DeploymentLimiter(
+                name,
+                rpm=overrides.get("rpm", rpm),
+                tpm=overrides.get("tpm", tpm),
+                max_concurrency=int(overrides.get("max_concurrency", os.getenv("AZURE_MAX_CONCURRENCY", 32))),
+                transient_retries=int(os.getenv("AZURE_TRANSIENT_RETRIES", "3")),
+            )
+        return _LIMITERS[name]
+
+
+def openai_limiter(model: Optional[str]) -> DeploymentLimiter:
+    return get_limiter(f"openai:{model}", rpm=_float_env("AZURE_OPENAI_RPM"), tpm=_float_env("AZURE_OPENAI_TPM"))
+
+
+def document_intelligence_limiter() -> DeploymentLimiter:
+    # Default DI S0 quota is 15 analyze requests per second
+    return get_limiter("document_intelligence", rpm=_float_env("AZURE_DI_RPM") or 900)
+
+
+def limiter_snapshots() -> List[Dict[str, Any]]:
+    with _REGISTRY_LOCK:
+        return [limiter.snapshot() for limiter in _LIMITERS.values()]
+
+
+# ---------------------------------------------------------------------------
+# Call-site helpers
+# ---------------------------------------------------------------------------
+
+def total_tokens_of(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def chat_completion(client, **kwargs) -> Any:
+    """
+    Rate-limited `client.chat.completions.create(**kwargs)`.
+    """
+    with span("llm.request", **{"llm.model": kwargs.get("model")}) as s:
+        if getattr(client, "handles_rate_limits", False):
+            response = client.chat.completions.create(**kwargs)
+        else:
+            estimated = estimate_chat_tokens(kwargs.get("messages", []), kwargs.get("max_tokens") or 0)
+            response = openai_limiter(kwargs.get("model")).call(
+                lambda: client.chat.completions.create(**kwargs),
+                estimated_tokens=estimated,
+                usage_of=total_tokens_of,
+            )
+        s.set_attribute("llm.total_tokens", total_tokens_of(response))
+        return response
+
+
+def stream_chat_completion(client, usage: Optional[Dict[str, int]] = None, **kwargs) -> Iterator[str]:
+    """
+    Rate-limited streaming chat completion: yields the answer text as it arrives.
+
+    Quota and retries apply to opening the stream (that is when a 429 is returned). The time
+    to the first token is recorded in METRICS as "llm.first_token". If `usage` is given it is
+    filled from the final usage chunk. Clients that do not stream (replay fixtures, mocks)
+    return a whole completion, which is yielded in one piece.
+    """
+    def record_usage(part: Any) -> None:
+        if usage is not None and getattr(part, "usage", None) is not None:
+            usage.update({k: int(getattr(part.usage, k, 0) or 0)
+                          for k in ("prompt_tokens", "completion_tokens", "total_tokens")})
+
+    start = time.perf_counter()
+    response = chat_completion(client, stream=True, stream_options={"include_usage": True}, **kwargs)
+    if hasattr(response, "choices"):
+        METRICS.observe("llm.first_token", time.perf_counter() - start)
+        record_usage(response)
+        yield response.choices[0].message.content or ""
+        return
+    first = True
+    for chunk in response:
+        record_usage(chunk)
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            if first:
+                METRICS.observe("llm.first_token", time.perf_counter() - start)
+                first = False
+            yield text
+
+
+def embeddings(client, model: str, input: List[str]) -> Any:
+    """
+    Rate-limited `client.embeddings.create(model=..., input=...)`.
+    """
+    with span("rag.embed", **{"llm.model": model, "rag.inputs": len(input)}):
+        if getattr(client, "handles_rate_limits", False):
+            return client.embeddings.create(model=model, input=input)
+        estimated = sum(estimate_tokens(t) for t in input)
+        return openai_limiter(model).call(
+            lambda: client.embeddings.create(model=model, input=input),
+            estimated_tokens=estimated,
+            usage_of=total_tokens_of,
+        )
+
+
+def analyze_document(doc_client, **kwargs) -> Any:
+    """
+    Rate-limited `doc_client.begin_analyze_document(**kwargs).result()`.
+    The concurrency slot is held until the long-running operation completes.
+    """
+    def run():
+        with span("di.submit", **{"di.model_id": kwargs.get("model_id")}):
+            poller = doc_client.begin_analyze_document(**kwargs)
+        with span("di.poll", **{"di.model_id": kwargs.get("model_id")}):
+            return poller.result()
+
+    # azure-core's retry policy already covers 5xx and connection errors for DI
+    return document_intelligence_limiter().call(run, transient_retries=0)
@@ -0,0 +1,384 @@
+# services/rate_table.py
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# pandas/numpy are imported on first use, not at app start (see README "Cold Start")
+
+# Document Intelligence prebuilt-layout tables -> the `rate_table` shape shown under
+# Remuneration Details: {"headers": [...], "rows": [[...], ...], "currency", "source"}.
+# The table is read from the layout instead of being transcribed by the LLM.
+
+_HEADING_RE = re.compile(r"^\s*(?:\d+(?:\.\d+)*\.?\s*)?(?:remuneration|verg[üu]tung)\b", re.IGNORECASE)
+_HEADING_LINE_RE = re.compile(_HEADING_RE.pattern, re.IGNORECASE | re.MULTILINE)
+_MENTION_RE = re.compile(r"\b(?:remuneration|verg[üu]tung)\b", re.IGNORECASE)
+_HEADING_ROLES = ("sectionHeading", "title")
+# prebuilt-layout selection marks inside cell content
+_SELECTION_RE = re.compile(r":(?:un)?selected:")
+
+# Canonical column names (the headers the remuneration rules refer to) and their spellings
+HEADER_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "Service": ("service", "services", "description", "role", "profile", "leistung", "leistungen", "bezeichnung"),
+    "Amount": ("amount", "quantity", "qty", "number", "days", "hours", "menge", "anzahl"),
+    "Unit": ("unit", "einheit"),
+    "Price per unit": ("price per unit", "unit price", "rate", "daily rate", "hourly rate", "price",
+                       "preis pro einheit", "einzelpreis", "stundensatz", "tagessatz", "preis"),
+    "Total net": ("total net", "total", "net total", "total (net)", "gesamt netto", "gesamtpreis netto",
+                  "netto", "summe netto", "gesamt"),
+    "Total brutto": ("total brutto", "total gross", "gross total", "total (gross)", "gesamt brutto",
+                     "gesamtpreis brutto", "brutto", "summe brutto"),
+}
+_HEADER_LOOKUP = {spelling: name for name, spellings in HEADER_SYNONYMS.items() for spelling in spellings}
+
+CURRENCY_SYMBOLS = {"€": "EUR", "$": "USD", "£": "GBP", "chf": "CHF", "eur": "EUR", "usd": "USD", "gbp": "GBP"}
+_CURRENCY_RE = re.compile(r"€|\$|£|\b(?:EUR|USD|GBP|CHF)\b", re.IGNORECASE)
+_AMOUNT_RE = re.compile(r"^[+-]?(?:\d{1,3}(?:[.,'\s]\d{3})+|\d+)(?:[.,]\d+)?$")
+# rows that sum up the table ("Total", "Summe", "Gesamt") rather than price a service
+_SUMMARY_RE = re.compile(r"^\s*(?:total|sum|summe|gesamt|zwischensumme|subtotal)\b", re.IGNORECASE)
+
+
+def _parse(text: str) -> Optional[Tuple[float, bool]]:
+    """(value, has decimal part) of a plain amount, or None."""
+    value = _CURRENCY_RE.sub("", str(text or "")).replace("\u00a0", " ").replace("\u202f", " ").strip()
+    value = value.rstrip(",.-–").strip()  # "100,-" / "100.–"
+    if not value or not _AMOUNT_RE.match(value):
+        return None
+    sign = -1.0 if value.startswith("-") else 1.0
+    value = re.sub(r"['\s]", "", value.lstrip("+-"))
+    if "." in value and "," in value:
+        decimal = max(value.rfind("."), value.rfind(","))
+    elif "." in value or "," in value:
+        separator = "." if "." in value else ","
+        groups = value.split(separator)
+        # one separator followed by anything but exactly three digits is a decimal point
+        decimal = value.rfind(separator) if len(groups) == 2 and len(groups[1]) != 3 else None
+    else:
+        decimal = None
+    integer, fraction = (value[:decimal], value[decimal + 1:]) if decimal is not None else (value, "")
+    return sign * float(f"{re.sub(r'[^0-9]', '', integer) or '0'}.{fraction or '0'}"), decimal is not None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Locale-aware number: "1.234,56", "1,234.56", "1 234,56", "1'234.56", "1234,5", "100,-" and
+    "12.50 €" all parse. With both "." and "," the later one is the decimal point; a single
+    separator followed by exactly three digits groups thousands ("1.000" is 1000).
+    Returns None for anything that is not a plain (currency) amount.
+    """
+    parsed = _parse(text)
+    return parsed[0] if parsed else None
+
+
+def normalize_header(text: str) -> str:
+    cleaned = re.sub(r"\s+", " ", _SELECTION_RE.sub("", text or "")).strip(" :*")
+    key = _CURRENCY_RE.sub("", cleaned.lower()).replace("(", " (").strip(" ()")
+    key = re.sub(r"\s+", " ", key)
+    return _HEADER_LOOKUP.get(key, cleaned)
+
+
+def normalize_cell(text: str) -> Tuple[str, Optional[str]]:
+    """Cell text with layout noise removed, amounts in plain form ("1234.56"); also its currency."""
+    cleaned = re.sub(r"\s+", " ", _SELECTION_RE.sub("", text or "")).strip()
+    currency_match = _CURRENCY_RE.search(cleaned)
+    currency = CURRENCY_SYMBOLS.get(currency_match.group().lower()) if currency_match else None
+    parsed = _parse(cleaned)
+    if parsed is None:
+        return cleaned, None
+    amount, has_decimals = parsed
+    return (f"{amount:.2f}" if has_decimals else str(int(amount))), currency
+
+
+def _offset(item: Dict[str, Any]) -> int:
+    spans = item.get("spans") or []
+    return spans[0].get("offset", 0) if spans else 0
+
+
+def _page(item: Dict[str, Any]) -> int:
+    regions = item.get("boundingRegions") or []
+    return regions[0].get("pageNumber", 0) if regions else 0
+
+
+def find_section(layout: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    Character range of the Remuneration section in the layout content: from its heading (a
+    section heading paragraph, else a line starting with the word) to the next heading.
+    """
+    paragraphs = layout.get("paragraphs") or []
+    headings = [p for p in paragraphs if p.get("role") in _HEADING_ROLES]
+    content = layout.get("content") or ""
+    start = next((_offset(p) for p in headings if _HEADING_RE.match(p.get("content", ""))), None)
+    if start is None:
+        start = next((_offset(p) for p in headings if _MENTION_RE.search(p.get("content", ""))), None)
+    if start is None:
+        start = next((_offset(p) for p in paragraphs if _HEADING_RE.match(p.get("content", ""))), None)
+    if start is None:
+        match = _HEADING_LINE_RE.search(content)
+        if match is None:
+            return None
+        start = match.start()
+    end = min((_offset(p) for p in headings if _offset(p) > start), default=max(len(content), start + 1))
+    return start, end
+
+
+def _grid(table: Dict[str, Any]) -> Tuple[List[List[str]], int]:
+    """Cell contents on a row x column grid (spanned headers repeated) and the header row count."""
+    rows, cols = table.get("rowCount", 0), table.get("columnCount", 0)
+    grid = [["" for _ in range(cols)] for _ in range(rows)]
+    header_rows = 0
+    for cell in table.get("cells") or []:
+        r, c = cell.get("rowIndex", 0), cell.get("columnIndex", 0)
+        header = cell.get("kind") == "columnHeader"
+        if header:
+            header_rows = max(header_rows, r + cell.get("rowSpan", 1))
+        for dr in range(cell.get("rowSpan", 1)):
+            for dc in range(cell.get("columnSpan", 1)):
+                if r + dr < rows and c + dc < cols and (header or (dr == 0 and dc == 0)):
+                    grid[r + dr][c + dc] = cell.get("content", "")
+    return grid, header_rows
+
+
+def _score(headers: List[str]) -> int:
+    return sum(h in HEADER_SYNONYMS for h in headers)
+
+
+def _headers(grid: List[List[str]], header_rows: int) -> List[str]:
+    header_rows = header_rows or 1
+    columns = zip(*grid[:header_rows]) if grid else []
+    names = []
+    for parts in columns:
+        unique = [p for i, p in enumerate(parts) if p and p not in parts[:i]]
+        names.append(normalize_header(" ".join(unique)))
+    return names
+
+
+def extract_rate_table(layout: Dict[str, Any], max_pages: int = 2) -> Optional[Dict[str, Any]]:
+    """
+    The remuneration rate table from a prebuilt-layout result (`AnalyzeResult.as_dict()`):
+    the best-matching table inside the Remuneration section (or within `max_pages` pages after
+    its heading), continued across page breaks when the next table has the same columns.
+    Headers are mapped to canonical names, amounts normalized and empty rows dropped.
+    Returns None when the layout has no such table.
+    """
+    tables = layout.get("tables") or []
+    section = find_section(layout)
+    if not tables or section is None:
+        return None
+    start, end = section
+    heading_page = next((_page(p) for p in layout.get("paragraphs") or [] if _offset(p) >= start), 0)
+
+    candidates = [(i, t) for i, t in enumerate(tables) if start <= _offset(t) < end]
+    if not candidates:
+        candidates = [(i, t) for i, t in enumerate(tables)
+                      if _offset(t) >= start and (not heading_page or _page(t) - heading_page <= max_pages)]
+    if not candidates:
+        return None
+
+    parsed = []
+    for i, table in candidates:
+        grid, header_rows = _grid(table)
+        parsed.append((i, table, grid, header_rows, _headers(grid, header_rows)))
+    best = max(range(len(parsed)), key=lambda k: (_score(parsed[k][4]), -k))
+    index, table, grid, header_rows, headers = parsed[best]
+
+    body = grid[header_rows or 1:]
+    # a table split by a page break continues in the next table with the same columns
+    for i, nxt, nxt_grid, nxt_header_rows, nxt_headers in parsed[best + 1:]:
+        if nxt.get("columnCount") != table.get("columnCount") or _page(nxt) - _page(table) > max_pages:
+            break
+        repeated = nxt_header_rows or (nxt_headers == headers)
+        body += nxt_grid[(nxt_header_rows or 1) if repeated else 0:]
+
+    rows, currencies = [], []
+    for raw in body:
+        cells = []
+        for text in raw:
+            value, currency = normalize_cell(text)
+            cells.append(value)
+            if currency:
+                currencies.append(currency)
+        if any(cells):
+            rows.append(cells)
+    currency = max(set(currencies), key=currencies.count) if currencies else None
+    if currency is None:
+        header_currency = _CURRENCY_RE.search(" ".join(" ".join(r) for r in grid[:header_rows or 1]))
+        currency = CURRENCY_SYMBOLS.get(header_currency.group().lower()) if header_currency else None
+
+    return {
+        "headers": headers,
+        "rows": rows,
+        "currency": currency,
+        "source": {"table_index": index, "page": _page(table), "extracted_by": "document_intelligence"},
+    }
+
+
+def parse_amounts(values: Sequence[Any]) -> "np.ndarray":
+    """
+    `parse_amount` over a whole column at once (pandas string operations instead of a
+    per-cell loop); NaN where a cell is not an amount.
+    """
+    import numpy as np
+    import pandas as pd
+    text = pd.Series(list(values), dtype=object).fillna("").astype(str)
+    # literal no-break spaces: pyarrow-backed strings (pandas 3) use RE2, which rejects "\u" escapes
+    text = text.str.replace(_CURRENCY_RE, "", regex=True).str.replace("[\u00a0\u202f]", " ", regex=True)
+    text = text.str.strip().str.rstrip(",.-–").str.strip()
+    valid = text.str.match(_AMOUNT_RE)
+    text = text.str.replace(r"['\s]", "", regex=True)
+    dot, comma = text.str.rfind("."), text.str.rfind(",")
+    dots, commas = text.str.count(r"\."), text.str.count(",")
+    # decimal separator: the later of "." and ","; a lone one unless exactly three digits follow
+    last = np.maximum(dot, comma)
+    lone = ((dots + commas) == 1) & ((text.str.len() - last - 1) != 3)
+    decimal = np.where((dot >= 0) & (comma >= 0), np.where(dot > comma, ".", ","),
+                       np.where(lone, np.where(dot >= 0, ".", ","), ""))
+    number = text.str.replace(r"[.,]", "", regex=True)  # grouping separators only
+    number = number.where(decimal != ".", text.str.replace(",", "", regex=False))
+    number = number.where(decimal != ",", text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(number.where(valid), errors="coerce").to_numpy(dtype=float)
+
+
+def _check(status: str, reason: str, expected: Any = None, actual: Any = None) -> Dict[str, Any]:
+    return {"validation_status": status, "expected": expected, "actual": actual, "validation_reason": reason}
+
+
+def _round(value: Any) -> Optional[float]:
+    import numpy as np
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+def table_frame(rate_table: Dict[str, Any]) -> "pd.DataFrame":
+    """The rate table as a DataFrame of strings (short rows padded, duplicate headers made unique)."""
+    import pandas as pd
+    headers = list(rate_table.get("headers") or [])
+    seen: Dict[str, int] = {}
+    columns = []
+    for h in headers:
+        seen[h] = seen.get(h, 0) + 1
+        columns.append(h if seen[h] == 1 else f"{h} ({seen[h]})")
+    rows = [list(r)[:len(columns)] + [""] * (len(columns) - len(r)) for r in rate_table.get("rows") or []]
+    return pd.DataFrame(rows, columns=columns, dtype=object).fillna("").astype(str)
+
+
+def validate_rate_table(rate_table: Optional[Dict[str, Any]], marked_options: List[Dict[str, Any]],
+                        vat_rates: Optional[List[float]] = None,
+                        tolerance: float = 0.02) -> Dict[str, Any]:
+    """
+    Arithmetic checks of the rate table, one vectorized pass per column:
+      - line_totals: Amount × Price per unit = Total net, per row
+      - gross:       Total net × (1 + VAT) = Total brutto for one of `vat_rates` (RATE_TABLE_VAT_RATES)
+      - table_sum:   a "Total"/"Summe" row equals the sum of the service rows
+      - limit:       the service rows' net sum equals the fixed price / stays within the upper limit
+    A row without a Total net is priced as Amount × Price per unit. Returns
+    {table_status, validation_status, checks, cells} where cells lists the failing
+    {row, column, reason}; checks use the contract vocabulary (Correct / Mismatch / Missing).
+    """
+    import numpy as np
+    if vat_rates is None:
+        vat_rates = [float(r) for r in os.getenv("RATE_TABLE_VAT_RATES", os.getenv("INVOICE_VAT_RATES", "0.19")).split(",") if r.strip()]
+    frame = table_frame(rate_table or {})
+    filled = frame.apply(lambda c: c.str.strip() != "") if len(frame.columns) else frame
+    status = "Updated" if len(frame) and filled.drop(columns="Service", errors="ignore").to_numpy().any() \
+        else "Not updated"
+    checks: Dict[str, Dict[str, Any]] = {}
+    cells: List[Dict[str, Any]] = []
+    if status == "Not updated":
+        checks["table"] = _check("Missing", "The rate table has no values")
+        return {"table_status": status, "validation_status": "Missing", "checks": checks, "cells": cells}
+
+    nan = np.full(len(frame), np.nan)
+    column = {name: parse_amounts(frame[name]) if name in frame else nan
+              for name in ("Amount", "Price per unit", "Total net", "Total brutto")}
+    quantity, price, net, gross = (column[n] for n in ("Amount", "Price per unit", "Total net", "Total brutto"))
+    service = frame["Service"] if "Service" in frame else frame.iloc[:, 0]
+    summary = service.str.match(_SUMMARY_RE).to_numpy() & np.isnan(price)
+    lines = ~summary
+
+    def flag(mask: "np.ndarray", name: str, reason: str) -> None:
+        cells.extend({"row": int(i), "column": name, "reason": reason} for i in np.flatnonzero(mask))
+
+    priced = np.round(quantity * price, 2)
+    both = ~np.isnan(priced) & ~np.isnan(net)
+    wrong = both & (np.abs(priced - net) > tolerance)
+    flag(wrong, "Total net", "Amount × Price per unit differs")
+    if both.any():
+        checks["line_totals"] = (_check("Mismatch", f"{int(wrong.sum())} row(s): Amount × Price per unit ≠ Total net",
+                                        [_round(v) for v in priced[wrong]], [_round(v) for v in net[wrong]])
+                                 if wrong.any() else _check("Correct", "Amount × Price per unit = Total net"))
+
+    net = np.where(np.isnan(net), priced, net)
+    has_gross = ~np.isnan(net) & ~np.isnan(gross)
+    if has_gross.any():
+        rates = np.asarray(vat_rates or [0.0], dtype=float)
+        expected = np.round(net[:, None] * (1 + rates[None, :]), 2)
+        wrong = has_gross & ~(np.abs(expected - gross[:, None]) <= tolerance).any(axis=1)
+        flag(wrong, "Total brutto", f"Total net × (1 + VAT) differs for VAT {', '.join(f'{r:.0%}' for r in rates)}")
+        checks["gross"] = (_check("Mismatch", f"{int(wrong.sum())} row(s): gross does not match net plus VAT",
+                                  [_round(v) for v in net[wrong]], [_round(v) for v in gross[wrong]])
+                           if wrong.any() else _check("Correct", "Total brutto = Total net plus VAT"))
+
+    line_sum = round(float(np.nansum(net[lines])), 2)
+    if summary.any() and not np.isnan(net[summary]).all():
+        totals = net[summary]
+        wrong = summary & ~np.isnan(net) & (np.abs(net - line_sum) > tolerance)
+        flag(wrong, "Total net", "Does not equal the sum of the rows above")
+        checks["table_sum"] = (_check("Mismatch", "Total row differs from the sum of the rows",
+                                      line_sum, [_round(v) for v in totals])
+                               if wrong.any() else _check("Correct", "Total row equals the sum of the rows", line_sum))
+
+    for option in marked_options or []:
+        name = str(option.get("option", "")).lower()
+        if "upper" in name:
+            limit = parse_amount(option.get("upper_limit"))
+            if limit is not None and not np.isnan(net[lines]).all():
+                checks["limit"] = (_check("Correct", "Rows stay within the upper limit", limit, line_sum)
+                                   if line_sum <= limit + tolerance
+                                   else _check("Mismatch", "Rows exceed the upper limit", limit, line_sum))
+        elif "fixed" in name:
+            price_total = parse_amount(option.get("amount"))
+            if price_total is not None and not np.isnan(net[lines]).all():
+                checks["limit"] = (_check("Correct", "Rows add up to the fixed price", price_total, line_sum)
+                                   if abs(line_sum - price_total) <= tolerance
+                                   else _check("Mismatch", "Rows do not add up to the fixed price", price_total,
+                                               line_sum))
+
+    statuses = {c["validation_status"] for c in checks.values()}
+    return {"table_status": status, "validation_status": "Mismatch" if "Mismatch" in statuses else "Correct",
+            "checks": checks, "cells": cells}
+
+
+def apply_rate_table_checks(remuneration: Dict[str, Any], reverse_charge: bool = False) -> Dict[str, Any]:
+    """
+    Validate `remuneration["rate_table"]` and record it on the section: `rate_table_validation`,
+    each option's `table_status` (replacing the model's judgement) and, when the arithmetic
+    fails, validation_status "Mismatch". Reverse-charge contracts expect gross = net.
+    """
+    validation = validate_rate_table(remuneration.get("rate_table"), remuneration.get("marked_options", []),
+                                     vat_rates=[0.0] if reverse_charge else None)
+    remuneration["rate_table_validation"] = validation
+    for option in remuneration.get("marked_options", []):
+        if option.get("table_status") not in ("N/A", None):
+            option["table_status"] = validation["table_status"]
+    if validation["validation_status"] == "Mismatch":
+        failed = "; ".join(c["validation_reason"] for c in validation["checks"].values()
+                           if c["validation_status"] == "Mismatch")
+        remuneration["validation_status"] = "Mismatch"
+        remuneration["validation_reason"] = f"{remuneration.get('validation_reason', '')} Rate table: {failed}.".strip()
+    return validation
+
+
+def attach_rate_table(result: Dict[str, Any], rate_table: Optional[Dict[str, Any]]) -> None:
+    """
+    Put the rate table read from the layout under `remuneration_details` of an analysis result
+    and validate it (`apply_rate_table_checks`; reverse charge when the VAT section marks it).
+    Without a table the result is left as the model returned it.
+    """
+    if not rate_table:
+        return
+    remuneration = result.setdefault("remuneration_details", {})
+    remuneration["rate_table"] = rate_table
+    reverse_charge = "reverse" in str(result.get("vat", {}).get("marked_option", "")).lower()
+    apply_rate_table_checks(remuneration, reverse_charge=reverse_charge)
@@ -0,0 +1,24 @@
+# ui/render_cache.py
+import hashlib
+import json
+from typing import Any, Callable, Dict
+
+import streamlit as st
+
+# st.fragment (Streamlit >= 1.37) reruns only the decorated function on its own widget
+# interactions; older versions fall back to st.experimental_fragment or a plain call.
+fragment: Callable = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+# Result keys never shown or downloaded (the extracted text is kept only for chat)
+HIDDEN_KEYS = ("_raw_extracted_text",)
+
+
+def result_hash(result: Dict[str, Any]) -> str:
+    """Stable content hash of an analysis result, used as the key for memoized renderers."""
+    return hashlib.sha256(json.dumps(result, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def result_json(digest: str, _result: Dict[str, Any], indent: int = 2) -> str:
+    """JSON of the result without HIDDEN_KEYS, serialized once per result."""
+    return json.dumps({k: v for k, v in _result.items() if k not in HIDDEN_KEYS}, indent=indent)
@@ -0,0 +1,213 @@
+# services/results_store.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from comparison import flatten_validation
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    run_id            TEXT PRIMARY KEY,
+    doc_hash          TEXT NOT NULL,
+    file_name         TEXT,
+    supplier          TEXT,
+    template          TEXT,
+    processed_at      TEXT,
+    page_count        INTEGER,
+    extraction_time   REAL,
+    analysis_time     REAL,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    total_tokens      INTEGER,
+    models            TEXT
+);
+CREATE TABLE IF NOT EXISTS validation_rows (
+    run_id            TEXT NOT NULL,
+    doc_hash          TEXT NOT NULL,
+    file_name         TEXT,
+    supplier          TEXT,
+    template          TEXT,
+    processed_at      TEXT,
+    validation_item   TEXT NOT NULL,
+    section           TEXT,
+    expected_value    TEXT,
+    extracted_value   TEXT,
+    status            TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rows_status_item ON validation_rows (status, validation_item);
+CREATE INDEX IF NOT EXISTS idx_rows_supplier ON validation_rows (supplier, status);
+CREATE INDEX IF NOT EXISTS idx_rows_section ON validation_rows (section, status);
+CREATE INDEX IF NOT EXISTS idx_rows_doc ON validation_rows (doc_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (doc_hash);
+"""
+
+# Columns callers may filter or group on
+ROW_COLUMNS = ("run_id", "doc_hash", "file_name", "supplier", "template", "processed_at",
+               "validation_item", "section", "expected_value", "extracted_value", "status")
+
+
+def document_hash(pdf_content: bytes) -> str:
+    return hashlib.sha256(pdf_content).hexdigest()
+
+
+class ResultsStore:
+    """
+    Persists every validation as flat rows (the `flatten_validation` shape plus document,
+    supplier, template, timings and token usage) in an indexed SQLite database, so portfolio
+    reports run as SQL aggregates instead of re-opening JSON downloads.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("RESULTS_DB_PATH", os.path.join("results", "validations.db"))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------- writes ----------------
+
+    def record(self, result: Dict[str, Any], doc_hash: str, file_name: Optional[str] = None,
+               extraction_time: float = 0.0, analysis_time: float = 0.0, page_count: int = 0,
+               processed_at: Optional[str] = None) -> str:
+        """
+        Store one validation run. Returns its run_id.
+        """
+        run_id = uuid.uuid4().hex
+        processed_at = processed_at or datetime.now().isoformat(timespec="seconds")
+        supplier = (result.get("supplier_details") or {}).get("name")
+        template = (result.get("template_classification") or {}).get("type")
+        usage = result.get("_usage") or {}
+        models = sorted(set((result.get("_model_provenance") or {}).values()))
+
+        rows = [
+            (run_id, doc_hash, file_name, supplier, template, processed_at,
+             row["validation_item"], row["validation_item"].split(".", 1)[0],
+             str(row["expected_value"]), str(row["extracted_value"]), str(row["status"]))
+            for row in flatten_validation(result)
+        ]
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO documents VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (run_id, doc_hash, file_name, supplier, template, processed_at, page_count,
+                 extraction_time, analysis_time, usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                 usage.get("total_tokens"), json.dumps(models)),
+            )
+            conn.executemany("INSERT INTO validation_rows VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+        return run_id
+
+    # ---------------- reads ----------------
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> tuple:
+        clauses, params = [], []
+        for column, value in filters.items():
+            if value is None or value == [] or value == "":
+                continue
+            if column == "item_prefix":
+                clauses.append("validation_item LIKE ?")
+                params.append(f"{value}%")
+            elif column == "since":
+                clauses.append("processed_at >= ?")
+                params.append(value)
+            elif column not in ROW_COLUMNS:
+                raise ValueError(f"Unknown filter column: {column}")
+            elif isinstance(value, (list, tuple, set)):
+                clauses.append(f"{column} IN ({','.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        Flat validation rows matching `filters`, newest first. Filters are row columns
+        (status, supplier, template, section, validation_item, doc_hash, ...) with scalar or
+        list values, plus `item_prefix` and `since` (ISO timestamp).
+
+        e.g. store.query(status="Mismatch", item_prefix="VAT")
+        """
+        where, params = self._where(filters)
+        sql = f"SELECT * FROM validation_rows{where} ORDER BY processed_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(r) for r in self._connect().execute(sql, params)]
+
+    def summary(self, group_by: Sequence[str] = ("supplier",), **filters) -> List[Dict[str, Any]]:
+        """
+        Row counts per group, e.g. all Mismatch VAT rows by supplier:
+        store.summary(["supplier"], status="Mismatch", item_prefix="VAT")
+        """
+        for column in group_by:
+            if column not in ROW_COLUMNS:
+                raise ValueError(f"Unknown group column: {column}")
+        cols = ", ".join(group_by)
+        where, params = self._where(filters)
+        sql = (f"SELECT {cols}, COUNT(*) AS rows, COUNT(DISTINCT doc_hash) AS documents "
+               f"FROM validation_rows{where} GROUP BY {cols} ORDER BY rows DESC")
+        return [dict(r) for r in self._connect().execute(sql, params)]
+
+    def documents(self, limit: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """Per-run document records (timings, token usage), newest first."""
+        allowed = {k: v for k, v in filters.items() if k in ("doc_hash", "supplier", "template", "file_name")}
+        where, params = self._where(allowed)
+        sql = f"SELECT * FROM documents{where} ORDER BY processed_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(r) for r in self._connect().execute(sql, params)]
+
+    def totals(self) -> Dict[str, Any]:
+        conn = self._connect()
+        docs = conn.execute(
+            "SELECT COUNT(*) AS runs, COUNT(DISTINCT doc_hash) AS documents, "
+            "AVG(extraction_time) AS avg_extraction_time, AVG(analysis_time) AS avg_analysis_time, "
+            "SUM(total_tokens) AS total_tokens FROM documents"
+        ).fetchone()
+        statuses = conn.execute("SELECT status, COUNT(*) AS n FROM validation_rows GROUP BY status").fetchall()
+        return {**dict(docs), "statuses": {r["status"]: r["n"] for r in statuses}}
+
+    def distinct(self, column: str) -> List[Any]:
+        if column not in ROW_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        return [r[0] for r in self._connect().execute(
+            f"SELECT DISTINCT {column} FROM validation_rows WHERE {column} IS NOT NULL ORDER BY {column}")]
+
+    def export_parquet(self, directory: str, partition_cols: Iterable[str] = ("template",)) -> str:
+        """Write validation rows as a Parquet dataset partitioned by `partition_cols` (needs pyarrow)."""
+        import pandas as pd
+        df = pd.read_sql_query("SELECT * FROM validation_rows", self._connect())
+        df.to_parquet(directory, partition_cols=list(partition_cols), index=False)
+        return directory
+
+
+_STORE: Optional[ResultsStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_results_store() -> ResultsStore:
+    """Process-wide ResultsStore at RESULTS_DB_PATH."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = ResultsStore()
+    return _STORE
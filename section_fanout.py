@@ -0,0 +1,145 @@
+# services/section_fanout.py
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from contract_prompt import ALL_SECTION_IDS, SECTION_DEPENDENCIES, result_keys
+from telemetry import span
+
+# Sections requested together in one LLM call. Groups that feed a dependent section are kept
+# small so the dependent call can start early; the rest are batched to limit prompt repeats
+# (every group call re-sends the contract text).
+SECTION_GROUPS: Dict[str, List[str]] = {
+    "parties": ["parties"],
+    "remuneration": ["remuneration"],
+    "term": ["classification", "terms"],
+    "contacts": ["customer_contact", "project_manager", "place_of_performance", "subcontractors"],
+    "compliance": ["invoice_address", "data_protection"],
+    "invoicing": ["invoicing"],
+    "vat": ["vat"],
+    "signatures": ["signatures"],
+}
+
+GroupRunner = Callable[[List[str], Optional[Dict[str, Any]]], Tuple[Dict[str, Any], float]]
+
+
+def fanout_enabled() -> bool:
+    return os.getenv("SECTION_FANOUT", "").lower() in ("1", "true", "yes")
+
+
+def plan_groups(section_ids: Optional[List[str]] = None,
+                groups: Optional[Dict[str, List[str]]] = None) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Restrict `groups` to the requested sections (sections in no group get their own) and
+    derive group dependencies from SECTION_DEPENDENCIES. Inputs that are not requested
+    (e.g. a locally classified template) are expected in the caller's context.
+    Returns (groups, depends_on) keyed by group name.
+    """
+    ids = section_ids or ALL_SECTION_IDS
+    planned: Dict[str, List[str]] = {}
+    for name, members in (groups or SECTION_GROUPS).items():
+        selected = [s for s in members if s in ids]
+        if selected:
+            planned[name] = selected
+    grouped = {s for members in planned.values() for s in members}
+    for section_id in ids:
+        if section_id not in grouped:
+            planned[section_id] = [section_id]
+
+    owner = {s: name for name, members in planned.items() for s in members}
+    depends_on = {
+        name: sorted({owner[d] for s in members for d in SECTION_DEPENDENCIES.get(s, [])
+                      if d in owner and owner[d] != name})
+        for name, members in planned.items()
+    }
+    return planned, depends_on
+
+
+def _merge(result: Dict[str, Any], part: Dict[str, Any], sections: List[str]) -> None:
+    """Section keys of one group into the combined result; bookkeeping keys are combined."""
+    for key in result_keys(sections):
+        if key in part:
+            result[key] = part[key]
+    if "_model_provenance" in part:
+        result.setdefault("_model_provenance", {}).update(part["_model_provenance"])
+    if "_repair" in part:
+        repair = result.setdefault("_repair", {"attempts": [], "unresolved": []})
+        repair["attempts"] += part["_repair"]["attempts"]
+        repair["unresolved"] = sorted(set(repair["unresolved"]) | set(part["_repair"]["unresolved"]))
+    if "_cascade" in part:
+        cascade = result.setdefault("_cascade", {**part["_cascade"], "escalated_sections": [], "reasons": {}})
+        escalated = part["_cascade"]["escalated_sections"]
+        if escalated == "all":
+            escalated = list(sections)
+        cascade["escalated_sections"] = [s for s in ALL_SECTION_IDS
+                                         if s in cascade["escalated_sections"] or s in escalated]
+        cascade["reasons"].update(part["_cascade"]["reasons"])
+
+
+def analyze_fanout(run_group: GroupRunner, section_ids: Optional[List[str]] = None,
+                   context: Optional[Dict[str, Any]] = None,
+                   groups: Optional[Dict[str, List[str]]] = None,
+                   max_workers: Optional[int] = None) -> Tuple[Dict[str, Any], float]:
+    """
+    Run section groups as concurrent LLM calls: independent groups start at once, dependent
+    groups as soon as the groups they cross-validate against have finished (their results
+    are passed as context). End-to-end time is the critical path instead of one serial call.
+
+    run_group(section_ids, context) -> (result_json, seconds), e.g. `analyzer.analyze_sections`
+    or `analyze_with_cascade` bound to the contract text.
+    The combined result carries `_fanout`: per-group timings and the critical path.
+    Returns (result_json, analysis_time_seconds).
+    """
+    planned, depends_on = plan_groups(section_ids, groups)
+    workers = max_workers or int(os.getenv("SECTION_FANOUT_WORKERS", "0") or 0) or len(planned)
+
+    result: Dict[str, Any] = {}
+    timings: Dict[str, Dict[str, Any]] = {}
+    done: set = set()
+    running: Dict[Future, str] = {}
+    start_time = time.time()
+
+    def run(name: str, group_context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        with span("llm.fanout.group", **{"fanout.group": name, "fanout.sections": ",".join(planned[name])}):
+            part, _ = run_group(planned[name], group_context)
+        return part
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sections") as executor:
+        def submit_ready() -> None:
+            for name in planned:
+                if name in done or name in running.values() or not set(depends_on[name]) <= done:
+                    continue
+                group_context = dict(context or {})
+                for dep in depends_on[name]:
+                    group_context.update({k: result[k] for k in result_keys(planned[dep]) if k in result})
+                timings[name] = {"sections": planned[name], "depends_on": depends_on[name],
+                                 "started": round(time.time() - start_time, 3)}
+                # copy the context so spans in the worker keep the document's trace baggage
+                future = executor.submit(contextvars.copy_context().run, run, name, group_context or None)
+                running[future] = name
+
+        submit_ready()
+        while running:
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    part = future.result()
+                except Exception:
+                    for pending in running:
+                        pending.cancel()
+                    raise
+                _merge(result, part, planned[name])
+                timings[name]["finished"] = round(time.time() - start_time, 3)
+                done.add(name)
+            submit_ready()
+
+    analysis_time = time.time() - start_time
+    result["_fanout"] = {
+        "groups": timings,
+        "critical_path_seconds": round(analysis_time, 3),
+        "serial_seconds": round(sum(t["finished"] - t["started"] for t in timings.values()), 3),
+    }
+    return result, analysis_time
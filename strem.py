@@ -1,14 +1,37 @@
 import os
-import json
-import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
 import streamlit as st
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeResult
-from openai import AzureOpenAI
+
+from client_pool import get_client_pool
+from document_extractor import extract_document
+from rate_limiter import limiter_snapshots
+from openai_router import get_openai_client, get_router
+from contract_analyzer import ContractAnalyzer
+from model_cascade import analyze_with_cascade, cascade_models
+from section_fanout import analyze_fanout, fanout_enabled
+from template_classifier import apply_template_rules, classify_template, prompt_sections
+from invoice_view import render_invoice_mode
+from results_store import document_hash, get_results_store
+from portfolio_dashboard import render_portfolio_dashboard
+from telemetry import METRICS, span, start_metrics_server, trace_document
+from render_cache import fragment, result_hash, result_json
+from comparison import render_comparison
+from chat_rag import render_chat
+from answer_cache import get_answer_cache
+from rate_table import attach_rate_table
+from update_display import render_remuneration
+from jobs import DONE, Job, get_job_queue
+from job_view import attach_job, current_job_id, render_job_error, render_job_list, render_job_progress
+from memory_view import drop, hold, load, render_memory_panel
+from batch_view import attach_batch, current_batch_id, render_batch_progress, render_batch_results
+
+# The Azure SDKs, openai, pandas, numpy, openpyxl and fitz are imported on first use (client
+# creation, exports, chat), so the first page renders without loading them.
+if TYPE_CHECKING:
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from openai import AzureOpenAI
 
 # Load environment variables from .env file
 load_dotenv()
@@ -79,26 +102,12 @@ st.markdown("""
 def get_azure_clients() -> tuple:
     """
     Initialize Azure clients for Document Intelligence and OpenAI.
-    Uses cached resource to avoid recreating clients on every run.
+    Clients come from the process-wide ClientPool (one keep-alive transport per endpoint),
+    shared with the chat and batch paths. When AZURE_OPENAI_DEPLOYMENTS is set the OpenAI
+    client is a router over all configured deployments.
     """
-    doc_endpoint = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
-    doc_key = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
-    openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    openai_key = os.getenv("AZURE_OPENAI_API_KEY")
-    openai_version = os.getenv("AZURE_OPENAI_API_VERSION")
-    
-    doc_client = DocumentIntelligenceClient(
-        endpoint=doc_endpoint,
-        credential=AzureKeyCredential(doc_key)
-    )
-    
-    openai_client = AzureOpenAI(
-        api_version=openai_version,
-        azure_endpoint=openai_endpoint,
-        api_key=openai_key
-    )
-    
-    return doc_client, openai_client
+    doc_client, _ = get_client_pool().default_clients()
+    return doc_client, get_openai_client()
 
 
 def validate_environment() -> bool:
@@ -114,6 +123,9 @@ def validate_environment() -> bool:
         "AZURE_OPENAI_API_VERSION",
         "AZURE_OPENAI_MODEL"
     ]
+    if os.getenv("AZURE_MOCK_ENDPOINT"):
+        # Local mock services (mock_services.py): endpoints and keys are not needed
+        required_vars = ["AZURE_OPENAI_MODEL"]
     
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
@@ -127,307 +139,52 @@ def validate_environment() -> bool:
     return True
 
 
-def extract_text_from_pdf(pdf_content: bytes, doc_client: DocumentIntelligenceClient) -> tuple[str, int]:
+def extract_text_from_pdf(pdf_content: bytes, doc_client: "DocumentIntelligenceClient") -> Tuple[str, int, float]:
     """
     Extract text from PDF using Azure Document Intelligence.
-    Returns extracted text and number of pages processed.
+    Returns extracted text, number of pages processed and the extraction time in seconds.
     """
-    try:
-        start_time = time.time()
-        
-        poller = doc_client.begin_analyze_document(
-            model_id="prebuilt-layout",
-            body=pdf_content
-        )
-        result = poller.result()
-        
-        full_text = ""
-        page_count = 0
-        
-        if result.pages:
-            page_count = len(result.pages)
-            for page_num, page in enumerate(result.pages, 1):
-                if page.lines:
-                    for line in page.lines:
-                        full_text += line.content + "\n"
-        
-        extraction_time = time.time() - start_time
-        return full_text, page_count, extraction_time
-    
-    except Exception as e:
-        raise Exception(f"Failed to extract text from PDF: {str(e)}")
+    return extract_document(pdf_content, doc_client)[:3]
 
 
-def analyze_contract(full_text: str, openai_client: AzureOpenAI) -> Dict[str, Any]:
+def analyze_contract(full_text: str, openai_client: "AzureOpenAI", cascade: bool = False) -> Dict[str, Any]:
     """
     Analyze contract using Azure OpenAI with structured JSON output.
-    Returns parsed JSON response.
+    With cascade=True every section runs on the fast model first and only low-confidence,
+    incomplete or Mismatch sections are re-run on the strong model.
+    The template is classified locally first; when that is confident the classification
+    section is dropped from the prompt and template-specific rules are resolved up front.
+    With SECTION_FANOUT enabled the section groups run as concurrent calls (see section_fanout).
+    Token usage is returned under `_usage` in the result.
     """
-    system_prompt = """You are a contract analysis expert. Extract and validate contract information 
-according to the following requirements:
-
-1. TEMPLATE CLASSIFICATION: Determine if the contract is IT, Non-IT (Consulting), or Marketing based on:
-   - Non-IT: Look for "Consulting Agreement" header and keywords: Consulting, teaching, advising, coaching
-   - IT: Look for "Agreement for IT Projects and Services" header and IT-related keywords
-   - Marketing: Look for keywords: Marketing, Market Insight, Media
-   Return the template type and detected keywords.
-
-2. PARTY INFORMATION: Extract Name and address of Allianz and Supplier details:
-   - For Allianz: Validate against these exact addresses:
-     * "Allianz SE Königinstrasse 28, 80802 München Germany" or
-     * "Allianz Technology SE Königinstrasse 28, 80802 München Germany"
-     If one of the above is found return "Correct", If different format: "Mismatch", If not found: "Missing"
-   - For Supplier: Extract name and address as provided. If not found: "Missing"
-
-3. CUSTOMER CONTACT:
-   - Extract customer contact details such as:
-       1. Surname, First name, Telephone number and e-mail address.
-       2. Validate that email contains "Allianz" domain otherwise, 'Mismatch' should be shown
-          
-4. Contractor´s Project Manager:  
-   - Extract Contractor´s Project Manager details such as:
-     1. Surname, First name, Telephone number and e-mail address.
-     2. If a field is blank, the result should indicate 'Missing.' If the email address does not contain the supplier name(mentioned in PARTY INFORMATION), 
-        it should show 'Mismatch'. 
-
-5. PLACE OF PERFORMANCE:
-   - If "Others" option is crossed (☒): Return the provided details, or "Missing" if blank
-   - If first option (e.g., "the seat of the customer") is crossed ☒: Return "Correct"
-
-6. SUBCONTRACTORS DETAILS:
-   - Extract all provided details.
-
-7. REMUNERATION DETAILS:
-   - Identify which remuneration option is marked (checkboxes ☒):
-   - Extract: marked_option, amount, currency
-   - Validation Rules:
-     * If Option 1 (Fixed price) is marked: Validate amount and currency are provided, status = "Correct" if both present, else "Missing"
-     * If Option 2 is marked: Check if Attachment 3 (Rate Card) exists with rates defined in table. If table is not updated or Attachment 3 has no rates, status = "Missing", else status = "Correct"
-     * If Option 3 is marked: Check if upper limit amount and currency are provided AND table is updated. If table is not updated or upper limit is missing, status = "Missing", else status = "Correct"
-     * If multiple options marked, validate each marked option meets its requirements
-     * If remuneration details are completely absent, status = "Missing"
-   - Return marked options as array, provide table/rate details if present
-   
-8. INVOICING:
-   - Identify which invoicing option is marked (checkboxes ☒):
-     * Option 1: Monthly in arrears
-     * Option 2: After overall acceptance
-     * Option 3: Following acceptance of milestones
-   - Extract: marked_option
-   - Validation Rules:
-     * If Remuneration part marked "Fixed price" (Option 1): Then one of the invoicing options ( 2, or 3) MUST be marked. If none marked, status = "Mismatch"
-     * If Remuneration part marked "Remuneration based on time expended" (Option 2 or 3): Then invoicing can be any of the three options (1, 2, or 3). If none marked, status = "Missing"
-   - Cross-validate with Remuneration selection
-   - If invoicing details are completely absent, status = "Missing"
-
-9. VAT (Value Added Tax):
-   - Identify which VAT option is marked (checkboxes):
-     * Option 1: VAT does not apply due to the tax affinity
-     * Option 2: To the aforementioned costs the applicable rate of value-added tax shall be added – local Contractor
-     * Option 3: The recipient of these services is liable to the VAT due (reverse charge) – foreign Contractor
-   - Extract: marked_option
-   - Validation Rules (based on Supplier details from section 2):
-     * If Supplier is intercompany entity (Metafinanz, Kaiser X, Syncier): Option 1 MUST be marked, else status = "Mismatch"
-     * If Supplier is located in Germany: Option 2 (local contractor) MUST be marked, else status = "Mismatch"
-     * If Supplier is NOT located in Germany (foreign): Option 3 (reverse charge) MUST be marked, else status = "Mismatch"
-     * If VAT section is missing, status = "Missing"
-   - Cross-validate with supplier location and type
-   - Provide validation_reason explaining the logic
-
-10. INVOICE ADDRESS:
-   - Extract invoice address (street, city, country) if "Invoice address" or "Invoice send to address" header is present
-   - Validation Rules:
-     * If header is present: Validate address matches one of:
-       - Customer OE address from first page (Allianz SE or Allianz Technology SE with same address as in PARTY INFORMATION)
-       - Standard address: "Dieselstraße 8, 85774 Unterföhring, Germany"
-     * If header matches one of these addresses: status = "Correct"
-     * If header exists but address does not match: status = "Mismatch"
-     * If header is not present in contract: status = "Missing"
-   - Provide matched_address and validation_reason
-
-11. APPLICABILITY OF DATA PROTECTION, INFORMATION SECURITY, AND OUTSOURCING:
-   - For each checkbox area (Data protection, Information security, Outsourcing):
-     * Identify if checkbox is marked "Yes" or "No"
-     * If marked "Yes": Check if corresponding document/attachment is included in the contract
-       - If document is included: status = "Correct" or "Available"
-       - If document is NOT included: status = "Missing"
-     * If marked "No": status = "N/A" (not applicable)
-     * If checkbox is not marked or section missing: status = "Missing"
-   - Return individual status for each category (data_protection, information_security, outsourcing)
-   - Provide document_status and validation_reason for each
-
-12. TERMS AND TERMINATION:
-   - This is a MANDATORY field
-   - Extract: start_date, end_date (format: YYYY-MM-DD or as provided)
-   - Validation Rules:
-     * Both start_date and end_date MUST be provided
-     * If either date is missing: status = "Missing"
-     * If both dates are present: status = "Correct"
-     * Calculate contract_duration (multiyear check: does contract span more than one calendar year?)
-   - Return: start_date, end_date, contract_duration, is_multiyear (true/false), validation_status
-
-13. VERIFICATION OF SIGNATURES:
-   - Count and identify all signatures in the contract
-   - Extract: total_signature_count, allianz_signature_count, supplier_signature_count, gsp_approval_present (true/false)
-   - Determine required_signature_count based on business rules:
-     * Rule 1: If Allianz SE is the buyer (first page): Requires 3 signatures (2 Allianz + 1 Supplier)
-     * Rule 2: If project term is multiyear (more than one calendar year from section 11): Requires 3 signatures (2 Allianz + 1 Supplier)
-     * Rule 3: If contract is Vendor Consolidation (check CWID number reference): Requires 4 signatures (GSP approval + 2 Allianz + 1 Supplier)
-     * Rule 4: If contract is Non-IT category (from section 1): Requires 3 signatures (2 Allianz + 1 Supplier)
-   - Validation Rules:
-     * If actual signatures match required signatures: status = "Correct"
-     * If actual signatures do NOT match required: status = "Mismatch"
-     * If signatures cannot be verified or counted: status = "Missing"
-   - Return: signature_counts, required_count, applied_rules, validation_status, validation_reason
-   
-
-Return response as JSON object matching the following schema:
-{
-    "template_classification": {
-        "type": "IT|Non-IT|Marketing",
-        "keywords_found": ["list of detected keywords"],
-        "confidence": "High|Medium|Low"
-    },
-    "allianz_details": {
-        "name": "extracted name",
-        "address": "extracted address",
-        "validation_status": "Correct|Mismatch|Missing"
-    },
-    "supplier_details": {
-        "name": "extracted name or Missing",
-        "address": "extracted address or Missing",
-        "validation_status": "Correct|Mismatch|Missing"
-    },
-    "customer_contact": {
-        "Surname": "surname or Missing",
-        "First name": "First name or Missing",
-        "Telephone number": "Telephone Number or Missing",
-        "e-mail address": "email or Missing",
-        "validation_status": "Correct|Mismatch|Missing"
-    },
-    "contractor_project_manager": {
-       "Surname": "surname or Missing",
-        "First name": "First name or Missing",
-        "Telephone number": "Telephone Number or Missing",
-        "e-mail address": "email or Missing",
-        "validation_status": "Correct|Mismatch|Missing"
-    },
-    "place_of_performance": {
-        "type": "Checked option (☒)",
-        "details": "provided details or Missing",
-        "validation_status": "Correct|Not found"
-    },
-    "subcontractor_details": {
-        "present": true|false,
-        "details": "provide details or null"
-        "validation_status": "Found|Not found"
-    },
-    "remuneration_details": {
-        "marked_options": [
-            {
-                "option": "return marked_option",
-                "amount": "amount or Missing",
-                "currency": "currency or Missing",
-                "upper_limit": "upper limit amount or N/A",
-                "rate_card_status": "Present|Missing|N/A",
-                "table_status": "Updated|Not updated|N/A"
-            }
-        ],
-        "validation_status": "Correct|Mismatch|Missing",
-        "validation_reason": "Explanation of validation status"
-    },
-    "invoicing": {
-        "marked_options": [
-            {
-                "option": "Monthly in arrears|After overall acceptance|Following milestone acceptance",
-            }
-        ],
-        "validation_status": "Correct|Mismatch|Missing",
-        "validation_reason": "Explanation including cross-validation with remuneration",
-        "cross_validation_with_remuneration": "Matches|Does not match remuneration selection"
-    },
-    "vat": {
-        "marked_option": "Tax affinity|Local contractor|Foreign contractor (reverse charge)|Missing",
-        "validation_status": "Correct|Mismatch|Missing",
-        "validation_reason": "Explanation based on supplier location and type",
-        "expected_option": "Expected VAT option based on supplier details"
-    },
-    "invoice_address": {
-        "address_present": true|false,
-        "extracted_address": "extracted address or N/A",
-        "matched_address": "Customer OE|Standard Unterföhring|None",
-        "validation_status": "Correct|Mismatch|Missing",
-        "validation_reason": "Explanation of address validation"
-    },
-    "data_protection_security_outsourcing": {
-        "data_protection": {
-            "marked": "Yes|No|Missing",
-            "document_included": true|false,
-            "validation_status": "Correct|Available|Missing|N/A",
-            "validation_reason": "Explanation"
-        },
-        "information_security": {
-            "marked": "Yes|No|Missing",
-            "document_included": true|false,
-            "validation_status": "Correct|Available|Missing|N/A",
-            "validation_reason": "Explanation"
-        },
-        "outsourcing": {
-            "marked": "Yes|No|Missing",
-            "document_included": true|false,
-            "validation_status": "Correct|Available|Missing|N/A",
-            "validation_reason": "Explanation"
-        }
-    },
-    "terms_and_termination": {
-        "start_date": "date or Missing",
-        "end_date": "date or Missing",
-        "contract_duration": "duration in months/years",
-        "is_multiyear": true|false,
-        "validation_status": "Correct|Missing",
-        "validation_reason": "Mandatory field - explanation"
-    },
-    "signature_verification": {
-        "total_signatures": 0,
-        "allianz_signatures": 0,
-        "supplier_signatures": 0,
-        "gsp_approval_present": true|false,
-        "required_signatures": 0,
-        "applied_rules": ["list of rules that determine required signatures"],
-        "validation_status": "Correct|Mismatch|Missing",
-        "validation_reason": "Detailed explanation of signature requirement logic"
-    },
-}
-"""
-    
-    user_message = f"""Please analyze the following contract document and extract the required information:
+    try:
+        analyzer = ContractAnalyzer(openai_client)
+        with span("template.classify"):
+            classification = classify_template(full_text)
+        section_ids = prompt_sections(classification)
+        local = "classification" not in section_ids
+        template = classification["type"] if local else None
+        context = {"template_classification": classification} if local else None
+
+        def run_sections(ids, ids_context):
+            if cascade:
+                return analyze_with_cascade(
+                    analyzer, full_text, section_ids=ids, context=ids_context, template=template
+                )
+            return analyzer.analyze_sections(full_text, ids, context=ids_context, template=template)
 
-CONTRACT CONTENT:
----
-{full_text}
----
+        if fanout_enabled():
+            result_json, analysis_time = analyze_fanout(run_sections, section_ids, context=context)
+        else:
+            result_json, analysis_time = run_sections(section_ids, context)
+
+        if local:
+            result_json["template_classification"] = classification
+        apply_template_rules(result_json, result_json.get("template_classification", {}).get("type"))
+        result_json["_usage"] = dict(analyzer.usage)
 
-Extract all required information according to the validation rules specified."""
-    
-    try:
-        start_time = time.time()
-        
-        response = openai_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=4096,
-            temperature=0.3,
-            model=os.getenv("AZURE_OPENAI_MODEL"),
-            response_format={"type": "json_object"}
-        )
-        
-        analysis_time = time.time() - start_time
-        result_json = json.loads(response.choices[0].message.content)
-        
         return result_json, analysis_time
-    
+
     except Exception as e:
         raise Exception(f"Failed to analyze contract: {str(e)}")
 
@@ -539,24 +296,7 @@ def display_extraction_results(result: Dict[str, Any]) -> None:
             st.write(f"**Details:** {subcontractor.get('details', 'N/A')}")
 
     with st.expander("💰 Remuneration Details", expanded=True):
-        remuneration = result.get("remuneration_details", {})
-    
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            st.write("**Marked Options:**")
-            for option in remuneration.get("marked_options", []):
-                st.write(f"- {option.get('option', 'N/A')}")
-                if option.get('amount') != 'N/A' and option.get('amount') != 'Missing':
-                    st.write(f"  Amount: {option.get('amount', 'N/A')} {option.get('currency', 'N/A')}")
-                if option.get('rate_card_status') != 'N/A':
-                    st.write(f"  Rate Card: {option.get('rate_card_status', 'N/A')}")
-    
-        with col2:
-            status = remuneration.get("validation_status", "N/A")
-            st.markdown(f"**Status:** <span class='{get_validation_style(status)}'>{status}</span>", 
-                    unsafe_allow_html=True)
-        
-        st.info(remuneration.get("validation_reason", "No details"))
+        render_remuneration(result.get("remuneration_details", {}), get_validation_style)
 
     # Invoicing
     with st.expander("📧 Invoicing", expanded=True):
@@ -676,8 +416,127 @@ def display_extraction_results(result: Dict[str, Any]) -> None:
 
 
 
+def run_contract_job(job: Job, pdf_content: bytes, file_name: str, doc_client, openai_client,
+                     cascade: bool = False) -> Dict[str, Any]:
+    """
+    Extraction + analysis pipeline executed on a job worker. Reports its stage through
+    `job.update` and returns everything the results view needs.
+    """
+    doc_hash = document_hash(pdf_content)
+    
+    # Every span below carries document.hash, so slow stages can be traced to a document
+    with trace_document(doc_hash, file_name), span("pipeline.process"):
+        job.update(stage="extracting", progress=10)
+        full_text, page_count, extraction_time, rate_table = extract_document(
+            pdf_content, doc_client, rate_table=True)
+        
+        job.update(stage="analyzing", progress=45, pages=page_count)
+        result, analysis_time = analyze_contract(full_text, openai_client, cascade=cascade)
+        # read from the layout, not transcribed by the model
+        if rate_table:
+            with span("rate_table.validate"):
+                attach_rate_table(result, rate_table)
+        # kept for the contract chat; hidden from the JSON views and downloads
+        result["_raw_extracted_text"] = full_text
+        
+        # Keep every validation for portfolio reporting; never fail the job on storage errors
+        job.update(stage="saving", progress=90)
+        warning = None
+        try:
+            get_results_store().record(
+                result, doc_hash, file_name,
+                extraction_time, analysis_time, page_count
+            )
+        except Exception as e:
+            warning = f"⚠️ Result could not be saved to the portfolio store: {e}"
+    
+    return {
+        "result": result,
+        "result_hash": result_hash(result),
+        "file_name": file_name,
+        "extraction_time": extraction_time,
+        "analysis_time": analysis_time,
+        "page_count": page_count,
+        "processing_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "warning": warning,
+    }
+
+
+def load_job_output(job: Job) -> None:
+    """Show a finished job's result in this session."""
+    output = job.output
+    # the session keeps only the hash; the result itself lives in the memory-bounded artifact store
+    hold("result", output["result"], key=output["result_hash"])
+    st.session_state.result_hash = output["result_hash"]
+    st.session_state.file_name = output["file_name"]
+    st.session_state.extraction_time = output["extraction_time"]
+    st.session_state.analysis_time = output["analysis_time"]
+    st.session_state.page_count = output["page_count"]
+    st.session_state.processing_time = output["processing_time"]
+    st.session_state.processing_complete = True
+    st.session_state.loaded_job_id = job.id
+
+
+@fragment
+def render_result_details(result: Dict[str, Any], digest: str) -> None:
+    """Organized results and raw JSON (serialized once per result hash)."""
+    display_extraction_results(result)
+    
+    # Raw JSON Display
+    st.divider()
+    with st.expander("📋 View Raw JSON", expanded=False):
+        st.json(result_json(digest, result))
+
+
+@fragment
+def render_downloads(result: Dict[str, Any], digest: str) -> None:
+    """JSON / text downloads; the payload is serialized once per result hash, not on every rerun."""
+    with span("export.json"):
+        json_str = result_json(digest, result)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.download_button(
+            label="⬇️ Download Results (JSON)",
+            data=json_str,
+            file_name=f"contract_analysis_{timestamp}.json",
+            mime="application/json",
+            use_container_width=True
+        )
+    
+    with col2:
+        st.download_button(
+            label="⬇️ Download Results (Text)",
+            data=json_str,
+            file_name=f"contract_analysis_{timestamp}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+
+
 def main():
     """Main application function."""
+    start_metrics_server()
+    
+    # Reattach to the background job of this page (survives refreshes, shareable via ?job=).
+    # A finished job is loaded before the sidebar renders so its statistics are current.
+    queue = get_job_queue()
+    job_id = current_job_id()
+    job = queue.get(job_id)
+    job_loaded = False
+    if job_id and job is None:
+        # finished long ago or submitted before a server restart
+        attach_job(None)
+    elif job is not None and job.status == DONE and st.session_state.get("loaded_job_id") != job.id:
+        load_job_output(job)
+        job_loaded = True
+    
+    # Multi-file uploads run as a batch of jobs (?batch=); one of its files can be opened as the job above
+    batch_id = current_batch_id()
+    batch = queue.batch(batch_id)
+    if batch_id and batch is None:
+        attach_batch(None)
     
     # Header Section
     st.markdown("""
@@ -706,6 +565,26 @@ def main():
             "and Azure OpenAI to analyze contract content automatically."
         )
         
+        st.divider()
+        st.radio(
+            "📂 Document Type",
+            options=["Contract", "Invoice", "Portfolio"],
+            key="document_mode",
+            help="Invoices are validated with Document Intelligence prebuilt-invoice and deterministic checks. "
+                 "Portfolio reports over every stored contract validation."
+        )
+
+        fast_model, strong_model = cascade_models()
+        if fast_model and fast_model != strong_model:
+            st.divider()
+            st.subheader("⚙️ Analysis Settings")
+            st.checkbox(
+                "⚡ Cascade mode",
+                key="cascade_mode",
+                help=f"Run all sections on {fast_model} and re-run only low-confidence "
+                     f"or Mismatch sections on {strong_model}."
+            )
+
         st.divider()
         st.subheader("📊 Processing Statistics")
         if "processing_time" in st.session_state:
@@ -716,47 +595,131 @@ def main():
                 st.metric("Analysis Time", f"{st.session_state.analysis_time:.2f}s")
             st.metric("Pages Processed", st.session_state.page_count)
             st.caption(f"Processed: {st.session_state.processing_time}")
+
+            result = load("result") or {}
+            usage = result.get("_usage")
+            if usage:
+                st.subheader("🧮 Token Usage")
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Input Tokens", usage.get("prompt_tokens", 0))
+                with col2:
+                    st.metric("Output Tokens", usage.get("completion_tokens", 0))
+                if usage.get("completion_tokens_saved"):
+                    st.caption(f"Compact output saved ~{usage['completion_tokens_saved']} output tokens")
+            chat_cache = get_answer_cache().stats()
+            if chat_cache["hits"] + chat_cache["misses"]:
+                st.caption(f"Chat answer cache: {chat_cache['hit_rate']:.0%} hit rate "
+                           f"({chat_cache['hits']}/{chat_cache['hits'] + chat_cache['misses']}), "
+                           f"~{chat_cache['tokens_saved']} tokens saved")
+            cascade = result.get("_cascade")
+            if cascade:
+                escalated = cascade.get("escalated_sections") or []
+                st.caption(
+                    f"Cascade: {cascade.get('fast_model')} → {cascade.get('strong_model')} for "
+                    f"{', '.join(escalated) if isinstance(escalated, list) and escalated else escalated or 'no sections'}"
+                )
+            fanout = result.get("_fanout")
+            if fanout:
+                st.caption(
+                    f"Fan-out: {len(fanout['groups'])} concurrent groups, critical path "
+                    f"{fanout['critical_path_seconds']:.1f}s vs {fanout['serial_seconds']:.1f}s serial"
+                )
+
+        snapshots = limiter_snapshots()
+        if snapshots:
+            with st.expander("🚦 Rate Limits", expanded=False):
+                for snap in snapshots:
+                    st.caption(
+                        f"**{snap['name']}** — concurrency {snap['concurrency_limit']} "
+                        f"({snap['in_flight']} in flight), calls {snap['calls']}, "
+                        f"throttled {snap['throttled']}, waited {snap['waited_seconds']:.1f}s"
+                    )
+                router = get_router()
+                if router is not None:
+                    st.write("**Deployments**")
+                    for dep in router.snapshot():
+                        latency = dep["latency"].get("chat")
+                        st.caption(
+                            f"**{dep['name']}** ({dep['model']}, priority {dep['priority']}) — "
+                            f"latency {latency if latency is not None else '–'}s, "
+                            f"errors {dep['error_rate']:.0%}"
+                            + (" · cooling down" if dep["cooling_down"] else "")
+                        )
+
+        stage_summary = METRICS.summary()
+        if stage_summary:
+            with st.expander("⏱️ Stage Latency", expanded=False):
+                st.dataframe(
+                    [{"stage": r["stage"], "n": r["count"], "p50 (s)": r["p50"],
+                      "p95 (s)": r["p95"], "p99 (s)": r["p99"], "errors": r["errors"]}
+                     for r in stage_summary],
+                    hide_index=True,
+                    use_container_width=True
+                )
+
+        render_job_list(queue)
+        render_memory_panel()
     
     # Validate environment
     if not validate_environment():
         st.stop()
+
+    if st.session_state.get("document_mode") == "Invoice":
+        doc_client, _ = get_azure_clients()
+        render_invoice_mode(doc_client)
+        return
+
+    if st.session_state.get("document_mode") == "Portfolio":
+        render_portfolio_dashboard(get_results_store())
+        return
     
     # Initialize session state
     if "processing_complete" not in st.session_state:
         st.session_state.processing_complete = False
-        st.session_state.result = None
+        st.session_state.result_hash = None
         st.session_state.file_name = None
     
     # File Upload Section
-    st.subheader("📤 Upload Document")
-    uploaded_file = st.file_uploader(
-        "Select a PDF document to analyze",
+    st.subheader("📤 Upload Documents")
+    uploaded_files = st.file_uploader(
+        "Select one or more PDF documents to analyze",
         type="pdf",
-        help="Upload a contract document in PDF format"
-    )
+        accept_multiple_files=True,
+        help="Upload contract documents in PDF format; several files are processed in parallel"
+    ) or []
     
-    if uploaded_file is not None:
+    if uploaded_files:
         # File information
-        file_size_mb = uploaded_file.size / (1024 * 1024)
+        sizes_mb = [f.size / (1024 * 1024) for f in uploaded_files]
         
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("File Name", uploaded_file.name)
-        with col2:
-            st.metric("File Size", f"{file_size_mb:.2f} MB")
+        if len(uploaded_files) == 1:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("File Name", uploaded_files[0].name)
+            with col2:
+                st.metric("File Size", f"{sizes_mb[0]:.2f} MB")
+        else:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Files", len(uploaded_files))
+            with col2:
+                st.metric("Total Size", f"{sum(sizes_mb):.2f} MB")
+            with col3:
+                st.metric("Workers", queue.max_workers)
         
         # File size validation
-        if file_size_mb > 50:
+        if any(size > 50 for size in sizes_mb):
             st.warning("⚠️ File size exceeds 50 MB. Processing may take longer.")
         
         # Process Document Section
-        st.subheader("🔄 Process Document")
+        st.subheader("🔄 Process Documents")
         
         col1, col2 = st.columns(2)
         
         with col1:
             process_button = st.button(
-                "🚀 Analyze Document",
+                "🚀 Analyze Document" if len(uploaded_files) == 1 else f"🚀 Analyze {len(uploaded_files)} Documents",
                 type="primary",
                 use_container_width=True
             )
@@ -769,97 +732,90 @@ def main():
         
         if clear_button:
             st.session_state.processing_complete = False
-            st.session_state.result = None
+            st.session_state.result_hash = None
+            drop()
             st.session_state.file_name = None
+            st.session_state.explanations = {}
+            st.session_state.rag_indexed = False
+            st.session_state.chat_history = []
+            st.session_state.loaded_job_id = None
+            attach_job(None)
+            attach_batch(None)
             st.rerun()
         
         if process_button:
-            try:
-                # Get Azure clients
-                doc_client, openai_client = get_azure_clients()
-                
-                # Read PDF content
-                pdf_content = uploaded_file.read()
-                
-                # Create progress containers
-                status_container = st.empty()
-                progress_bar = st.progress(0)
-                
-                # Extract text from PDF
-                status_container.info("📖 Extracting text from PDF...")
-                progress_bar.progress(33)
-                
-                full_text, page_count, extraction_time = extract_text_from_pdf(
-                    pdf_content, doc_client
-                )
-                
-                st.session_state.extraction_time = extraction_time
-                st.session_state.page_count = page_count
-                
-                # Analyze contract
-                status_container.info("🔍 Analyzing contract with AI...")
-                progress_bar.progress(66)
-                
-                result, analysis_time = analyze_contract(full_text, openai_client)
-                
-                st.session_state.analysis_time = analysis_time
-                st.session_state.processing_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                st.session_state.result = result
-                st.session_state.file_name = uploaded_file.name
-                st.session_state.processing_complete = True
-                
-                # Update progress
-                progress_bar.progress(100)
-                status_container.empty()
-                
-                # Success message
-                st.markdown("""
-                    <div class="success-box">
-                    ✅ <b>Document processed successfully!</b>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-            except Exception as e:
-                st.error("❌ Error Processing Document")
-                with st.expander("View Error Details"):
-                    st.code(str(e), language="text")
+            # Get Azure clients
+            doc_client, openai_client = get_azure_clients()
+            
+            # Extraction and analysis run on the job workers (JOB_WORKERS files at a time);
+            # this session only polls
+            job_ids = []
+            for uploaded_file in uploaded_files:
+                with span("upload.read", **{"document.name": uploaded_file.name}):
+                    pdf_content = uploaded_file.read()
+                job_ids.append(queue.submit(
+                    run_contract_job,
+                    name=uploaded_file.name,
+                    meta={"file_name": uploaded_file.name},
+                    pdf_content=pdf_content,
+                    file_name=uploaded_file.name,
+                    doc_client=doc_client,
+                    openai_client=openai_client,
+                    cascade=st.session_state.get("cascade_mode", False),
+                ))
+            
+            if len(job_ids) == 1:
+                attach_batch(None)
+                attach_job(job_ids[0])
+            else:
+                attach_job(None)
+                attach_batch(queue.create_batch(job_ids))
+            st.rerun()
+    
+    # Per-file progress of the attached batch, then its combined results
+    if batch is not None:
+        if not all(j.finished for j in batch):
+            render_batch_progress(queue, batch_id)
+        else:
+            st.divider()
+            render_batch_results(queue, batch_id)
+    
+    # Progress of the attached background job, or the outcome of the one just loaded
+    if job is not None and not job.finished:
+        render_job_progress(queue, job.id)
+    elif job_loaded and batch is None:
+        # Success message
+        st.markdown("""
+            <div class="success-box">
+            ✅ <b>Document processed successfully!</b>
+            </div>
+        """, unsafe_allow_html=True)
+        if job.output.get("warning"):
+            st.warning(job.output["warning"])
+    elif job is not None and job.status != DONE:
+        render_job_error(job)
     
     # Display Results
-    if st.session_state.processing_complete and st.session_state.result:
+    result = load("result") if st.session_state.processing_complete else None
+    if result:
+        digest = st.session_state.get("result_hash") or result_hash(result)
+        openai_client = get_openai_client()
+
         st.divider()
         st.subheader("📊 Extraction Results")
         
-        # Display organized results
-        display_extraction_results(st.session_state.result)
-        
-        # Raw JSON Display
-        st.divider()
-        with st.expander("📋 View Raw JSON", expanded=False):
-            st.json(st.session_state.result)
+        # Each view is a fragment: Explain / Ask / download clicks rerun only their own view
+        tab_details, tab_comparison, tab_chat = st.tabs(["📋 Details", "🔍 Comparison", "💬 Ask the Contract"])
+        with tab_details:
+            render_result_details(result, digest)
+        with tab_comparison:
+            render_comparison(result, openai_client, digest)
+        with tab_chat:
+            render_chat(openai_client, os.getenv("AZURE_OPENAI_MODEL"))
         
         # Download Results
         st.divider()
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            json_str = json.dumps(st.session_state.result, indent=2)
-            st.download_button(
-                label="⬇️ Download Results (JSON)",
-                data=json_str,
-                file_name=f"contract_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                mime="application/json",
-                use_container_width=True
-            )
-        
-        with col2:
-            csv_export = json.dumps(st.session_state.result, indent=2)
-            st.download_button(
-                label="⬇️ Download Results (Text)",
-                data=csv_export,
-                file_name=f"contract_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                mime="text/plain",
-                use_container_width=True
-            )
+        render_downloads(result, digest)
     
     # Footer
     st.divider()
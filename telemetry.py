@@ -0,0 +1,341 @@
+# services/telemetry.py
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+# Prometheus histogram buckets (seconds): covers local work (ms) up to long DI/LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1000  # samples per stage kept for quantiles
+
+# Attributes inherited by every span opened inside `trace_document` (e.g. document.hash)
+_BAGGAGE: contextvars.ContextVar = contextvars.ContextVar("telemetry_baggage", default={})
+# (trace_id, span_id) of the innermost open span, for the file exporter
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class StageMetrics:
+    """
+    Per-stage latency histograms (cumulative buckets, sum, count), error counts and a sliding
+    window of recent samples for p50/p95/p99.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets: Dict[str, List[int]] = defaultdict(lambda: [0] * len(BUCKETS))
+        self.sums: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=WINDOW))
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self.buckets[stage][i] += 1
+            self.sums[stage] += seconds
+            self.counts[stage] += 1
+            self.samples[stage].append(seconds)
+            if error:
+                self.errors[stage] += 1
+
+    @staticmethod
+    def _quantile(ordered: List[float], q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per stage: count, errors, mean, p50, p95, p99 (seconds)."""
+        with self._lock:
+            rows = []
+            for stage in sorted(self.counts):
+                ordered = sorted(self.samples[stage])
+                rows.append({
+                    "stage": stage,
+                    "count": self.counts[stage],
+                    "errors": self.errors[stage],
+                    "mean": round(self.sums[stage] / self.counts[stage], 4),
+                    **{f"p{int(q * 100)}": round(self._quantile(ordered, q), 4) for q in QUANTILES},
+                })
+            return rows
+
+    def render_prometheus(self) -> str:
+        """Text exposition format: a histogram and a quantile summary per stage, plus error counters."""
+        lines = [
+            "# HELP pipeline_stage_duration_seconds Duration of pipeline stages.",
+            "# TYPE pipeline_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self.counts)
+            for stage in stages:
+                for bound, count in zip(BUCKETS, self.buckets[stage]):
+                    lines.append(f'pipeline_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'pipeline_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {self.counts[stage]}')
+                lines.append(f'pipeline_stage_duration_seconds_sum{{stage="{stage}"}} {self.sums[stage]:.6f}')
+                lines.append(f'pipeline_stage_duration_seconds_count{{stage="{stage}"}} {self.counts[stage]}')
+
+            lines += [
+                "# HELP pipeline_stage_latency_seconds Recent pipeline stage latency quantiles.",
+                "# TYPE pipeline_stage_latency_seconds summary",
+            ]
+            for stage in stages:
+                ordered = sorted(self.samples[stage])
+                for q in QUANTILES:
+                    lines.append(f'pipeline_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} '
+                                 f'{self._quantile(ordered, q):.6f}')
+                lines.append(f'pipeline_stage_latency_seconds_sum{{stage="{stage}"}} {sum(ordered):.6f}')
+                lines.append(f'pipeline_stage_latency_seconds_count{{stage="{stage}"}} {len(ordered)}')
+
+            lines += [
+                "# HELP pipeline_stage_errors_total Pipeline stages that raised.",
+                "# TYPE pipeline_stage_errors_total counter",
+            ]
+            for stage in stages:
+                lines.append(f'pipeline_stage_errors_total{{stage="{stage}"}} {self.errors[stage]}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = StageMetrics()
+
+
+# ---------------- span exporters ----------------
+
+class _FileSpan:
+    """Span written as one JSON line (OpenTelemetry field names) when it ends."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        parent = _CURRENT.get()
+        self.trace_id = parent[0] if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent[1] if parent else None
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record(self, error: Optional[BaseException]) -> Dict[str, Any]:
+        end_ns = time.time_ns()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "ERROR" if error else "OK",
+            "error": f"{type(error).__name__}: {error}" if error else None,
+        }
+
+
+class _Tracer:
+    """
+    Chooses the span backend once, from TRACING_EXPORTER:
+    "none" (default) only records metrics, "file" appends JSON lines to TRACING_FILE,
+    "otlp" exports through the OpenTelemetry SDK to OTEL_EXPORTER_OTLP_ENDPOINT.
+
+    The file exporter buffers spans in memory and a background thread appends them every
+    TRACING_FLUSH_SECONDS (or once TRACING_FLUSH_LINES are pending), so a span never waits on
+    disk. The file is rotated at TRACING_MAX_BYTES, keeping TRACING_BACKUPS old files.
+    """
+
+    def __init__(self):
+        self.exporter = os.getenv("TRACING_EXPORTER", "none").lower()
+        self.path = os.getenv("TRACING_FILE", os.path.join("traces", "spans.jsonl"))
+        self.flush_seconds = float(os.getenv("TRACING_FLUSH_SECONDS", "1.0"))
+        self.flush_lines = int(os.getenv("TRACING_FLUSH_LINES", "512"))
+        self.max_bytes = int(os.getenv("TRACING_MAX_BYTES", str(50 * 1024 * 1024)))
+        self.backups = int(os.getenv("TRACING_BACKUPS", "3"))
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._otel = None
+        if self.exporter == "otlp":
+            self._otel = self._otel_tracer()
+            if self._otel is None:
+                self.exporter = "file"
+
+    @staticmethod
+    def _otel_tracer():
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": "contract-validator"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+        return trace.get_tracer("contract-validator")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.flush_lines
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="span-flusher", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError:
+                pass  # tracing must never take the app down
+
+    def _rotate(self) -> None:
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def flush(self) -> None:
+        """Append the buffered spans to the trace file."""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        with self._io_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+
+_TRACER: Optional[_Tracer] = None
+_TRACER_LOCK = threading.Lock()
+
+
+def get_tracer() -> _Tracer:
+    global _TRACER
+    if _TRACER is None:
+        with _TRACER_LOCK:
+            if _TRACER is None:
+                _TRACER = _Tracer()
+    return _TRACER
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Time a pipeline stage: records it in METRICS under `name` and emits a trace span carrying
+    `attributes` plus the current document's baggage (see `trace_document`).
+
+        with span("llm.request", model=model) as s:
+            response = ...
+            s.set_attribute("llm.total_tokens", response.usage.total_tokens)
+    """
+    tracer = get_tracer()
+    attributes = {**_BAGGAGE.get(), **{k: v for k, v in attributes.items() if v is not None}}
+    start = time.perf_counter()
+    error: Optional[BaseException] = None
+
+    if tracer._otel is not None:
+        with tracer._otel.start_as_current_span(name, attributes=attributes) as otel_span:
+            try:
+                yield otel_span
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                METRICS.observe(name, time.perf_counter() - start, error is not None)
+        return
+
+    file_span = _FileSpan(name, attributes)
+    token = _CURRENT.set((file_span.trace_id, file_span.span_id))
+    try:
+        yield file_span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _CURRENT.reset(token)
+        METRICS.observe(name, time.perf_counter() - start, error is not None)
+        if tracer.exporter == "file":
+            tracer.write(file_span.record(error))
+
+
+@contextlib.contextmanager
+def trace_document(doc_hash: str, file_name: Optional[str] = None) -> Iterator[None]:
+    """Every span opened inside carries document.hash (and document.name)."""
+    baggage = {**_BAGGAGE.get(), "document.hash": doc_hash}
+    if file_name:
+        baggage["document.name"] = file_name
+    token = _BAGGAGE.set(baggage)
+    try:
+        yield
+    finally:
+        _BAGGAGE.reset(token)
+
+
+# ---------------- /metrics endpoint ----------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_METRICS_SERVER: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve METRICS at http://<host>:<port>/metrics in a background thread (once per process).
+    port defaults to METRICS_PORT; nothing is started when neither is set.
+    """
+    global _METRICS_SERVER
+    port = port if port is not None else int(os.getenv("METRICS_PORT", "0") or 0)
+    if not port:
+        return None
+    with _TRACER_LOCK:
+        if _METRICS_SERVER is None:
+            try:
+                server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                return None  # port already taken (e.g. another Streamlit worker serves it)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+            _METRICS_SERVER = server
+    return _METRICS_SERVER
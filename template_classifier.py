@@ -0,0 +1,180 @@
+# services/template_classifier.py
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from contract_prompt import ALL_SECTION_IDS
+
+TEMPLATES = ["IT", "Non-IT", "Marketing"]
+
+# Template headers (strong evidence) and keywords (weak evidence), mirroring prompt section 1
+HEADERS: Dict[str, List[str]] = {
+    "IT": ["agreement for it projects and services"],
+    "Non-IT": ["consulting agreement"],
+    "Marketing": ["marketing agreement", "media agreement"],
+}
+
+KEYWORDS: Dict[str, List[str]] = {
+    "IT": ["software", "it services", "it project", "application", "development", "infrastructure",
+           "hosting", "cloud", "sap", "implementation"],
+    "Non-IT": ["consulting", "teaching", "advising", "coaching"],
+    "Marketing": ["marketing", "market insight", "media"],
+}
+
+HEADER_WEIGHT = 10.0
+HEADER_WINDOW = 3000  # template headers sit on the first page
+KEYWORD_WINDOW = 20000  # keywords are counted over the first pages only
+
+# One alternation over all keywords so the text is scanned once (longest keywords first)
+_KEYWORD_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(kw) for kw in sorted({k for kws in KEYWORDS.values() for k in kws},
+                                                     key=len, reverse=True)) + r")\b"
+)
+
+
+def extract_features(text: str) -> Dict[str, float]:
+    """
+    Header flags and log-scaled keyword counts, e.g. {"header:IT": 1.0, "kw:consulting": 1.39}.
+    """
+    lowered = text[:KEYWORD_WINDOW].lower()
+    head = lowered[:HEADER_WINDOW]
+    features: Dict[str, float] = {}
+    for template, headers in HEADERS.items():
+        if any(h in head for h in headers):
+            features[f"header:{template}"] = 1.0
+    counts = Counter(_KEYWORD_PATTERN.findall(lowered))
+    for kw, count in counts.items():
+        features[f"kw:{kw}"] = math.log1p(count)
+    return features
+
+
+def _heuristic_scores(features: Dict[str, float]) -> Dict[str, float]:
+    scores = {t: 0.0 for t in TEMPLATES}
+    for template in TEMPLATES:
+        scores[template] += HEADER_WEIGHT * features.get(f"header:{template}", 0.0)
+        scores[template] += sum(features.get(f"kw:{kw}", 0.0) for kw in KEYWORDS[template])
+    return scores
+
+
+class LinearTemplateModel:
+    """
+    Optional small linear model over `extract_features` output, loaded from JSON:
+    {"weights": {"IT": {"header:IT": 4.2, "kw:software": 0.8, ...}, ...}, "bias": {"IT": -0.3, ...}}
+    """
+
+    def __init__(self, weights: Dict[str, Dict[str, float]], bias: Optional[Dict[str, float]] = None):
+        self.weights = weights
+        self.bias = bias or {}
+
+    @classmethod
+    def load(cls, path: str) -> "LinearTemplateModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["weights"], data.get("bias"))
+
+    def scores(self, features: Dict[str, float]) -> Dict[str, float]:
+        return {
+            template: self.bias.get(template, 0.0)
+            + sum(w * features.get(name, 0.0) for name, w in self.weights.get(template, {}).items())
+            for template in TEMPLATES
+        }
+
+
+_MODEL: Optional[LinearTemplateModel] = None
+
+
+def _load_model() -> Optional[LinearTemplateModel]:
+    global _MODEL
+    path = os.getenv("TEMPLATE_CLASSIFIER_MODEL")
+    if _MODEL is None and path and os.path.exists(path):
+        _MODEL = LinearTemplateModel.load(path)
+    return _MODEL
+
+
+def _softmax(scores: Dict[str, float]) -> Dict[str, float]:
+    top = max(scores.values())
+    exps = {k: math.exp(v - top) for k, v in scores.items()}
+    total = sum(exps.values())
+    return {k: v / total for k, v in exps.items()}
+
+
+def classify_template(text: str) -> Dict[str, Any]:
+    """
+    Classify a contract as IT / Non-IT / Marketing without calling the LLM.
+    Returns a dict shaped like the `template_classification` result section plus
+    `probabilities` and `source`.
+    """
+    features = extract_features(text)
+    model = _load_model()
+    scores = model.scores(features) if model is not None else _heuristic_scores(features)
+    probabilities = _softmax(scores)
+    ranked = sorted(probabilities, key=probabilities.get, reverse=True)
+    best, runner_up = ranked[0], ranked[1]
+    margin = probabilities[best] - probabilities[runner_up]
+
+    header_hit = features.get(f"header:{best}", 0.0) > 0
+    if not any(scores.values()):
+        confidence = "Low"
+    elif header_hit and margin >= 0.5:
+        confidence = "High"
+    elif margin >= 0.3:
+        confidence = "Medium"
+    else:
+        confidence = "Low"
+
+    keywords_found = [name.split(":", 1)[1] for name in features if name.startswith("kw:")]
+    headers_found = [h for h in HEADERS[best] if features.get(f"header:{best}")]
+    return {
+        "type": best,
+        "keywords_found": headers_found + keywords_found,
+        "confidence": confidence,
+        "probabilities": {k: round(v, 3) for k, v in probabilities.items()},
+        "source": "local",
+    }
+
+
+def prompt_sections(classification: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Sections to send to the LLM. With a High-confidence local classification the
+    classification section is settled locally and dropped from the prompt.
+    """
+    if classification and classification.get("confidence") == "High":
+        return [s for s in ALL_SECTION_IDS if s != "classification"]
+    return list(ALL_SECTION_IDS)
+
+
+def apply_template_rules(result: Dict[str, Any], template: Optional[str]) -> Dict[str, Any]:
+    """
+    Deterministic template rules applied after the LLM: signature Rule 4 — a Non-IT contract
+    requires at least 3 signatures (2 Allianz + 1 Supplier).
+    """
+    sig = result.get("signature_verification")
+    if template != "Non-IT" or not isinstance(sig, dict):
+        return result
+
+    rule = "Rule 4: Non-IT contract requires 3 signatures (2 Allianz + 1 Supplier)"
+    rules = [r for r in sig.get("applied_rules", []) if not str(r).lower().startswith("rule 4")]
+    sig["applied_rules"] = rules + [rule]
+
+    try:
+        required = max(int(sig.get("required_signatures") or 0), 3)
+    except (TypeError, ValueError):
+        required = 3
+    sig["required_signatures"] = required
+
+    try:
+        total = int(sig.get("total_signatures"))
+        allianz = int(sig.get("allianz_signatures", 0))
+        supplier = int(sig.get("supplier_signatures", 0))
+    except (TypeError, ValueError):
+        return result
+    if total < required or allianz < 2 or supplier < 1:
+        sig["validation_status"] = "Mismatch"
+        sig["validation_reason"] = (
+            f"{sig.get('validation_reason', '')} Non-IT template (Rule 4) requires {required} signatures "
+            f"incl. 2 Allianz and 1 Supplier; found {total} ({allianz} Allianz, {supplier} Supplier)."
+        ).strip()
+    return result
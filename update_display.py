@@ -1,90 +1,92 @@
-with st.expander("💰 Remuneration Details", expanded=True):
-    remuneration = result.get("remuneration_details", {})
+# ui/update_display.py
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
-    # ----- LEFT SIDE -----
+import streamlit as st
+
+from rate_table import parse_amount, table_frame, validate_rate_table
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_EMPTY = ("Missing", "N/A", "", None)
+_CHECK_ICONS = {"Correct": "✅", "Mismatch": "❌", "Missing": "⚠️"}
+
+
+def _upper_limit_option(marked_options: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The marked "time expended with upper limit" option (Option 3), if any."""
+    return next((opt for opt in marked_options if "upper" in str(opt.get("option", "")).lower()), None)
+
+
+def fill_upper_limit(frame: "pd.DataFrame", marked_options: List[Dict[str, Any]],
+                     currency: Optional[str] = None) -> "pd.DataFrame":
+    """With Option 3 marked, empty "Total" cells show the upper limit (on a copy of `frame`)."""
+    option = _upper_limit_option(marked_options)
+    limit = parse_amount(option.get("upper_limit")) if option and option.get("upper_limit") not in _EMPTY else None
+    total_cols = [c for c in frame.columns if "total" in str(c).lower()]
+    if limit is None or not total_cols:
+        return frame
+    filled = frame.copy()
+    label = f"{limit:.2f} {option.get('currency') or currency or ''}".strip()
+    filled[total_cols] = filled[total_cols].mask(filled[total_cols].apply(lambda c: c.str.strip() == ""), label)
+    return filled
+
+
+def _cell_styles(frame: "pd.DataFrame", cells: List[Dict[str, Any]]) -> "pd.DataFrame":
+    import pandas as pd
+    styles = pd.DataFrame("", index=frame.index, columns=frame.columns)
+    for cell in cells:
+        if cell["column"] in styles.columns:
+            styles.loc[cell["row"], cell["column"]] = "background-color: #f8d7da; color: #721c24"
+    return styles
+
+
+def render_rate_table(remuneration: Dict[str, Any]) -> None:
+    """
+    The rate table read from the document's layout (see services/rate_table.py), rendered once,
+    with the cells that fail `rate_table_validation` highlighted and the checks listed below.
+    """
+    rate_table = remuneration.get("rate_table")
+    if not rate_table or not rate_table.get("headers") or not rate_table.get("rows"):
+        st.warning("No rate table extracted.")
+        return
+    frame = table_frame(rate_table)
+    # results saved before the checks existed are validated here
+    validation = (remuneration.get("rate_table_validation")
+                  or validate_rate_table(rate_table, remuneration.get("marked_options", [])))
+    display = fill_upper_limit(frame, remuneration.get("marked_options", []), rate_table.get("currency"))
+    st.subheader("📄 Extracted Rate Table")
+    cells = validation.get("cells") or []
+    st.table(display.style.apply(_cell_styles, cells=cells, axis=None) if cells else display)
+    source = rate_table.get("source") or {}
+    if source:
+        st.caption(f"Read from table {source.get('table_index', '?')} on page {source.get('page', '?')}"
+                   + (f" · {rate_table['currency']}" if rate_table.get("currency") else ""))
+    for name, check in (validation.get("checks") or {}).items():
+        icon = _CHECK_ICONS.get(check["validation_status"], "⚠️")
+        st.write(f"{icon} **{name.replace('_', ' ').capitalize()}:** {check['validation_reason']}")
+
+
+def render_remuneration(remuneration: Dict[str, Any], status_style: Callable[[str], str]) -> None:
+    """Marked options, validation status and the rate table of `remuneration_details`."""
     col1, col2 = st.columns([2, 1])
     with col1:
         st.write("**Marked Options:**")
         for option in remuneration.get("marked_options", []):
             st.write(f"- {option.get('option', 'N/A')}")
-            amount = option.get("amount", "")
             currency = option.get("currency", "")
-            upper_limit = option.get("upper_limit", "")
-
-            if amount not in ["Missing", "N/A", None, ""]:
-                st.write(f"  • Amount: {amount} {currency}")
-
-            if upper_limit not in ["Missing", "N/A", None, ""]:
-                st.write(f"  • Upper Limit: {upper_limit} {currency}")
-
-            if option.get("rate_card_status") not in ["N/A", None]:
+            if option.get("amount") not in _EMPTY:
+                st.write(f"  • Amount: {option.get('amount')} {currency}")
+            if option.get("upper_limit") not in _EMPTY:
+                st.write(f"  • Upper Limit: {option.get('upper_limit')} {currency}")
+            if option.get("rate_card_status") not in ("N/A", None):
                 st.write(f"  • Rate Card: {option.get('rate_card_status')}")
-
-            if option.get("table_status") not in ["N/A", None]:
+            if option.get("table_status") not in ("N/A", None):
                 st.write(f"  • Table: {option.get('table_status')}")
 
-    # ----- RIGHT SIDE -----
     with col2:
         status = remuneration.get("validation_status", "N/A")
-        st.markdown(f"**Status:** <span class='{get_status_style(status)}'>{status}</span>",
+        st.markdown(f"**Status:** <span class='{status_style(status)}'>{status}</span>",
                     unsafe_allow_html=True)
 
     st.info(remuneration.get("validation_reason", "No details provided"))
-
-    # ----- SHOW THE TABLE -----
-    rate_table = remuneration.get("rate_table")
-     # =====================================================
-    # 🔥 AUTO-FILL LOGIC FOR OPTION 3 — INSERTED HERE
-    # =====================================================
-    marked_options = remuneration.get("marked_options", [])
-
-    # detect if upper limit option selected (Option 3)
-    upper_limit_option = next(
-        (opt for opt in marked_options if "upper" in opt.get("option", "").lower()),
-        None
-    )
-
-    if upper_limit_option and rate_table:
-        upper_limit_value = upper_limit_option.get("upper_limit")
-        currency = upper_limit_option.get("currency", "")
-
-        # Ensure numeric upper limit
-        if upper_limit_value and upper_limit_value not in ["Missing", "N/A", "", None]:
-            try:
-                numeric_value = float(str(upper_limit_value).replace(",", "").strip())
-            except:
-                numeric_value = None
-
-            if numeric_value is not None:
-                headers = rate_table.get("headers", [])
-                rows = rate_table.get("rows", [])
-
-                # find column indices containing "Total"
-                total_cols = [
-                    idx for idx, h in enumerate(headers)
-                    if "total" in h.lower()
-                ]
-
-                # fill empty cells
-                for row in rows:
-                    for col in total_cols:
-                        if not row[col] or str(row[col]).strip() == "":
-                            row[col] = f"{numeric_value} {currency}"
-
-    # =====================================================
-
-    if rate_table and "headers" in rate_table and "rows" in rate_table:
-        st.subheader("📄 Extracted Rate Table")
-
-        df_table = pd.DataFrame(rate_table["rows"], columns=rate_table["headers"])
-        st.table(df_table)
-    else:
-        st.warning("No rate table extracted.")
-
-    if rate_table and "headers" in rate_table and "rows" in rate_table:
-        st.subheader("📄 Extracted Rate Table")
-
-        df_table = pd.DataFrame(rate_table["rows"], columns=rate_table["headers"])
-        st.table(df_table)
-    else:
-        st.warning("No rate table extracted.")
+    render_rate_table(remuneration)
@@ -0,0 +1,123 @@
+# services/vector_store.py
+import os
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from ann_index import _normalize, _top_k
+from quantization import STORAGE_DTYPES, RerankFile, quantize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported on first use, not at app start (see README "Cold Start")
+
+_SCAN_ROWS = 65536  # rows dequantized at a time while scanning
+
+
+class EmbeddingMatrix:
+    """
+    Embeddings in one contiguous array, quantized to `dtype` (RAG_EMBEDDING_DTYPE): float16
+    halves and int8 quarters the float32 footprint, and no per-chunk numpy objects are kept.
+
+    A query scans the quantized rows. With a rerank directory (RAG_RERANK_DIR) the float32
+    originals are kept in a RerankFile there and the best `rerank_factor * top_k` candidates are
+    re-scored exactly from a memory map of it, so only those rows are read back; without one
+    (or if the file is gone) the quantized scores are returned.
+    """
+
+    def __init__(self, dtype: Optional[str] = None, rerank_dir: Optional[str] = None,
+                 rerank_factor: Optional[int] = None):
+        self.dtype = (dtype or os.getenv("RAG_EMBEDDING_DTYPE", "float16")).lower()
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown embedding dtype {self.dtype!r}; expected one of {STORAGE_DTYPES}")
+        if rerank_dir is None:
+            rerank_dir = os.getenv("RAG_RERANK_DIR", os.path.join(".cache", "vectors"))
+        # float32 rows need no re-rank: the scan is already exact
+        self.rerank_dir = rerank_dir if self.dtype != "float32" else ""
+        self.rerank_factor = rerank_factor or int(os.getenv("RAG_RERANK_FACTOR", "4"))
+        self.dim: Optional[int] = None
+        self.size = 0
+        self._codes: Optional["np.ndarray"] = None  # capacity rows, first `size` in use
+        self._scales: Optional["np.ndarray"] = None
+        self._ids: Optional["np.ndarray"] = None
+        self._rerank: Optional[RerankFile] = RerankFile(self.rerank_dir) if self.rerank_dir else None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory (codes, scales and ids of the rows in use)."""
+        if not self.size:
+            return 0
+        return self.size * (self._codes.itemsize * self.dim + self._scales.itemsize + self._ids.itemsize)
+
+    def _grow(self, rows: int) -> None:
+        import numpy as np
+        capacity = 0 if self._codes is None else len(self._codes)
+        if self.size + rows <= capacity:
+            return
+        capacity = max(self.size + rows, 2 * capacity, 64)
+        codes = np.empty((capacity, self.dim), dtype=self.dtype)
+        scales = np.empty(capacity, dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        if self.size:
+            codes[:self.size] = self._codes[:self.size]
+            scales[:self.size] = self._scales[:self.size]
+            ids[:self.size] = self._ids[:self.size]
+        self._codes, self._scales, self._ids = codes, scales, ids
+
+    def add(self, vectors: "np.ndarray", ids: "np.ndarray") -> None:
+        """Append vectors (one row each, need not be normalized) under integer ids."""
+        import numpy as np
+        vectors = _normalize(np.atleast_2d(vectors))
+        self.dim = self.dim or vectors.shape[1]
+        codes, scales = quantize(vectors, self.dtype)
+        self._grow(len(vectors))
+        end = self.size + len(vectors)
+        self._codes[self.size:end] = codes
+        self._scales[self.size:end] = scales
+        self._ids[self.size:end] = np.asarray(ids, dtype=np.int64)
+        if self._rerank:
+            self._rerank.append(vectors)
+        self.size = end
+
+    def _scan(self, q: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, _SCAN_ROWS):
+            end = min(self.size, start + _SCAN_ROWS)
+            scores[start:end] = (self._codes[start:end].astype(np.float32) @ q) * self._scales[start:end]
+        return scores
+
+    def search(self, query: "np.ndarray", top_k: int) -> List[Tuple[int, float]]:
+        """(id, cosine similarity) of the top_k nearest vectors, best first."""
+        import numpy as np
+        if not self.size:
+            return []
+        q = _normalize(query)
+        scores = self._scan(q)
+        rows = _top_k(scores, min(len(scores), top_k * self.rerank_factor if self._rerank else top_k))
+        originals = self._rerank.read(np.sort(rows)) if self._rerank else None
+        if originals is not None:
+            rows.sort()
+            scores = originals @ q
+            best = _top_k(scores, min(top_k, len(rows)))
+            return [(int(self._ids[rows[i]]), float(scores[i])) for i in best]
+        return [(int(self._ids[i]), float(scores[i])) for i in rows[:top_k]]
+
+    def save_originals(self, path: str) -> None:
+        """Write the float32 originals to `path` (next to a saved index) for `attach_originals`."""
+        if self._rerank:
+            self._rerank.save(path)
+
+    def attach_originals(self, path: str) -> None:
+        if self._rerank:
+            self._rerank.attach(path)
+
+    def __getstate__(self):
+        # drop unused capacity; the rerank file itself stays on disk
+        state = dict(self.__dict__)
+        for name in ("_codes", "_scales", "_ids"):
+            if state[name] is not None:
+                state[name] = state[name][:self.size].copy()
+        return state